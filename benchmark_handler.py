@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Offline Benchmark Harness for F5-TTS RunPod Serverless
+
+Drives the real handler with a replayable job trace while the heavy parts
+are swapped out:
+- f5tts_engine / whisperx_engine / subtitle_generator are replaced by
+  deterministic fakes with configurable latency distributions
+- S3Client talks to an in-process S3 stub instead of a real bucket
+
+This measures the handler's own overhead and concurrency behaviour without
+a GPU or a bucket. Requires the container dependencies (boto3).
+
+Usage:
+    python benchmark_handler.py --jobs 200 --concurrency 1,4,8 --output bench.json
+    python benchmark_handler.py --trace jobs.jsonl --f5-latency lognormal:1.5:0.3
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import hashlib
+import argparse
+import logging
+import tempfile
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent
+BENCH_BUCKET = "bench-bucket"
+
+# Configuration is read at import time, so it must be set before any repo
+# module (including metrics) pulls in the config
+os.environ.setdefault("S3_BUCKET", BENCH_BUCKET)
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+os.environ["METRICS_EXPORT_INTERVAL"] = "0"
+
+sys.path.insert(0, str(REPO_DIR))
+from metrics import stage_timer
+
+logger = logging.getLogger("benchmark")
+
+# ---------------------------------------------------------------------------
+# Latency distributions
+# ---------------------------------------------------------------------------
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    Build a latency sampler from a spec string.
+
+    Supported specs (seconds):
+        const:X, uniform:A:B, normal:MU:SIGMA, lognormal:MEDIAN:SIGMA
+    """
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+
+    if kind == "const":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+# ---------------------------------------------------------------------------
+# In-process S3 stub
+# ---------------------------------------------------------------------------
+
+class _Body:
+    """Minimal streaming body compatible with botocore's StreamingBody."""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._buffer.read() if amt is None else self._buffer.read(amt)
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            chunk = self._buffer.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+class InProcessS3:
+    """
+    In-memory stand-in for the subset of the boto3 S3 client the handler uses.
+
+    Missing objects under ``autocreate_prefix`` (except ``.txt`` transcript
+    sidecars) are created on first read with ``autocreate_size`` bytes, so
+    traces can reference arbitrary voices.
+    """
+
+    def __init__(self, latency: Callable[[], float], autocreate_prefix: str = "voices/", autocreate_size: int = 480_000):
+        self.latency = latency
+        self.autocreate_prefix = autocreate_prefix
+        self.autocreate_size = autocreate_size
+        self.objects: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def _count(self, operation: str):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        time.sleep(self.latency())
+
+    def _get(self, key: str) -> bytes:
+        with self.lock:
+            if key not in self.objects and key.startswith(self.autocreate_prefix) and not key.endswith(".txt"):
+                seed = int(hashlib.sha256(key.encode()).hexdigest()[:8], 16)
+                self.objects[key] = random.Random(seed).randbytes(self.autocreate_size)
+            if key not in self.objects:
+                from botocore.exceptions import ClientError
+                raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "GetObject")
+            return self.objects[key]
+
+    def _put(self, key: str, data: bytes) -> str:
+        with self.lock:
+            self.objects[key] = data
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._count("upload_file")
+        self._put(Key, Path(Filename).read_bytes())
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._count("upload_fileobj")
+        self._put(Key, Fileobj.read())
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._count("put_object")
+        data = Body if isinstance(Body, bytes) else Body.read()
+        return {"ETag": self._put(Key, data)}
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        self._count("download_file")
+        Path(Filename).write_bytes(self._get(Key))
+
+    def download_fileobj(self, Bucket, Key, Fileobj, ExtraArgs=None, Callback=None, Config=None):
+        self._count("download_fileobj")
+        Fileobj.write(self._get(Key))
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, IfMatch=None, **kwargs):
+        self._count("get_object")
+        data = self._get(Key)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        from botocore.exceptions import ClientError
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        if IfMatch is not None and IfMatch != etag:
+            raise ClientError({"Error": {"Code": "PreconditionFailed", "Message": "Precondition Failed"}}, "GetObject")
+        response = {"ETag": etag}
+        if Range:
+            if not data:
+                raise ClientError({"Error": {"Code": "InvalidRange", "Message": "Range Not Satisfiable"}}, "GetObject")
+            start, end = Range.replace("bytes=", "").split("-")
+            start, end = int(start), min(int(end), len(data) - 1)
+            response["ContentRange"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        response.update({"Body": _Body(data), "ContentLength": len(data)})
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count("head_object")
+        data = self._get(Key)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"', "ContentLength": len(data)}
+
+    def head_bucket(self, Bucket, **kwargs):
+        self._count("head_bucket")
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://stub.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+# ---------------------------------------------------------------------------
+# Fake engines
+# ---------------------------------------------------------------------------
+
+class FakeF5TTSEngine:
+    """Deterministic F5-TTS stand-in: sleeps instead of running the model."""
+
+    def __init__(self, latency: Callable[[], float], per_char: float, load_latency: float, output_dir: Path):
+        self.model_name = "F5TTS_Base"
+        self.compute_type = "float16"
+        self.latency = latency
+        self.per_char = per_char
+        self.load_latency = load_latency
+        self.output_dir = output_dir
+        self.model_load_time = None
+        self.warmup_time = None
+        self.batch_scheduler = None  # Serialized like F5TTS_BATCH_WINDOW_MS=0
+        self._gpu_lock = threading.Lock()  # One simulated GPU
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending
+
+    def load_model(self):
+        time.sleep(self.load_latency)
+        self.model_load_time = self.load_latency
+        self.warmup_time = 0.0
+
+    def synthesize_wav(self, text: str, reference_audio_path) -> bytes:
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            with stage_timer("inference"), self._gpu_lock:
+                time.sleep(self.latency() + self.per_char * len(text))
+            with stage_timer("wav_encode"):
+                return b"RIFF" + bytes(44 + 24000 * 2 * max(1, len(text) // 15))
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def synthesize_speech(self, text: str, reference_audio_path) -> Path:
+        output_path = self.output_dir / f"fake_{threading.get_ident()}_{time.perf_counter_ns()}.wav"
+        output_path.write_bytes(self.synthesize_wav(text, reference_audio_path))
+        return output_path
+
+class FakeWhisperXEngine:
+    """Deterministic WhisperX stand-in (same method names as whisperx_engine.WhisperXEngine)."""
+
+    def __init__(self, latency: Callable[[], float], load_latency: float):
+        self.latency = latency
+        self.load_latency = load_latency
+        self.model_load_time = None
+
+    def load_models(self):
+        time.sleep(self.load_latency)
+        self.model_load_time = self.load_latency
+
+    def transcribe_audio(self, audio_path) -> Dict[str, Any]:
+        time.sleep(self.latency())
+        return {"segments": [{"text": f" Reference voice {Path(audio_path).stem}."}]}
+
+    def generate_word_timings(self, audio_path, text: str) -> List[Dict[str, Any]]:
+        time.sleep(self.latency())
+        return [
+            {"word": word, "start": i * 0.3, "end": i * 0.3 + 0.25}
+            for i, word in enumerate(text.split())
+        ]
+
+def install_fakes(args: argparse.Namespace, rng: random.Random, work_dir: Path) -> Dict[str, Any]:
+    """Register fake engine modules in sys.modules before the handler imports them."""
+    f5tts = FakeF5TTSEngine(
+        latency=parse_latency(args.f5_latency, rng),
+        per_char=args.f5_per_char,
+        load_latency=args.load_latency,
+        output_dir=work_dir
+    )
+    whisperx = FakeWhisperXEngine(parse_latency(args.whisperx_latency, rng), args.load_latency)
+    subtitle_latency = parse_latency(args.subtitle_latency, rng)
+
+    f5tts_module = types.ModuleType("f5tts_engine")
+    f5tts_module.get_f5tts_engine = lambda: f5tts
+    f5tts_module.process_tts = lambda text, reference_audio_path: f5tts.synthesize_speech(text, reference_audio_path)
+    sys.modules["f5tts_engine"] = f5tts_module
+
+    whisperx_module = types.ModuleType("whisperx_engine")
+    whisperx_module.get_whisperx_engine = lambda: whisperx
+    whisperx_module.generate_word_timings = whisperx.generate_word_timings
+    sys.modules["whisperx_engine"] = whisperx_module
+
+    def create_ass_subtitles(word_timings, text):
+        time.sleep(subtitle_latency())
+        path = work_dir / f"subs_{threading.get_ident()}_{time.perf_counter_ns()}.ass"
+        path.write_text("[Script Info]\n")
+        return path
+
+    subtitle_module = types.ModuleType("subtitle_generator")
+    subtitle_module.create_ass_subtitles = create_ass_subtitles
+    sys.modules["subtitle_generator"] = subtitle_module
+
+    return {"f5tts": f5tts, "whisperx": whisperx}
+
+def load_handler(work_dir: Path, s3_stub: InProcessS3):
+    """Import the real handler and S3 client, pointed at the stub and a temp dir."""
+    def load(module_name: str, file_name: str):
+        spec = importlib.util.spec_from_file_location(module_name, REPO_DIR / file_name)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return module
+
+    s3_client = load("s3_client", "s3_utils.py")
+    s3_client.TEMP_PATH = work_dir
+    s3_client._download_cache = s3_client.S3DownloadCache(work_dir / "s3-cache")
+    s3_client._upload_deduplicator = s3_client.UploadDeduplicator(work_dir / "upload-index")
+    client = s3_client.get_s3_client()
+    client.s3 = s3_stub
+
+    reference_transcripts = load("reference_transcripts", "reference_transcripts.py")
+    reference_transcripts._transcript_store = reference_transcripts.ReferenceTranscriptStore(work_dir / "transcripts")
+
+    handler = load("handler", "runpod-handler.py")
+    handler.TEMP_PATH = work_dir
+    handler.check_setup_complete = lambda: True
+    handler.activate_virtual_environment = lambda: None
+    handler.verify_environment = lambda: None
+    return handler
+
+# ---------------------------------------------------------------------------
+# Trace handling
+# ---------------------------------------------------------------------------
+
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while narrators read long "
+    "scripts about voices audio speech models and serverless workers"
+).split()
+
+def load_trace(path: Optional[str], jobs: int, rng: random.Random, subtitle_ratio: float) -> List[Dict[str, Any]]:
+    """
+    Load a JSONL job trace, or synthesize one.
+
+    Each trace line is a RunPod job ({"id": ..., "input": {...}}) or a bare
+    input object. An optional "arrival_offset" (seconds) replays timing.
+    """
+    if path:
+        trace = []
+        with open(path) as f:
+            for line_number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "input" not in record:
+                    record = {"id": f"trace-{line_number}", "input": record}
+                trace.append(record)
+        return trace
+
+    trace = []
+    for index in range(jobs):
+        words = rng.randint(5, 60)
+        text = " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+        options = {}
+        if rng.random() < subtitle_ratio:
+            options = {"create_subtitles": True, "subtitle_format": "ass"}
+        trace.append({
+            "id": f"synthetic-{index}",
+            "input": {
+                "text": text,
+                "voice_reference_url": f"s3://{BENCH_BUCKET}/voices/voice{rng.randint(1, 5)}.wav",
+                "options": options
+            }
+        })
+    return trace
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 of a list of values."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 4)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+# ---------------------------------------------------------------------------
+# Benchmark driver
+# ---------------------------------------------------------------------------
+
+def run_level(handler, trace: List[Dict[str, Any]], concurrency: int, arrival_rate: float, rng: random.Random) -> Dict[str, Any]:
+    """Replay the trace at one concurrency level and summarize the results."""
+    # Arrival schedule: explicit offsets, Poisson arrivals, or one burst
+    offsets = []
+    clock = 0.0
+    for job in trace:
+        if "arrival_offset" in job:
+            offsets.append(float(job["arrival_offset"]))
+        elif arrival_rate > 0:
+            clock += rng.expovariate(arrival_rate)
+            offsets.append(clock)
+        else:
+            offsets.append(0.0)
+
+    results: List[Dict[str, Any]] = []
+    results_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run_job(index: int):
+        job = trace[index]
+        arrival = start + offsets[index]
+        started = time.perf_counter()
+        output = handler.handler(job)
+        finished = time.perf_counter()
+        result = output.get("output", output)
+        with results_lock:
+            results.append({
+                "queue_delay": max(0.0, started - arrival),
+                "latency": finished - arrival,
+                "success": bool(result.get("success")),
+                "timings": result.get("timings", {})
+            })
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        for index in sorted(range(len(trace)), key=lambda i: offsets[i]):
+            delay = start + offsets[index] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run_job, index)
+
+    wall_time = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = {}
+    for result in results:
+        for stage, seconds in result["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        "concurrency": concurrency,
+        "jobs": len(results),
+        "errors": sum(1 for r in results if not r["success"]),
+        "wall_time": round(wall_time, 3),
+        "throughput_jobs_per_s": round(len(results) / wall_time, 3) if wall_time else None,
+        "latency": percentiles([r["latency"] for r in results]),
+        "queue_delay": percentiles([r["queue_delay"] for r in results]),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline F5-TTS handler benchmark")
+    parser.add_argument("--trace", help="JSONL job trace to replay")
+    parser.add_argument("--jobs", type=int, default=100, help="Synthetic jobs when no trace is given")
+    parser.add_argument("--subtitle-ratio", type=float, default=0.3, help="Share of synthetic jobs with subtitles")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="Poisson arrivals per second (0 = burst)")
+    parser.add_argument("--f5-latency", default="lognormal:0.8:0.25", help="F5-TTS inference latency distribution")
+    parser.add_argument("--f5-per-char", type=float, default=0.002, help="Extra inference seconds per character")
+    parser.add_argument("--whisperx-latency", default="lognormal:0.4:0.3", help="WhisperX latency distribution")
+    parser.add_argument("--subtitle-latency", default="const:0.01", help="Subtitle build latency distribution")
+    parser.add_argument("--s3-latency", default="lognormal:0.08:0.5", help="Per-call S3 latency distribution")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Fake model load time at boot")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for traces and latencies")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--log-level", default="WARNING", help="Handler log level during the run")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    work_dir = Path(tempfile.mkdtemp(prefix="f5tts-bench-"))
+
+    # Removed on exit - every run writes fresh caches, uploads and subtitles
+    try:
+        s3_stub = InProcessS3(parse_latency(args.s3_latency, rng))
+        install_fakes(args, rng, work_dir)
+        handler = load_handler(work_dir, s3_stub)
+        logging.getLogger().setLevel(args.log_level)
+
+        boot_timeline = handler.boot_worker()
+        trace = load_trace(args.trace, args.jobs, rng, args.subtitle_ratio)
+        levels = [int(level) for level in args.concurrency.split(",")]
+
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "trace_jobs": len(trace),
+            "boot_timeline": boot_timeline,
+            "levels": []
+        }
+
+        for concurrency in levels:
+            summary = run_level(handler, trace, concurrency, args.arrival_rate, random.Random(args.seed))
+            report["levels"].append(summary)
+            print(
+                f"concurrency={concurrency:<3} jobs={summary['jobs']:<5} errors={summary['errors']:<3} "
+                f"throughput={summary['throughput_jobs_per_s']} jobs/s "
+                f"p50={summary['latency']['p50']}s p99={summary['latency']['p99']}s "
+                f"queue_p99={summary['queue_delay']['p99']}s"
+            )
+
+        report["s3_calls"] = dict(s3_stub.calls)
+        report["s3_transfers"] = sys.modules["s3_client"].get_transfer_stats()
+        download_cache = sys.modules["s3_client"].get_download_cache()
+        if download_cache is not None:
+            report["s3_cache"] = download_cache.get_stats()
+        upload_deduplicator = sys.modules["s3_client"].get_upload_deduplicator()
+        if upload_deduplicator is not None:
+            report["s3_uploads"] = upload_deduplicator.get_stats()
+
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"Results written to {args.output}")
+    finally:
+        # Background reference ASR writes into work_dir; let it finish first
+        transcripts = sys.modules.get("reference_transcripts")
+        transcript_store = getattr(transcripts, "_transcript_store", None)
+        if transcript_store is not None and transcript_store._executor is not None:
+            transcript_store._executor.shutdown(wait=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
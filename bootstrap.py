@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Environment Bootstrap for F5-TTS RunPod Serverless
+
+Activates the network volume venv exactly once per process (including
+``.pth`` processing) and produces an import-time report for the heavy ML
+stacks, so slow cold starts can be attributed to specific packages.
+"""
+
+import sys
+import site
+import logging
+import threading
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Add container app directory to path
+sys.path.append('/app')
+
+try:
+    from setup_network_venv import VENV_PATH  # config.py
+except ImportError:
+    VENV_PATH = Path("/runpod-volume/f5tts/venv")
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Imported in dependency order, so each entry's time excludes the ones before it
+REPORT_MODULES = ("torch", "transformers", "pyannote.audio", "whisperx", "f5_tts")
+
+_bootstrap_lock = threading.Lock()
+_bootstrap_info: Optional[Dict[str, Any]] = None
+
+def get_site_packages(venv_path: Path = VENV_PATH) -> Path:
+    """Get the venv site-packages matching the running interpreter."""
+    version = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    site_packages = Path(venv_path) / "lib" / version / "site-packages"
+    if not site_packages.exists():
+        raise RuntimeError(f"Virtual environment not found: {site_packages}")
+    return site_packages
+
+def bootstrap_environment(venv_path: Path = VENV_PATH) -> Dict[str, Any]:
+    """
+    Put the venv on ``sys.path`` once per process.
+
+    ``site.addsitedir`` processes ``.pth`` files (namespace packages,
+    editable installs); the entries it adds are moved ahead of the system
+    paths so venv packages win, and duplicates are dropped.
+
+    Returns:
+        Bootstrap info: site-packages, entries added and sys.path length
+    """
+    global _bootstrap_info
+    if _bootstrap_info is not None:
+        return _bootstrap_info
+
+    with _bootstrap_lock:
+        if _bootstrap_info is not None:
+            return _bootstrap_info
+
+        start_time = time.time()
+        site_packages = get_site_packages(venv_path)
+
+        before = list(sys.path)
+        site.addsitedir(str(site_packages))
+        added = [entry for entry in sys.path if entry not in before]
+
+        # Venv entries first, then the original path - each entry once
+        sys.path[:] = list(dict.fromkeys(added + before))
+
+        _bootstrap_info = {
+            "site_packages": str(site_packages),
+            "added_paths": added,
+            "sys_path_length": len(sys.path),
+            "seconds": round(time.time() - start_time, 4)
+        }
+        logger.info(f"Activated virtual environment: {venv_path} ({len(added)} path entries)")
+        return _bootstrap_info
+
+def get_bootstrap_info() -> Optional[Dict[str, Any]]:
+    """Get bootstrap info, or None if the venv is not active yet."""
+    return _bootstrap_info
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        Entries with module name, nesting depth, self and cumulative seconds
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        stripped = name.lstrip()
+        entries.append({
+            "module": stripped.strip(),
+            "depth": (len(name) - len(stripped) - 1) // 2,
+            "self": int(self_us) / 1e6,
+            "cumulative": int(cumulative_us) / 1e6
+        })
+    return entries
+
+def collect_import_report(
+    python: Optional[Path] = None,
+    modules: Sequence[str] = REPORT_MODULES,
+    top: int = 5,
+    timeout: int = 600
+) -> Dict[str, Any]:
+    """
+    Measure import cost of the heavy stacks in a fresh venv interpreter.
+
+    Runs out of process so the serving process never imports stacks it
+    does not use, and the measurement is not skewed by modules already
+    loaded here.
+
+    Args:
+        python: Interpreter to measure (venv python by default)
+        modules: Top-level modules to import, in order
+        top: Number of slowest submodules (by self time) kept per module
+        timeout: Seconds before the measurement is abandoned
+
+    Returns:
+        Per-module cumulative seconds, module counts, slowest submodules
+        and import errors
+    """
+    python = Path(python or Path(VENV_PATH) / "bin" / "python")
+    script = "\n".join(
+        f"try:\n    import {module}\nexcept Exception as e:\n    print('{module}:', e)"
+        for module in modules
+    )
+
+    start_time = time.time()
+    result = subprocess.run(
+        [str(python), "-X", "importtime", "-c", script],
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    entries = parse_importtime(result.stderr)
+
+    # Attribute each import to the report module whose top-level import contains it
+    report = {module: {"seconds": 0.0, "modules": 0, "slowest": []} for module in modules}
+    errors = {}
+    for line in result.stdout.splitlines():
+        module, _, message = line.partition(": ")
+        if module in report:
+            errors[module] = message
+
+    pending: List[Dict[str, Any]] = []
+    for entry in entries:
+        # -X importtime prints children before their parent
+        pending.append(entry)
+        if entry["depth"] != 0:
+            continue
+        root = entry["module"]
+        target = next((m for m in modules if root.split(".")[0] == m.split(".")[0]), None)
+        if target is not None:
+            stats = report[target]
+            stats["seconds"] = round(stats["seconds"] + entry["cumulative"], 4)
+            stats["modules"] += len(pending)
+            slowest = sorted(stats["slowest"] + [
+                {"module": e["module"], "self": round(e["self"], 4)} for e in pending
+            ], key=lambda e: e["self"], reverse=True)
+            stats["slowest"] = slowest[:top]
+        pending = []
+
+    return {
+        "python": str(python),
+        "modules": report,
+        "errors": errors,
+        "wall_time": round(time.time() - start_time, 3)
+    }
+
+_import_report: Optional[Dict[str, Any]] = None
+_import_report_lock = threading.Lock()
+
+def get_import_report(refresh: bool = False) -> Dict[str, Any]:
+    """Get the cached import-time report, collecting it if needed."""
+    global _import_report
+    with _import_report_lock:
+        if _import_report is None or refresh:
+            _import_report = collect_import_report()
+        return _import_report
+
+def start_import_report():
+    """Collect the import-time report in the background and log it."""
+    def collect():
+        try:
+            report = get_import_report()
+            summary = ", ".join(f"{m}={s['seconds']:.2f}s" for m, s in report["modules"].items())
+            logger.info(f"Import times: {summary}")
+            for module, error in report["errors"].items():
+                logger.warning(f"Import of {module} failed: {error}")
+        except Exception as e:
+            logger.warning(f"Import-time report failed: {e}")
+
+    threading.Thread(target=collect, name="import-report", daemon=True).start()
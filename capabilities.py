@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Lazily Loaded Capabilities for F5-TTS RunPod Serverless
+
+Optional heavy stacks (WhisperX ASR + alignment, which pulls in pyannote and
+faster-whisper) are registered as capabilities. They load in the background
+once the core TTS path is ready, or on first demand, so TTS-only jobs never
+wait on them. Load time and memory are tracked per capability.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+def _rss_mb() -> Optional[float]:
+    """Get resident memory of this process in MB (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _gpu_allocated_mb() -> Optional[float]:
+    """Get GPU memory allocated by torch in MB, or None if CUDA is not in use."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return torch.cuda.memory_allocated() / (1024 * 1024)
+
+class Capability:
+    """One optional component and its load state."""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        """
+        Initialize capability.
+
+        Args:
+            name: Capability name (e.g. "word_timings")
+            loader: Imports and loads the component, returning its handle
+        """
+        self.name = name
+        self.loader = loader
+        self.state = "pending"  # pending -> loading -> ready | failed (-> loading)
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.load_time: Optional[float] = None
+        self.rss_mb: Optional[float] = None
+        self.gpu_mb: Optional[float] = None
+        self.trigger: Optional[str] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def load(self, trigger: str) -> bool:
+        """
+        Load the capability unless another thread already is.
+
+        Memory is the process-wide delta across the load, so it is only
+        exact when nothing else loads at the same time.
+
+        Returns:
+            True if this call performed the load
+        """
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return False
+            # A failed load is retried on the next demand
+            self.state = "loading"
+            self.error = None
+            self.trigger = trigger
+            self._done.clear()
+
+        logger.info(f"Loading capability '{self.name}' ({trigger})...")
+        rss_before, gpu_before = _rss_mb(), _gpu_allocated_mb()
+        start_time = time.time()
+        try:
+            self.value = self.loader()
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            logger.error(f"Failed to load capability '{self.name}': {e}")
+        finally:
+            self.load_time = round(time.time() - start_time, 3)
+            rss_after, gpu_after = _rss_mb(), _gpu_allocated_mb()
+            if rss_before is not None and rss_after is not None:
+                self.rss_mb = round(rss_after - rss_before, 1)
+            if gpu_after is not None:
+                self.gpu_mb = round(gpu_after - (gpu_before or 0.0), 1)
+            self._done.set()
+
+        if self.state == "ready":
+            logger.info(f"Capability '{self.name}' ready in {self.load_time:.2f}s")
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for an in-flight load; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get load state, trigger, time and memory."""
+        return {
+            "state": self.state,
+            "trigger": self.trigger,
+            "load_time": self.load_time,
+            "rss_mb": self.rss_mb,
+            "gpu_mb": self.gpu_mb,
+            "error": self.error
+        }
+
+class CapabilityRegistry:
+    """Named capabilities, loaded in the background or on first use."""
+
+    def __init__(self):
+        """Initialize empty registry."""
+        self._capabilities: Dict[str, Capability] = {}
+        self._preload_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register a capability (no-op if the name is already registered)."""
+        if name not in self._capabilities:
+            self._capabilities[name] = Capability(name, loader)
+
+    def require(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Get a loaded capability, loading it now if nothing else has started to.
+
+        Args:
+            name: Capability name
+            timeout: Max seconds to wait for an in-flight background load
+
+        Returns:
+            Value returned by the capability's loader
+
+        Raises:
+            KeyError: Unknown capability
+            RuntimeError: Load failed or timed out
+        """
+        capability = self._capabilities[name]
+        if capability.state == "ready":
+            return capability.value
+
+        if not capability.load(trigger="demand") and not capability.wait(timeout):
+            raise RuntimeError(f"Timed out waiting for capability '{name}'")
+
+        if capability.state != "ready":
+            raise RuntimeError(f"Capability '{name}' unavailable: {capability.error}")
+        return capability.value
+
+    def is_ready(self, name: str) -> bool:
+        """Check whether a capability is loaded."""
+        capability = self._capabilities.get(name)
+        return capability is not None and capability.state == "ready"
+
+    def preload(self, names: Iterable[str]):
+        """Load capabilities one after another on a background thread."""
+        names = [name for name in names if name in self._capabilities]
+        if not names or self._preload_thread is not None:
+            return
+
+        def preload_loop():
+            for name in names:
+                self._capabilities[name].load(trigger="background")
+
+        self._preload_thread = threading.Thread(target=preload_loop, name="capability-preload", daemon=True)
+        self._preload_thread.start()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-capability state, load time and memory."""
+        return {name: capability.get_stats() for name, capability in self._capabilities.items()}
+
+# Global capability registry
+_capability_registry = CapabilityRegistry()
+
+def get_capability_registry() -> CapabilityRegistry:
+    """Get global capability registry instance."""
+    return _capability_registry
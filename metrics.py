@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Latency Metrics for F5-TTS RunPod Serverless
+
+Per-request stage timers and rolling per-stage latency histograms,
+exported periodically in Prometheus text format to the logs directory.
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional
+
+# Add container app directory to path
+sys.path.append('/app')
+
+try:
+    from setup_network_venv import (  # config.py
+        LOGS_PATH, METRICS_EXPORT_INTERVAL, METRICS_WINDOW_SIZE
+    )
+except ImportError:
+    LOGS_PATH = Path("/runpod-volume/f5tts/logs")
+    METRICS_EXPORT_INTERVAL = int(os.getenv("METRICS_EXPORT_INTERVAL", "30"))
+    METRICS_WINDOW_SIZE = int(os.getenv("METRICS_WINDOW_SIZE", "1024"))
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class MetricsRegistry:
+    """Rolling per-stage latency samples with cumulative sum and count."""
+
+    def __init__(self, window_size: int = METRICS_WINDOW_SIZE):
+        """
+        Initialize metrics registry.
+
+        Args:
+            window_size: Number of recent samples kept per stage for quantiles
+        """
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._exporter: Optional[threading.Thread] = None
+
+    def observe(self, stage: str, seconds: float):
+        """Record one stage duration."""
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window_size)
+                self._sums[stage] = 0.0
+                self._counts[stage] = 0
+            self._samples[stage].append(seconds)
+            self._sums[stage] += seconds
+            self._counts[stage] += 1
+
+    def quantile(self, stage: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Get one quantile of a stage's rolling window, or None with too few samples."""
+        with self._lock:
+            values = sorted(self._samples.get(stage, ()))
+        if len(values) < max(min_samples, 1):
+            return None
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get per-stage quantiles over the rolling window.
+
+        Returns:
+            Mapping of stage to p50/p95/p99 (seconds), count and sum
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            sums = dict(self._sums)
+            counts = dict(self._counts)
+
+        snapshot = {}
+        for stage, values in samples.items():
+            stats = {
+                f"p{int(q * 100)}": values[min(int(q * len(values)), len(values) - 1)]
+                for q in QUANTILES
+            }
+            stats["count"] = counts[stage]
+            stats["sum"] = sums[stage]
+            snapshot[stage] = stats
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        """Render stage latencies as a Prometheus summary."""
+        lines = [
+            "# HELP f5tts_stage_duration_seconds Request stage latency over a rolling window",
+            "# TYPE f5tts_stage_duration_seconds summary"
+        ]
+        for stage, stats in sorted(self.snapshot().items()):
+            for q in QUANTILES:
+                value = stats[f"p{int(q * 100)}"]
+                lines.append(f'f5tts_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'f5tts_stage_duration_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'f5tts_stage_duration_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """Write the Prometheus text atomically to ``path``."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, directory: Path = LOGS_PATH, interval: int = METRICS_EXPORT_INTERVAL):
+        """
+        Start a daemon thread that writes metrics every ``interval`` seconds.
+
+        Each worker writes its own file since the logs directory is shared
+        on the network volume.
+        """
+        if self._exporter is not None or interval <= 0:
+            return
+
+        worker_id = os.getenv("RUNPOD_POD_ID", socket.gethostname())
+        path = Path(directory) / f"metrics-{worker_id}.prom"
+
+        def export_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except Exception as e:
+                    logger.warning(f"Failed to export metrics to {path}: {e}")
+
+        self._exporter = threading.Thread(target=export_loop, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+        logger.info(f"Metrics exporter writing to {path} every {interval}s")
+
+class StageTimings:
+    """Stage durations for a single request."""
+
+    def __init__(self):
+        """Initialize empty request timings."""
+        self.timings: Dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        """Record a stage duration (repeated stages accumulate)."""
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        get_metrics_registry().observe(stage, seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as stage ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Get rounded stage durations plus the total elapsed time."""
+        with self._lock:
+            timings = {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        timings["total"] = round(time.perf_counter() - self._start, 4)
+        return timings
+
+# Timings of the request running in the current thread / task
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def request_timings() -> Iterator[StageTimings]:
+    """Collect stage timings for the enclosed request."""
+    timings = StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+@contextmanager
+def stage_timer(name: str) -> Iterator[None]:
+    """
+    Time a stage of the current request.
+
+    Used by engines that don't see the request directly. Outside a request
+    the duration is only recorded in the rolling histograms.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        with timings.stage(name):
+            yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics_registry().observe(name, time.perf_counter() - start)
+
+# Global metrics registry
+_metrics_registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get global metrics registry instance."""
+    return _metrics_registry
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Reference Transcript Store for F5-TTS RunPod Serverless
+
+F5-TTS needs the exact transcript of the reference voice: it conditions on
+it and sizes the generated duration from the reference text/audio ratio.
+Transcripts are resolved once per voice - from the ``voices/*.txt`` sidecar
+in S3, or by ASR when there is none - and persisted by audio content hash
+on the volume and next to the voice in S3. Only callers that ask for it
+wait for ASR (e.g. subtitle jobs, which load WhisperX anyway); others get
+the placeholder while ASR runs in the background, so TTS-only jobs never
+wait on the WhisperX stack. When ASR fails the placeholder is used and
+ASR is not retried for that voice for a while.
+"""
+
+import os
+import sys
+import shutil
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional, Tuple, Union
+
+# Add container app directory to path
+sys.path.append('/app')
+
+from result_cache import content_hash
+
+try:
+    from setup_network_venv import (  # config.py
+        CACHE_PATH, REFERENCE_TRANSCRIPT_RETRY_AFTER
+    )
+except ImportError:
+    CACHE_PATH = Path("/runpod-volume/f5tts/cache")
+    REFERENCE_TRANSCRIPT_RETRY_AFTER = float(os.getenv("REFERENCE_TRANSCRIPT_RETRY_AFTER", "300"))
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Used only when neither a sidecar nor ASR can provide a transcript
+DEFAULT_REFERENCE_TEXT = "This is a reference audio sample."
+
+class ReferenceTranscriptStore:
+    """Per-voice transcripts keyed by the SHA-256 of the reference audio."""
+
+    def __init__(self, cache_dir: Path = CACHE_PATH / "transcripts", retry_after: float = REFERENCE_TRANSCRIPT_RETRY_AFTER):
+        """
+        Initialize transcript store.
+
+        Args:
+            cache_dir: Directory for transcripts persisted on the volume
+            retry_after: Seconds before a voice whose transcription failed is tried again
+        """
+        self.cache_dir = Path(cache_dir)
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._memory: Dict[str, str] = {}
+        self._failed: Dict[str, float] = {}  # key -> monotonic time of the failure
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._background: Dict[str, Path] = {}  # key -> audio snapshot awaiting background ASR
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Counters
+        self.memory_hits = 0
+        self.local_hits = 0
+        self.sidecar_hits = 0
+        self.asr_runs = 0
+        self.asr_seconds = 0.0
+        self.fallbacks = 0
+        self.deferred = 0
+
+    def _local_path(self, key: str) -> Path:
+        """Get the volume file for a key (sharded to keep directories small)."""
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def _save_local(self, key: str, text: str):
+        """Persist a transcript on the volume (atomic write)."""
+        local_path = self._local_path(key)
+        try:
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = local_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, local_path)
+        except OSError as e:
+            logger.warning(f"Failed to persist reference transcript: {e}")
+
+    @staticmethod
+    def sidecar_key(source_url: str) -> Optional[str]:
+        """Get the S3 key of the ``.txt`` sidecar next to a voice, if the URL is on S3."""
+        from s3_client import get_s3_client
+        try:
+            voice_key = get_s3_client().key_from_url(source_url)
+        except ValueError:
+            return None
+        return str(PurePosixPath(voice_key).with_suffix(".txt"))
+
+    def _recently_failed(self, key: str) -> bool:
+        """Check whether resolution failed within ``retry_after`` (caller holds the lock)."""
+        failed_at = self._failed.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < self.retry_after:
+            return True
+        del self._failed[key]
+        return False
+
+    def _transcribe(self, audio_path: Path) -> str:
+        """Transcribe a reference voice with WhisperX."""
+        try:
+            # Shares the lazily loaded WhisperX stack with subtitle jobs
+            from capabilities import get_capability_registry
+            get_capability_registry().require("word_timings")
+        except KeyError:
+            pass  # Not registered (engine used outside the handler)
+
+        from whisperx_engine import get_whisperx_engine
+        result = get_whisperx_engine().transcribe_audio(audio_path)
+        if isinstance(result, dict):
+            result = " ".join(segment["text"].strip() for segment in result.get("segments", []))
+        return " ".join(str(result).split())
+
+    def get_transcript(self, audio_path: Union[str, Path], source_url: Optional[str] = None, wait_for_asr: bool = True) -> str:
+        """
+        Get the transcript of a reference voice.
+
+        Lookup order: memory, volume cache (by audio hash), S3 sidecar
+        (needs ``source_url``), ASR. Sidecar and ASR results are persisted
+        on the volume; ASR results are also written as the S3 sidecar. If
+        nothing resolves, the placeholder is returned for ``retry_after``
+        seconds without trying again.
+
+        Args:
+            audio_path: Local reference audio file
+            source_url: S3 URL the reference was downloaded from
+            wait_for_asr: Run ASR now if it is needed. Otherwise the
+                placeholder is returned and ASR runs in the background;
+                later requests for the voice get the real transcript.
+
+        Returns:
+            Reference transcript
+        """
+        audio_path = Path(audio_path)
+        key = content_hash(audio_path)
+
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self.memory_hits += 1
+                return text
+            if self._recently_failed(key):
+                self.fallbacks += 1
+                return DEFAULT_REFERENCE_TEXT
+            if not wait_for_asr and key in self._background:
+                self.deferred += 1
+                return DEFAULT_REFERENCE_TEXT
+
+        text = self._resolve_once(key, audio_path, source_url, wait_for_asr)
+        if text is not None:
+            return text
+
+        self._transcribe_in_background(key, audio_path, source_url)
+        with self._lock:
+            self.deferred += 1
+        return DEFAULT_REFERENCE_TEXT
+
+    def _resolve_once(self, key: str, audio_path: Path, source_url: Optional[str], allow_asr: bool) -> Optional[str]:
+        """
+        Resolve a transcript that is not in memory, once per voice.
+
+        Returns:
+            Transcript (the placeholder after a failure), or None if only
+            ASR could resolve it and ``allow_asr`` is False
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One resolution per voice, even with concurrent first requests. A
+        # caller that may not run ASR must not wait for one that does either
+        if not key_lock.acquire(blocking=allow_asr):
+            return None
+        try:
+            with self._lock:
+                text = self._memory.get(key)
+                if text is None and self._recently_failed(key):
+                    text = DEFAULT_REFERENCE_TEXT
+            if text is not None:
+                return text
+
+            text, source = self._resolve(key, audio_path, source_url, allow_asr)
+            if text is None:
+                return None
+
+            with self._lock:
+                if source == "local":
+                    self.local_hits += 1
+                elif source == "sidecar":
+                    self.sidecar_hits += 1
+                elif source == "fallback":
+                    self.fallbacks += 1
+                    self._failed[key] = time.monotonic()
+                    return text  # Not cached - retried after retry_after
+                self._memory[key] = text
+        finally:
+            key_lock.release()
+            # Waiters still hold the lock object; later requests hit memory
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+        logger.info(f"Reference transcript from {source}: {text[:60]!r}")
+        return text
+
+    def _transcribe_in_background(self, key: str, audio_path: Path, source_url: Optional[str]):
+        """Queue ASR for a voice unless it is already queued (one voice at a time)."""
+        # The reference may be a download cache file that is evicted once the
+        # job ends - transcribe a link (or copy) of it instead
+        snapshot_path = self.cache_dir / "pending" / f"{key}{audio_path.suffix}"
+        with self._lock:
+            if key in self._background:
+                return
+            self._background[key] = snapshot_path
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reference-asr")
+
+        try:
+            snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            snapshot_path.unlink(missing_ok=True)
+            try:
+                os.link(audio_path, snapshot_path)
+            except OSError:
+                shutil.copyfile(audio_path, snapshot_path)
+        except OSError as e:
+            logger.warning(f"Failed to queue background reference transcription: {e}")
+            with self._lock:
+                self._background.pop(key, None)
+            return
+
+        self._executor.submit(self._background_transcribe, key, snapshot_path, source_url)
+
+    def _background_transcribe(self, key: str, snapshot_path: Path, source_url: Optional[str]):
+        """Resolve a deferred transcript on the background thread."""
+        try:
+            self._resolve_once(key, snapshot_path, source_url, allow_asr=True)
+        except Exception as e:
+            logger.error(f"Background reference transcription failed: {e}")
+        finally:
+            snapshot_path.unlink(missing_ok=True)
+            with self._lock:
+                self._background.pop(key, None)
+
+    def _resolve(self, key: str, audio_path: Path, source_url: Optional[str], allow_asr: bool = True) -> Tuple[Optional[str], str]:
+        """Resolve a transcript that is not in memory; returns (text, source), text None if ASR is needed but not allowed."""
+        try:
+            text = self._local_path(key).read_text(encoding="utf-8").strip()
+            if text:
+                return text, "local"
+        except FileNotFoundError:
+            pass
+
+        sidecar_key = self.sidecar_key(source_url) if source_url else None
+        if sidecar_key:
+            try:
+                from s3_client import get_s3_client
+                text = (get_s3_client().get_text(sidecar_key) or "").strip()
+                if text:
+                    self._save_local(key, text)
+                    return text, "sidecar"
+            except Exception as e:
+                logger.warning(f"Failed to read transcript sidecar {sidecar_key}: {e}")
+
+        if not allow_asr:
+            return None, "asr"
+
+        try:
+            start_time = time.time()
+            text = self._transcribe(audio_path)
+            with self._lock:
+                self.asr_runs += 1
+                self.asr_seconds += time.time() - start_time
+        except Exception as e:
+            logger.error(f"Reference transcription failed - using placeholder text: {e}")
+            return DEFAULT_REFERENCE_TEXT, "fallback"
+
+        if not text:
+            logger.warning("Reference transcription was empty - using placeholder text")
+            return DEFAULT_REFERENCE_TEXT, "fallback"
+
+        self._save_local(key, text)
+        if sidecar_key:
+            try:
+                from s3_client import get_s3_client
+                get_s3_client().put_text(sidecar_key, text)
+            except Exception as e:
+                logger.warning(f"Failed to write transcript sidecar {sidecar_key}: {e}")
+        return text, "asr"
+
+    def get_stats(self) -> dict:
+        """Get lookup counters by source and ASR cost."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "local_hits": self.local_hits,
+                "sidecar_hits": self.sidecar_hits,
+                "asr_runs": self.asr_runs,
+                "asr_seconds": round(self.asr_seconds, 3),
+                "fallbacks": self.fallbacks,
+                "deferred": self.deferred,
+                "pending_asr": len(self._background),
+                "voices": len(self._memory),
+                "failed_voices": len(self._failed)
+            }
+
+# Global transcript store instance
+_transcript_store = None
+_transcript_store_lock = threading.Lock()
+
+def get_transcript_store() -> ReferenceTranscriptStore:
+    """Get global reference transcript store instance."""
+    global _transcript_store
+    if _transcript_store is None:
+        with _transcript_store_lock:
+            if _transcript_store is None:
+                _transcript_store = ReferenceTranscriptStore()
+    return _transcript_store
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Result Cache for F5-TTS RunPod Serverless
+
+Content-addressed cache of finished TTS results. Repeated requests (same
+text, voice, reference transcript and model) are answered with the
+existing S3 URL and timings instead of running inference again.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Add container app directory to path
+sys.path.append('/app')
+
+try:
+    from setup_network_venv import (  # config.py
+        CACHE_PATH, RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_BYTES
+    )
+except ImportError:
+    CACHE_PATH = Path("/runpod-volume/f5tts/cache")
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Files whose content hash is remembered (by path, size and mtime)
+CONTENT_HASH_MEMO_SIZE = 1024
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Fields describing one request rather than the result - never served from the cache
+REQUEST_FIELDS = ("processing_time", "timings", "boot_timeline", "cache")
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different requests share a cache key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def hash_file(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """Get the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_content_hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_content_hashes_lock = threading.Lock()
+
+def content_hash(path: Union[str, Path]) -> str:
+    """
+    Get the SHA-256 of a file's content, memoized by path, size and mtime.
+
+    Shared by the result, reference and transcript caches so a reference
+    voice is hashed once, not once per cache. The memo is an LRU bounded
+    by CONTENT_HASH_MEMO_SIZE files.
+    """
+    path = Path(path)
+    stat = path.stat()
+    identity = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _content_hashes_lock:
+        digest = _content_hashes.get(identity)
+        if digest is not None:
+            _content_hashes.move_to_end(identity)
+            return digest
+
+    digest = hash_file(path)
+    with _content_hashes_lock:
+        _content_hashes[identity] = digest
+        while len(_content_hashes) > CONTENT_HASH_MEMO_SIZE:
+            _content_hashes.popitem(last=False)
+    return digest
+
+class ResultCache:
+    """
+    LRU index of TTS results stored as small JSON entries on the network volume.
+
+    Entries are one file per key, so workers sharing the volume can read
+    each other's results. Eviction keeps the total entry size under
+    ``max_bytes``, oldest access first.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_PATH / "results", max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        """
+        Initialize result cache.
+
+        Args:
+            cache_dir: Directory holding cache entries
+            max_bytes: Total entry size budget before eviction
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> entry size
+        self._total_bytes = 0
+        self._loaded = False
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(
+        self,
+        text: str,
+        reference_audio_path: Union[str, Path],
+        model_name: str,
+        compute_type: str,
+        **extra: Any
+    ) -> str:
+        """
+        Build a content-addressed cache key.
+
+        Args:
+            text: Text to synthesize (normalized before hashing)
+            reference_audio_path: Reference voice file (hashed by content)
+            model_name: F5-TTS model name
+            compute_type: Model compute type
+            **extra: Other output-affecting options (e.g. subtitle settings)
+
+        Returns:
+            SHA-256 hex key
+        """
+        payload = {
+            "text": normalize_text(text),
+            "reference_sha256": content_hash(reference_audio_path),
+            "model_name": model_name,
+            "compute_type": compute_type,
+            "extra": extra
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        """Get the entry file for a key (sharded to keep directories small)."""
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        """Build the LRU index from entries on disk (caller holds the lock)."""
+        if self._loaded:
+            return
+
+        entries = []
+        if self.cache_dir.exists():
+            for entry_path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry_path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+        self._loaded = True
+        logger.info(f"Result cache index loaded: {len(self._index)} entries, {self._total_bytes} bytes")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            Cached result dict, or None on a miss
+        """
+        entry_path = self._entry_path(key)
+        try:
+            data = entry_path.read_bytes()
+            result = json.loads(data)
+            os.utime(entry_path)  # Refresh LRU position for other workers
+        except (OSError, json.JSONDecodeError) as e:
+            # Best-effort cache - an unreadable volume is treated as a miss
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Failed to read result cache entry {key[:16]}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result.pop("cached_at", None)
+
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                # Written by another worker on the same volume
+                self._index[key] = len(data)
+                self._total_bytes += len(data)
+            self._index.move_to_end(key)
+            self.hits += 1
+
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """
+        Store a result and evict the least recently used entries over budget.
+
+        Per-request fields (REQUEST_FIELDS) are not stored. Write failures
+        (e.g. a full or read-only volume) are logged and otherwise ignored.
+
+        Args:
+            key: Cache key from make_key()
+            result: JSON-serializable result to store
+        """
+        entry_path = self._entry_path(key)
+        stored = {name: value for name, value in result.items() if name not in REQUEST_FIELDS}
+        data = json.dumps({**stored, "cached_at": time.time()}).encode("utf-8")
+
+        # Atomic write - readers never see a partial entry
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logger.warning(f"Failed to write result cache entry {key[:16]}: {e}")
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._load_index()
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    self._entry_path(old_key).unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning(f"Failed to evict result cache entry {old_key[:16]}: {e}")
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and cache size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes
+            }
+
+# Global result cache instance
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Get global result cache instance, or None if caching is disabled."""
+    global _result_cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
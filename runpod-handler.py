@@ -13,12 +13,26 @@ Architecture:
 """
 
 import os
+import io
 import sys
 import json
+import base64
+import tempfile
+import contextvars
+import time
+import asyncio
 import logging
+import threading
 import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Generator, Optional, Tuple
+
+from capabilities import get_capability_registry
+from bootstrap import bootstrap_environment, get_bootstrap_info, get_import_report, start_import_report
+from metrics import get_metrics_registry, request_timings, stage_timer
+from setup_lock import run_exclusive, run_exclusive_setup
 
 # Configure logging
 logging.basicConfig(
@@ -31,11 +45,49 @@ logger = logging.getLogger(__name__)
 NETWORK_VOLUME_PATH = Path("/runpod-volume/f5tts")
 VENV_PATH = NETWORK_VOLUME_PATH / "venv"
 SETUP_COMPLETE_FLAG = NETWORK_VOLUME_PATH / "setup_complete.flag"
+TEMP_PATH = NETWORK_VOLUME_PATH / "temp"
+
+# Job intake mode: "sync" handles one job at a time, "async" accepts up to
+# MAX_CONCURRENCY jobs so S3 I/O of one job overlaps inference of another,
+# "stream" registers a generator handler that emits audio per sentence
+HANDLER_MODE = os.getenv("HANDLER_MODE", "sync")
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "4"))
+MIN_FREE_GPU_MEMORY_MB = int(os.getenv("MIN_FREE_GPU_MEMORY_MB", "2048"))
+CONCURRENCY_COOLDOWN = float(os.getenv("CONCURRENCY_COOLDOWN", "10"))
+
+# Optional capabilities loaded in the background after the TTS path is ready
+# (comma-separated; empty = load only when a job first needs them)
+CAPABILITY_PRELOAD = [name for name in os.getenv("CAPABILITY_PRELOAD", "word_timings").split(",") if name]
+
+# Batch input mode ("texts": [...])
+MAX_BATCH_TEXTS = int(os.getenv("MAX_BATCH_TEXTS", "500"))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+
+# Worker boot state - populated once by boot_worker() before jobs are accepted
+_boot_timeline: Dict[str, Any] = {"completed": False}
+_setup_lock = threading.Lock()
+
+# Async intake state - only touched from the event loop thread
+_inflight_jobs = 0
+_job_executor: Optional[ThreadPoolExecutor] = None
+_last_concurrency_change = 0.0
 
 def check_setup_complete() -> bool:
     """Check if network volume setup is complete."""
     return SETUP_COMPLETE_FLAG.exists()
 
+def load_setup_module():
+    """Import the setup environment module (validate-storage-config.py) once."""
+    if "setup_environment" in sys.modules:
+        return sys.modules["setup_environment"]
+    
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("setup_environment", "/app/validate-storage-config.py")
+    setup_module = importlib.util.module_from_spec(spec)
+    sys.modules["setup_environment"] = setup_module
+    spec.loader.exec_module(setup_module)
+    return setup_module
+
 def setup_environment():
     """Setup network volume environment on first run."""
     try:
@@ -51,19 +103,12 @@ def setup_environment():
         logger.info("Created directory structure")
         
         # Import setup environment module
-        import importlib.util
-import sys
-spec = importlib.util.spec_from_file_location("setup_environment", "/app/validate-storage-config.py")
-setup_environment = importlib.util.module_from_spec(spec)
-sys.modules["setup_environment"] = setup_environment
-spec.loader.exec_module(setup_environment)
-setup_network_volume_environment = setup_environment.setup_network_volume_environment
-        
-        # Run the full setup
-        setup_network_volume_environment()
+        setup_network_volume_environment = load_setup_module().setup_network_volume_environment
         
-        # Mark setup as complete
-        SETUP_COMPLETE_FLAG.touch()
+        # Run the full setup on one worker; others sharing the volume wait for it
+        lease_result = run_exclusive_setup(setup_network_volume_environment)
+        _boot_timeline["setup_role"] = lease_result["role"]
+        _boot_timeline["setup_wait_time"] = lease_result["wait_time"]
         logger.info("Environment setup completed successfully")
         
     except Exception as e:
@@ -71,291 +116,309 @@ setup_network_volume_environment = setup_environment.setup_network_volume_enviro
         logger.error(traceback.format_exc())
         raise
 
+def verify_environment():
+    """
+    Check the venv against its integrity manifest on a warm boot.
+    
+    Missing or changed distributions are reinstalled from the wheelhouse
+    under the setup lease. If repair is not possible the setup flag is
+    cleared and the resumable setup runs instead, force-reinstalling the
+    broken distributions; the manifest is only rewritten once they pass
+    a RECORD hash check.
+    """
+    setup_module = load_setup_module()
+    result = setup_module.verify_venv_manifest()
+    _boot_timeline["integrity_check"] = result
+    
+    if result["ok"]:
+        logger.info(f"Venv integrity verified in {result['seconds']:.3f}s ({result['checked_files']} files)")
+        return
+    
+    if not result["manifest"]:
+        # Volume set up before manifests existed - record the current state
+        logger.warning("No venv integrity manifest - writing one from the current venv")
+        setup_module.write_venv_manifest()
+        return
+    
+    broken = result["missing"] + result["changed"]
+    logger.warning(f"Venv integrity check failed for: {', '.join(broken)}")
+    
+    def repair():
+        # Another worker may have repaired it while we waited for the lease
+        recheck = setup_module.verify_venv_manifest()
+        if recheck["ok"]:
+            return True
+        return setup_module.repair_distributions(recheck["missing"] + recheck["changed"])
+    
+    if run_exclusive(repair):
+        _boot_timeline["integrity_repaired"] = broken
+        return
+    
+    logger.error("Venv repair failed - rerunning environment setup")
+    # Their versions still match the lock, so the install would skip them otherwise
+    setup_module.request_reinstall(broken)
+    setup_module.clear_step_markers("runtime_requirements", "verify")
+    SETUP_COMPLETE_FLAG.unlink(missing_ok=True)
+    setup_environment()
+
 def activate_virtual_environment():
-    """Activate the virtual environment and update Python path."""
+    """Activate the virtual environment once per process (see bootstrap.py)."""
     try:
-        # Add virtual environment to Python path
-        venv_site_packages = VENV_PATH / "lib" / "python3.10" / "site-packages"
-        if venv_site_packages.exists():
-            sys.path.insert(0, str(venv_site_packages))
-            logger.info(f"Activated virtual environment: {VENV_PATH}")
-        else:
-            raise RuntimeError(f"Virtual environment not found: {venv_site_packages}")
-            
+        with stage_timer("venv_activation"):
+            _boot_timeline["bootstrap"] = bootstrap_environment(VENV_PATH)
     except Exception as e:
         logger.error(f"Failed to activate virtual environment: {e}")
         raise
 
+def _load_f5tts_engine() -> Tuple[Any, Dict[str, Any]]:
+    """Import, load and warm up the global F5-TTS engine."""
+    start_time = time.time()
+    from f5tts_engine import get_f5tts_engine
+    import_time = time.time() - start_time
+    
+    engine = get_f5tts_engine()
+    engine.load_model()
+    
+    return engine, {
+        "import_time": round(import_time, 3),
+        "model_load_time": engine.model_load_time,
+        "warmup_time": engine.warmup_time
+    }
+
+def _load_whisperx_engine() -> Tuple[Any, Dict[str, Any]]:
+    """Import, load and warm up the global WhisperX engine."""
+    start_time = time.time()
+    from whisperx_engine import get_whisperx_engine
+    import_time = time.time() - start_time
+    
+    engine = get_whisperx_engine()
+    start_time = time.time()
+    engine.load_models()
+    model_load_time = time.time() - start_time
+    
+    return engine, {
+        "import_time": round(import_time, 3),
+        "model_load_time": round(model_load_time, 3),
+        "warmup_time": getattr(engine, "warmup_time", None)
+    }
+
+def register_capabilities():
+    """Register optional components that load lazily (see capabilities.py)."""
+    registry = get_capability_registry()
+    # WhisperX ASR + forced alignment (pulls in pyannote and faster-whisper),
+    # only needed for create_subtitles
+    registry.register("word_timings", _load_whisperx_engine)
+
 def load_models():
-    """Load F5-TTS and WhisperX models for warm inference."""
+    """Load the F5-TTS model for warm inference; optional stacks load lazily."""
     try:
         # Import heavy ML modules (only available after environment setup)
-        from f5tts_engine import F5TTSEngine
-        from whisperx_engine import WhisperXEngine
-        
-        # Initialize engines with model caching
-        f5tts_engine = F5TTSEngine()
-        whisperx_engine = WhisperXEngine()
+        f5tts_engine, f5tts_timings = _load_f5tts_engine()
+        _boot_timeline["engines"] = {"f5tts": f5tts_timings}
         
         logger.info("Models loaded successfully for warm inference")
-        return f5tts_engine, whisperx_engine
+        return f5tts_engine
         
     except Exception as e:
         logger.error(f"Failed to load models: {e}")
         logger.error(traceback.format_exc())
         raise
 
-def process_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
-    """Process F5-TTS request with word-level timing and subtitle generation."""
-    try:
-        # Extract input parameters
-        text = job_input.get("text")
-        audio_url = job_input.get("audio_url")
-        voice_reference_url = job_input.get("voice_reference_url")
-        options = job_input.get("options", {})
-        
-        if not text:
-            raise ValueError("Missing required parameter: text")
-        if not voice_reference_url:
-            raise ValueError("Missing required parameter: voice_reference_url")
-            
-        logger.info(f"Processing F5-TTS request for text length: {len(text)}")
-        
-        # Import processing modules
-        from f5tts_engine import process_tts
-        from whisperx_engine import generate_word_timings
-        from subtitle_generator import create_ass_subtitles
-        from s3_client import upload_audio_to_s3, download_audio_from_s3
-        
-        # Download reference voice if needed
-        reference_audio_path = None
-        if voice_reference_url:
-            reference_audio_path = download_audio_from_s3(voice_reference_url)
-            logger.info("Downloaded reference voice audio")
-        
-        # Generate speech with F5-TTS
-        output_audio_path = process_tts(
-            text=text,
-            reference_audio_path=reference_audio_path
-        )
-        logger.info("Generated speech with F5-TTS")
-        
-        # Generate word-level timings if requested
-        word_timings = None
-        subtitles_url = None
-        
-        if options.get("create_subtitles", False):
-            word_timings = generate_word_timings(output_audio_path, text)
-            logger.info("Generated word-level timings")
-            
-            # Create ASS subtitles if requested
-            if options.get("subtitle_format") == "ass":
-                subtitles_path = create_ass_subtitles(word_timings, text)
-                subtitles_url = upload_audio_to_s3(subtitles_path, "subtitles")
-                logger.info("Created ASS subtitles")
-        
-        # Upload output audio to S3
-        output_audio_url = upload_audio_to_s3(output_audio_path, "output")
-        logger.info("Uploaded output audio to S3")
-        
-        # Prepare response
-        response = {
-            "audio_url": output_audio_url,
-            "processing_time": None,  # TODO: Add timing
-            "text_length": len(text),
-            "success": True
-        }
-        
-        if word_timings:
-            response["word_timings"] = word_timings
-            
-        if subtitles_url:
-            response["subtitles_url"] = subtitles_url
-            
-        logger.info("Request processed successfully")
-        return response
-        
-    except Exception as e:
-        logger.error(f"Failed to process request: {e}")
-        logger.error(traceback.format_exc())
-        return {
-            "error": str(e),
-            "success": False
-        }
-
-def handler(job: Dict[str, Any]) -> Dict[str, Any]:
+def boot_worker() -> Dict[str, Any]:
     """
-    Main RunPod serverless handler.
+    Prepare the worker before it starts accepting jobs.
     
-    Implements 2-layer architecture:
-    1. Cold start: Setup network volume environment
-    2. Warm loading: Use cached models for fast inference
+    Runs environment setup (if needed), activates the virtual environment
+    and preloads the F5-TTS engine so the first job is served warm. Optional
+    capabilities (WhisperX word timings) then load in the background without
+    blocking job intake. Failures are recorded in the boot timeline and the
+    handler falls back to lazy setup.
+    
+    Returns:
+        Boot timeline with per-stage durations in seconds
     """
+    boot_start = time.time()
+    logger.info("Booting F5-TTS worker...")
+    
+    get_metrics_registry().start_exporter()
+    register_capabilities()
+    
+    # boto3 ships in the container image, so S3 connections can be opened
+    # while the environment and models load
     try:
-        logger.info("F5-TTS RunPod Serverless Handler v3.0 starting...")
-        
-        job_input = job.get("input", {})
-        job_id = job.get("id", "unknown")
-        
-        logger.info(f"Processing job {job_id}")
-        
-        # Check if environment setup is required (cold start)
+        from s3_client import start_prewarm
+        start_prewarm()
+    except Exception as e:
+        logger.warning(f"Failed to start S3 pre-warm: {e}")
+    
+    try:
+        stage_start = time.time()
         if not check_setup_complete():
             logger.info("Cold start detected - setting up environment...")
             setup_environment()
         else:
-            logger.info("Warm start - using existing environment")
-            
-        # Activate virtual environment with ML dependencies
+            verify_environment()
+        _boot_timeline["setup_time"] = round(time.time() - stage_start, 3)
+        
+        stage_start = time.time()
         activate_virtual_environment()
+        _boot_timeline["venv_activation_time"] = round(time.time() - stage_start, 3)
         
-        # Process the request
-        result = process_request(job_input)
+        stage_start = time.time()
+        load_models()
+        _boot_timeline["model_load_time"] = round(time.time() - stage_start, 3)
         
-        logger.info(f"Job {job_id} completed")
-        return {"output": result}
+        _boot_timeline["completed"] = True
         
-    except Exception as e:
-        error_msg = f"Handler failed: {str(e)}"
-        logger.error(error_msg)
-        logger.error(traceback.format_exc())
+        # TTS is ready - bring up optional stacks without blocking job intake
+        get_capability_registry().preload(CAPABILITY_PRELOAD)
         
-        return {
-            "error": error_msg,
-            "traceback": traceback.format_exc()
-        }
+        # Measured out of process, after boot, so it never delays the first job
+        start_import_report()
+        
+    except Exception as e:
+        logger.error(f"Worker boot failed - falling back to lazy loading: {e}")
+        _boot_timeline["error"] = str(e)
+    
+    _boot_timeline["total_time"] = round(time.time() - boot_start, 3)
+    logger.info(f"Worker boot finished in {_boot_timeline['total_time']:.2f}s")
+    return _boot_timeline
 
-# RunPod serverless entry point
-if __name__ == "__main__":
+def get_boot_timeline() -> Dict[str, Any]:
+    """Get a copy of the worker boot timeline for inclusion in responses."""
+    timeline = dict(_boot_timeline)
+    timeline["capabilities"] = get_capability_registry().get_stats()
+    
+    # Also used on failure paths - must not mask the original error
     try:
-        import runpod
-        logger.info("Starting RunPod serverless worker...")
-        runpod.serverless.start({"handler": handler})
-    except ImportError:
-        logger.error("RunPod library not available - running in test mode")
-        # Test mode for local development
-        test_job = {
-            "id": "test-123",
-            "input": {
-                "text": "Hello world, this is a test.",
-                "voice_reference_url": "s3://test-bucket/reference.wav",
-                "options": {
-                    "create_subtitles": True,
-                    "subtitle_format": "ass"
-                }
-            }
-        }
-        result = handler(test_job)
-        print(json.dumps(result, indent=2))#!/usr/bin/env python3
-"""
-F5-TTS RunPod Serverless Handler - v3.0
-2-Layer Architecture Implementation
-
-Layer 1: This file (runs in slim container)
-Layer 2: Heavy ML dependencies (installed on network volume at runtime)
-
-Architecture:
-- Cold start: Setup network volume environment and install dependencies
-- Warm loading: Use cached models for 1-3s inference
-- Error resilient: Comprehensive error handling and recovery
-"""
+        from s3_client import get_prewarm_info
+        timeline["s3_prewarm"] = get_prewarm_info()
+    except Exception as e:
+        timeline["s3_prewarm"] = {"error": str(e)}
+    return timeline
 
-import os
-import sys
-import json
-import logging
-import traceback
-from pathlib import Path
-from typing import Dict, Any, Optional
+def submit_in_context(executor: ThreadPoolExecutor, fn, *args):
+    """Submit ``fn`` so its stage timings are recorded into the calling request."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-# Configuration constants
-NETWORK_VOLUME_PATH = Path("/runpod-volume/f5tts")
-VENV_PATH = NETWORK_VOLUME_PATH / "venv"
-SETUP_COMPLETE_FLAG = NETWORK_VOLUME_PATH / "setup_complete.flag"
+def validate_synthesis_options(options: Dict[str, Any]):
+    """
+    Reject synthesis options the engine cannot apply.
+    
+    The engine samples with F5-TTS defaults and has no seed or speed
+    control, so requests asking for them fail instead of silently getting
+    default output (and cache entries that claim otherwise).
+    """
+    if options.get("seed") is not None:
+        raise ValueError("Option seed is not supported")
+    if options.get("speed", 1.0) != 1.0:
+        raise ValueError("Option speed is not supported (only 1.0)")
 
-def check_setup_complete() -> bool:
-    """Check if network volume setup is complete."""
-    return SETUP_COMPLETE_FLAG.exists()
+def prepare_reference(voice_reference_url: str, wait_for_asr: bool = False) -> Tuple[Path, str]:
+    """
+    Download a reference voice and resolve its transcript.
+    
+    The transcript comes from the store (volume cache, ``voices/*.txt``
+    sidecar, or a one-time ASR pass), so the engine finds it in memory.
+    Unless ``wait_for_asr`` is set, a voice that needs ASR gets the
+    placeholder text for this job and is transcribed in the background.
+    The audio may be the download cache's own file - pass it to
+    ``release_download`` once the job no longer needs it.
+    
+    Returns:
+        Tuple of (reference_audio_path, reference_text)
+    """
+    from s3_client import download_audio_from_s3
+    from reference_transcripts import get_transcript_store
+    
+    with stage_timer("reference_download"):
+        reference_audio_path = download_audio_from_s3(voice_reference_url)
+    with stage_timer("reference_transcript"):
+        reference_text = get_transcript_store().get_transcript(reference_audio_path, voice_reference_url, wait_for_asr=wait_for_asr)
+    return reference_audio_path, reference_text
 
-def setup_environment():
-    """Setup network volume environment on first run."""
+def process_batch_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process many texts with one reference voice in a single job.
+    
+    The reference is downloaded and preprocessed once, all items are
+    synthesized through the batching engine, and outputs are uploaded
+    concurrently.
+    """
+    reference_audio_path = None
     try:
-        logger.info("Setting up network volume environment...")
+        start_time = time.time()
+        texts = job_input.get("texts")
+        voice_reference_url = job_input.get("voice_reference_url")
+        options = job_input.get("options", {})
         
-        # Create directory structure
-        NETWORK_VOLUME_PATH.mkdir(parents=True, exist_ok=True)
-        (NETWORK_VOLUME_PATH / "models").mkdir(exist_ok=True)
-        (NETWORK_VOLUME_PATH / "temp").mkdir(exist_ok=True)
-        (NETWORK_VOLUME_PATH / "logs").mkdir(exist_ok=True)
-        (NETWORK_VOLUME_PATH / "cache").mkdir(exist_ok=True)
+        if not isinstance(texts, list) or not texts:
+            raise ValueError("Parameter texts must be a non-empty list")
+        if len(texts) > MAX_BATCH_TEXTS:
+            raise ValueError(f"Too many texts in batch: {len(texts)} (max {MAX_BATCH_TEXTS})")
+        if not all(isinstance(text, str) and text.strip() for text in texts):
+            raise ValueError("Every entry in texts must be a non-empty string")
+        if not voice_reference_url:
+            raise ValueError("Missing required parameter: voice_reference_url")
+        validate_synthesis_options(options)
         
-        logger.info("Created directory structure")
+        logger.info(f"Processing F5-TTS batch request with {len(texts)} texts")
         
-        # Import setup environment module
-        import importlib.util
-import sys
-spec = importlib.util.spec_from_file_location("setup_environment", "/app/validate-storage-config.py")
-setup_environment = importlib.util.module_from_spec(spec)
-sys.modules["setup_environment"] = setup_environment
-spec.loader.exec_module(setup_environment)
-setup_network_volume_environment = setup_environment.setup_network_volume_environment
+        from f5tts_engine import get_f5tts_engine, encode_wav
+        from s3_client import upload_audio_bytes_to_s3
         
-        # Run the full setup
-        setup_network_volume_environment()
+        reference_audio_path, _ = prepare_reference(voice_reference_url, options.get("wait_for_transcript", False))
         
-        # Mark setup as complete
-        SETUP_COMPLETE_FLAG.touch()
-        logger.info("Environment setup completed successfully")
+        waveforms = get_f5tts_engine().synthesize_batch(texts, reference_audio_path)
         
-    except Exception as e:
-        logger.error(f"Failed to setup environment: {e}")
-        logger.error(traceback.format_exc())
-        raise
-
-def activate_virtual_environment():
-    """Activate the virtual environment and update Python path."""
-    try:
-        # Add virtual environment to Python path
-        venv_site_packages = VENV_PATH / "lib" / "python3.10" / "site-packages"
-        if venv_site_packages.exists():
-            sys.path.insert(0, str(venv_site_packages))
-            logger.info(f"Activated virtual environment: {VENV_PATH}")
-        else:
-            raise RuntimeError(f"Virtual environment not found: {venv_site_packages}")
-            
-    except Exception as e:
-        logger.error(f"Failed to activate virtual environment: {e}")
-        raise
-
-def load_models():
-    """Load F5-TTS and WhisperX models for warm inference."""
-    try:
-        # Import heavy ML modules (only available after environment setup)
-        from f5tts_engine import F5TTSEngine
-        from whisperx_engine import WhisperXEngine
+        def write_and_upload(index: int) -> Dict[str, Any]:
+            item_start = time.time()
+            audio_url = upload_audio_bytes_to_s3(encode_wav(waveforms[index]), f"batch_{index:04d}.wav", "output")
+            get_metrics_registry().observe("upload_audio", time.time() - item_start)
+            return {
+                "index": index,
+                "audio_url": audio_url,
+                "text_length": len(texts[index]),
+                "duration": waveforms[index].shape[-1] / 24000,
+                "upload_time": round(time.time() - item_start, 3)
+            }
         
-        # Initialize engines with model caching
-        f5tts_engine = F5TTSEngine()
-        whisperx_engine = WhisperXEngine()
+        # Per-item uploads are recorded individually; this is the wall time
+        with stage_timer("batch_upload"):
+            with ThreadPoolExecutor(max_workers=BATCH_UPLOAD_CONCURRENCY, thread_name_prefix="batch-upload") as executor:
+                # Submitted in context so uploads are named after the job
+                futures = [submit_in_context(executor, write_and_upload, index) for index in range(len(texts))]
+                items = [future.result() for future in futures]
         
-        logger.info("Models loaded successfully for warm inference")
-        return f5tts_engine, whisperx_engine
+        logger.info(f"Batch request processed successfully: {len(items)} items")
+        return {
+            "items": items,
+            "count": len(items),
+            "processing_time": round(time.time() - start_time, 3),
+            "success": True
+        }
         
     except Exception as e:
-        logger.error(f"Failed to load models: {e}")
+        logger.error(f"Failed to process batch request: {e}")
         logger.error(traceback.format_exc())
-        raise
+        return {
+            "error": str(e),
+            "success": False
+        }
+    finally:
+        if reference_audio_path is not None:
+            from s3_client import release_download
+            release_download(reference_audio_path)
 
 def process_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
     """Process F5-TTS request with word-level timing and subtitle generation."""
+    if "texts" in job_input:
+        return process_batch_request(job_input)
+    
+    reference_audio_path = None
     try:
+        start_time = time.time()
+        
         # Extract input parameters
         text = job_input.get("text")
         audio_url = job_input.get("audio_url")
@@ -366,50 +429,104 @@ def process_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
             raise ValueError("Missing required parameter: text")
         if not voice_reference_url:
             raise ValueError("Missing required parameter: voice_reference_url")
+        validate_synthesis_options(options)
             
         logger.info(f"Processing F5-TTS request for text length: {len(text)}")
         
         # Import processing modules
-        from f5tts_engine import process_tts
-        from whisperx_engine import generate_word_timings
+        from f5tts_engine import get_f5tts_engine
         from subtitle_generator import create_ass_subtitles
-        from s3_client import upload_audio_to_s3, download_audio_from_s3
-        
-        # Download reference voice if needed
-        reference_audio_path = None
-        if voice_reference_url:
-            reference_audio_path = download_audio_from_s3(voice_reference_url)
-            logger.info("Downloaded reference voice audio")
-        
-        # Generate speech with F5-TTS
-        output_audio_path = process_tts(
-            text=text,
-            reference_audio_path=reference_audio_path
-        )
+        from s3_client import upload_audio_to_s3, upload_audio_bytes_to_s3
+        from result_cache import get_result_cache
+        
+        # Download reference voice and resolve its transcript. Subtitle jobs
+        # load WhisperX anyway, so they wait for ASR; TTS-only jobs don't
+        wait_for_asr = options.get("create_subtitles", False) or options.get("wait_for_transcript", False)
+        reference_audio_path, reference_text = prepare_reference(voice_reference_url, wait_for_asr)
+        logger.info("Downloaded reference voice audio")
+        
+        # Repeated requests are answered from the result cache without inference
+        result_cache = get_result_cache()
+        cache_key = None
+        if result_cache is not None:
+            engine = get_f5tts_engine()
+            cache_key = result_cache.make_key(
+                text=text,
+                reference_audio_path=reference_audio_path,
+                model_name=engine.model_name,
+                compute_type=engine.compute_type,
+                reference_text=reference_text,
+                create_subtitles=options.get("create_subtitles", False),
+                subtitle_format=options.get("subtitle_format")
+            )
+            with stage_timer("cache_lookup"):
+                cached_response = result_cache.get(cache_key)
+            if cached_response is not None:
+                # Timings and boot timeline are this request's, added by handler()
+                logger.info("Result cache hit - skipping inference")
+                cached_response["processing_time"] = round(time.time() - start_time, 3)
+                cached_response["cache"] = {"hit": True, **result_cache.get_stats()}
+                return cached_response
+        
+        # Generate speech with F5-TTS, kept in memory (no network volume round trip)
+        output_audio = get_f5tts_engine().synthesize_wav(text, reference_audio_path)
+        output_filename = f"f5tts_output_{int(time.time())}_{uuid.uuid4().hex[:8]}.wav"
         logger.info("Generated speech with F5-TTS")
         
-        # Generate word-level timings if requested
+        # Post-synthesis stages run as a small dependency graph:
+        #   wav -> upload_audio
+        #   wav -> word_timings -> subtitle_build -> upload_subtitles
+        # so the audio upload is off the critical path of subtitle jobs
         word_timings = None
         subtitles_url = None
-        
-        if options.get("create_subtitles", False):
-            word_timings = generate_word_timings(output_audio_path, text)
-            logger.info("Generated word-level timings")
+        subtitle_builders = {"ass": create_ass_subtitles}
+        
+        def upload_audio() -> str:
+            with stage_timer("upload_audio"):
+                url = upload_audio_bytes_to_s3(output_audio, output_filename, "output")
+            logger.info("Uploaded output audio to S3")
+            return url
+        
+        def build_and_upload_subtitles(subtitle_format: str) -> str:
+            with stage_timer("subtitle_build"):
+                subtitles_path = subtitle_builders[subtitle_format](word_timings, text)
+            with stage_timer("upload_subtitles"):
+                url = upload_audio_to_s3(subtitles_path, "subtitles")
+            logger.info(f"Created {subtitle_format.upper()} subtitles")
+            return url
+        
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="post-synth") as executor:
+            audio_future = submit_in_context(executor, upload_audio)
             
-            # Create ASS subtitles if requested
-            if options.get("subtitle_format") == "ass":
-                subtitles_path = create_ass_subtitles(word_timings, text)
-                subtitles_url = upload_audio_to_s3(subtitles_path, "subtitles")
-                logger.info("Created ASS subtitles")
-        
-        # Upload output audio to S3
-        output_audio_url = upload_audio_to_s3(output_audio_path, "output")
-        logger.info("Uploaded output audio to S3")
+            subtitles_future = None
+            if options.get("create_subtitles", False):
+                # WhisperX transcription + alignment, overlapping the audio upload.
+                # Waits here only if the background load has not finished yet.
+                with stage_timer("capability_wait"):
+                    get_capability_registry().require("word_timings")
+                from whisperx_engine import generate_word_timings
+                # Total; the engine records whisperx_transcribe and whisperx_align inside it
+                with stage_timer("word_timings"):
+                    # WhisperX reads audio from a file - use local scratch, not the volume
+                    with tempfile.NamedTemporaryFile(suffix=".wav") as audio_file:
+                        audio_file.write(output_audio)
+                        audio_file.flush()
+                        word_timings = generate_word_timings(audio_file.name, text)
+                logger.info("Generated word-level timings")
+                
+                # Build and upload subtitles as soon as timings exist
+                subtitle_format = options.get("subtitle_format")
+                if subtitle_format in subtitle_builders:
+                    subtitles_future = submit_in_context(executor, build_and_upload_subtitles, subtitle_format)
+            
+            output_audio_url = audio_future.result()
+            if subtitles_future is not None:
+                subtitles_url = subtitles_future.result()
         
         # Prepare response
         response = {
             "audio_url": output_audio_url,
-            "processing_time": None,  # TODO: Add timing
+            "processing_time": round(time.time() - start_time, 3),
             "text_length": len(text),
             "success": True
         }
@@ -419,6 +536,10 @@ def process_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
             
         if subtitles_url:
             response["subtitles_url"] = subtitles_url
+        
+        if result_cache is not None:
+            result_cache.put(cache_key, response)
+            response["cache"] = {"hit": False, **result_cache.get_stats()}
             
         logger.info("Request processed successfully")
         return response
@@ -430,6 +551,200 @@ def process_request(job_input: Dict[str, Any]) -> Dict[str, Any]:
             "error": str(e),
             "success": False
         }
+    finally:
+        if reference_audio_path is not None:
+            from s3_client import release_download
+            release_download(reference_audio_path)
+
+def get_diagnostics(refresh: bool = False) -> Dict[str, Any]:
+    """
+    Get startup diagnostics for the "diagnostics" job input.
+    
+    Args:
+        refresh: Re-measure import times instead of using the cached report
+    """
+    from s3_client import get_download_cache, get_transfer_stats, get_upload_deduplicator
+    
+    download_cache = get_download_cache()
+    upload_deduplicator = get_upload_deduplicator()
+    return {
+        "boot_timeline": get_boot_timeline(),
+        "bootstrap": get_bootstrap_info(),
+        "sys_path": list(sys.path),
+        "import_report": get_import_report(refresh=refresh),
+        "s3_cache": download_cache.get_stats() if download_cache is not None else None,
+        "s3_transfers": get_transfer_stats(),
+        "s3_uploads": upload_deduplicator.get_stats() if upload_deduplicator is not None else None,
+        "success": True
+    }
+
+def ensure_environment():
+    """Make sure the environment is ready, falling back to per-job setup if boot failed."""
+    if _boot_timeline["completed"]:
+        logger.info("Warm start - environment and models preloaded at boot")
+        return
+    
+    # Boot did not finish - fall back to per-job setup (serialized so
+    # concurrent jobs don't install the environment twice)
+    with _setup_lock:
+        if not check_setup_complete():
+            logger.info("Cold start detected - setting up environment...")
+            with stage_timer("environment_setup"):
+                setup_environment()
+        else:
+            logger.info("Warm start - using existing environment")
+        
+        # Activate virtual environment with ML dependencies
+        activate_virtual_environment()
+
+def encode_audio_chunk(waveform, audio_format: str) -> bytes:
+    """
+    Encode a (1, samples) float waveform for streaming.
+    
+    Args:
+        waveform: Generated audio tensor at 24kHz
+        audio_format: "pcm" (raw s16le), "wav" or "opus" (Ogg container)
+        
+    Returns:
+        Encoded audio bytes
+    """
+    import torch
+    import torchaudio
+    
+    if audio_format == "pcm":
+        pcm = (waveform.clamp(-1.0, 1.0) * 32767).to(torch.int16)
+        return pcm.numpy().tobytes()
+    
+    buffer = io.BytesIO()
+    if audio_format == "wav":
+        torchaudio.save(buffer, waveform, 24000, format="wav")
+    elif audio_format == "opus":
+        torchaudio.save(buffer, waveform, 24000, format="ogg", encoding="opus")
+    else:
+        raise ValueError(f"Unsupported stream audio format: {audio_format}")
+    return buffer.getvalue()
+
+def process_stream_request(job_input: Dict[str, Any], job_id: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Synthesize a request sentence by sentence, yielding each chunk when ready.
+    
+    The next sentence is synthesized on a background thread while the
+    current chunk is encoded, uploaded and delivered. S3-delivered chunks
+    are stored under ``job_id``.
+    """
+    start_time = time.time()
+    text = job_input.get("text")
+    voice_reference_url = job_input.get("voice_reference_url")
+    options = job_input.get("options", {})
+    delivery = options.get("stream_delivery", "base64")  # "base64" or "s3"
+    audio_format = options.get("stream_format", "pcm")
+    
+    if not text:
+        raise ValueError("Missing required parameter: text")
+    if not voice_reference_url:
+        raise ValueError("Missing required parameter: voice_reference_url")
+    if delivery not in ("base64", "s3"):
+        raise ValueError(f"Unsupported stream delivery: {delivery}")
+    validate_synthesis_options(options)
+    
+    from f5tts_engine import get_f5tts_engine, split_sentences
+    from s3_client import upload_audio_bytes_to_s3, job_scope, finish_job, release_download, JobScope
+    
+    # Whitespace- or punctuation-only text has no sentences to synthesize
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("Missing required parameter: text")
+    
+    reference_audio_path, _ = prepare_reference(voice_reference_url, options.get("wait_for_transcript", False))
+    try:
+        engine = get_f5tts_engine()
+        logger.info(f"Streaming {len(sentences)} sentences for text length: {len(text)}")
+        
+        # One upload attempt shared by every chunk of this job
+        upload_job = JobScope(job_id) if job_id else None
+        
+        time_to_first_audio = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-synth") as executor:
+            future = executor.submit(engine.synthesize_waveform, sentences[0], reference_audio_path)
+            
+            for index, sentence in enumerate(sentences):
+                waveform = future.result()
+                
+                # Start the next sentence before delivering this one
+                if index + 1 < len(sentences):
+                    future = executor.submit(engine.synthesize_waveform, sentences[index + 1], reference_audio_path)
+                
+                chunk = {
+                    "chunk_index": index,
+                    "text": sentence,
+                    "sample_rate": 24000,
+                    "duration": waveform.shape[-1] / 24000,
+                    "is_final": index + 1 == len(sentences)
+                }
+                
+                if delivery == "s3":
+                    chunk["format"] = "wav"
+                    # Scoped per upload - a generator must not leave the job id set across yields
+                    with job_scope(upload_job):
+                        chunk["audio_url"] = upload_audio_bytes_to_s3(
+                            encode_audio_chunk(waveform, "wav"),
+                            f"stream_{index:04d}.wav",
+                            "output/stream"
+                        )
+                else:
+                    chunk["format"] = audio_format
+                    chunk["audio_base64"] = base64.b64encode(encode_audio_chunk(waveform, audio_format)).decode("ascii")
+                
+                if time_to_first_audio is None:
+                    time_to_first_audio = time.time() - start_time
+                    get_metrics_registry().observe("time_to_first_audio", time_to_first_audio)
+                    logger.info(f"First audio chunk ready in {time_to_first_audio:.2f}s")
+                
+                yield chunk
+    finally:
+        release_download(reference_audio_path)
+    
+    # All chunks are uploaded - drop the job's retry marker
+    finish_job(upload_job)
+    
+    yield {
+        "success": True,
+        "chunks": len(sentences),
+        "text_length": len(text),
+        "time_to_first_audio": round(time_to_first_audio, 3),
+        "processing_time": round(time.time() - start_time, 3),
+        "boot_timeline": get_boot_timeline()
+    }
+
+def stream_handler(job: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+    """
+    RunPod generator handler for streaming synthesis.
+    
+    Jobs with ``stream: true`` get one output per sentence; all other jobs
+    are processed normally and yield a single result.
+    """
+    job_input = job.get("input", {})
+    job_id = job.get("id", "unknown")
+    
+    if not job_input.get("stream", False):
+        result = handler(job)
+        yield result.get("output", result)
+        return
+    
+    try:
+        logger.info(f"Streaming job {job_id}")
+        ensure_environment()
+        yield from process_stream_request(job_input, job.get("id"))
+        logger.info(f"Streaming job {job_id} completed")
+        
+    except Exception as e:
+        logger.error(f"Streaming job {job_id} failed: {e}")
+        logger.error(traceback.format_exc())
+        yield {
+            "error": str(e),
+            "success": False,
+            "boot_timeline": get_boot_timeline()
+        }
 
 def handler(job: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -447,18 +762,20 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
         
         logger.info(f"Processing job {job_id}")
         
-        # Check if environment setup is required (cold start)
-        if not check_setup_complete():
-            logger.info("Cold start detected - setting up environment...")
-            setup_environment()
-        else:
-            logger.info("Warm start - using existing environment")
+        if job_input.get("diagnostics"):
+            return {"output": get_diagnostics(refresh=job_input.get("refresh", False))}
+        
+        with request_timings() as timings:
+            with timings.stage("environment"):
+                ensure_environment()
             
-        # Activate virtual environment with ML dependencies
-        activate_virtual_environment()
+            # Outputs are stored under the job id (see s3_client.UploadDeduplicator)
+            from s3_client import job_scope
+            with job_scope(job.get("id")):
+                result = process_request(job_input)
         
-        # Process the request
-        result = process_request(job_input)
+        result["timings"] = timings.as_dict()
+        result["boot_timeline"] = get_boot_timeline()
         
         logger.info(f"Job {job_id} completed")
         return {"output": result}
@@ -470,15 +787,123 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
         
         return {
             "error": error_msg,
-            "traceback": traceback.format_exc()
+            "traceback": traceback.format_exc(),
+            "boot_timeline": get_boot_timeline()
         }
 
+async def async_handler(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Asyncio RunPod handler for concurrent job intake.
+    
+    Each job runs the synchronous handler on a worker thread, so network I/O
+    and subtitle work for one job overlap with GPU inference for another.
+    The F5-TTS engine serializes the inference itself.
+    """
+    global _inflight_jobs, _job_executor
+    if _job_executor is None:
+        _job_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="job")
+    
+    _inflight_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_job_executor, handler, job)
+    finally:
+        _inflight_jobs -= 1
+
+def _get_free_gpu_memory_mb() -> Optional[float]:
+    """Get free GPU memory in MB, or None if torch/CUDA is not loaded."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    free_bytes, _ = torch.cuda.mem_get_info()
+    return free_bytes / (1024 * 1024)
+
+def _get_inference_queue_depth() -> int:
+    """Get the number of jobs waiting for or running F5-TTS inference."""
+    if "f5tts_engine" not in sys.modules:
+        return 0
+    from f5tts_engine import get_f5tts_engine
+    return get_f5tts_engine().queue_depth
+
+def _get_inference_capacity() -> int:
+    """Get how many synthesis calls one forward pass takes (1 without batching)."""
+    if "f5tts_engine" not in sys.modules:
+        return 1
+    from f5tts_engine import get_f5tts_engine
+    batch_scheduler = get_f5tts_engine().batch_scheduler
+    return batch_scheduler.max_batch_size if batch_scheduler is not None else 1
+
+def concurrency_modifier(current_concurrency: int) -> int:
+    """
+    Adjust how many jobs the async handler accepts at once.
+    
+    Backs off when free GPU memory is low or more jobs wait for the GPU
+    than one batched forward pass takes, and grows while every slot is
+    busy and the next batch still has room - concurrent jobs are what the
+    batch scheduler fills batches with. Between those conditions
+    concurrency holds, and after a change it holds for CONCURRENCY_COOLDOWN
+    seconds so steady traffic does not flip it back and forth. Low memory
+    always backs off.
+    
+    Args:
+        current_concurrency: Concurrency currently applied by RunPod
+        
+    Returns:
+        New concurrency in the range [1, MAX_CONCURRENCY]
+    """
+    global _last_concurrency_change
+    current = max(1, min(MAX_CONCURRENCY, current_concurrency))
+    try:
+        free_memory_mb = _get_free_gpu_memory_mb()
+        queue_depth = _get_inference_queue_depth()
+        capacity = _get_inference_capacity()
+    except Exception as e:
+        logger.warning(f"Concurrency probe failed - keeping {current_concurrency}: {e}")
+        return current
+    
+    now = time.monotonic()
+    cooling_down = now - _last_concurrency_change < CONCURRENCY_COOLDOWN
+    
+    if free_memory_mb is not None and free_memory_mb < MIN_FREE_GPU_MEMORY_MB:
+        target = current - 1
+    elif cooling_down:
+        target = current
+    elif queue_depth > capacity:
+        # More waiting than one batch takes - extra intake would only queue
+        target = current - 1
+    elif queue_depth < capacity and _inflight_jobs >= current:
+        # All slots busy and the next batch has room - overlap more I/O
+        target = current + 1
+    else:
+        target = current
+    
+    target = max(1, min(MAX_CONCURRENCY, target))
+    if target != current:
+        _last_concurrency_change = now
+    return target
+
 # RunPod serverless entry point
 if __name__ == "__main__":
+    # Preload environment and models before accepting any jobs
+    boot_worker()
+    
     try:
         import runpod
-        logger.info("Starting RunPod serverless worker...")
-        runpod.serverless.start({"handler": handler})
+        if HANDLER_MODE == "async":
+            logger.info(f"Starting RunPod serverless worker (async, max concurrency {MAX_CONCURRENCY})...")
+            runpod.serverless.start({
+                "handler": async_handler,
+                "concurrency_modifier": concurrency_modifier
+            })
+        elif HANDLER_MODE == "stream":
+            logger.info("Starting RunPod serverless worker (streaming)...")
+            runpod.serverless.start({
+                "handler": stream_handler,
+                "return_aggregate_stream": True
+            })
+        else:
+            logger.info("Starting RunPod serverless worker...")
+            runpod.serverless.start({"handler": handler})
     except ImportError:
         logger.error("RunPod library not available - running in test mode")
         # Test mode for local development
@@ -494,4 +919,4 @@ if __name__ == "__main__":
             }
         }
         result = handler(test_job)
-        print(json.dumps(result, indent=2))
\ No newline at end of file
+        print(json.dumps(result, indent=2))
@@ -6,30 +6,358 @@ Handles F5-TTS model loading, caching, and inference with warm loading
 for 1-3 second inference performance.
 """
 
+import io
 import os
+import re
 import sys
 import logging
+import threading
+import numpy as np
 import torch
 import torchaudio
 import time
+import uuid
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
 
 # Add container app path
 sys.path.append('/app')
 
+from metrics import stage_timer
+from reference_transcripts import get_transcript_store, DEFAULT_REFERENCE_TEXT
+from result_cache import content_hash
+
 try:
     from setup_network_venv import (  # config.py
-        F5TTS_MODELS_PATH, TEMP_PATH, DEFAULT_COMPUTE_TYPE
+        F5TTS_MODELS_PATH, TEMP_PATH, DEFAULT_COMPUTE_TYPE,
+        F5TTS_BATCH_WINDOW_MS, F5TTS_MAX_BATCH_SIZE, F5TTS_BATCH_LENGTH_TOLERANCE,
+        F5TTS_MAX_CHUNK_SECONDS, F5TTS_CROSSFADE_MS, F5TTS_DEFAULT_CHARS_PER_SECOND, CACHE_PATH,
+        REFERENCE_CACHE_MAX_BYTES, REFERENCE_CACHE_DISK_MAX_BYTES
     )
 except ImportError:
     F5TTS_MODELS_PATH = Path("/runpod-volume/f5tts/models/f5-tts")
     TEMP_PATH = Path("/runpod-volume/f5tts/temp")
     DEFAULT_COMPUTE_TYPE = "float16"
+    F5TTS_BATCH_WINDOW_MS = 30
+    F5TTS_MAX_BATCH_SIZE = 8
+    F5TTS_BATCH_LENGTH_TOLERANCE = 0.25
+    F5TTS_MAX_CHUNK_SECONDS = 30.0
+    F5TTS_CROSSFADE_MS = 50
+    F5TTS_DEFAULT_CHARS_PER_SECOND = float(os.getenv("F5TTS_DEFAULT_CHARS_PER_SECOND", "15"))
+    CACHE_PATH = Path("/runpod-volume/f5tts/cache")
+    REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    REFERENCE_CACHE_DISK_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# F5-TTS audio constants
+SAMPLE_RATE = 24000
+HOP_LENGTH = 256
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+@dataclass
+class SynthesisRequest:
+    """A pending synthesis call waiting to be batched."""
+    ref_key: str
+    ref_audio: torch.Tensor
+    ref_text: str
+    gen_text: str
+    duration: int  # Total mel frames (reference + generated)
+    future: Future = field(default_factory=Future)
+
+class BatchScheduler:
+    """
+    Micro-batching scheduler for F5-TTS inference.
+    
+    Collects synthesis calls for up to ``window_ms``, groups them by shared
+    reference voice and similar target length, and runs each group as one
+    padded forward pass on the engine.
+    """
+    
+    def __init__(
+        self,
+        engine: "F5TTSEngine",
+        window_ms: int = F5TTS_BATCH_WINDOW_MS,
+        max_batch_size: int = F5TTS_MAX_BATCH_SIZE,
+        length_tolerance: float = F5TTS_BATCH_LENGTH_TOLERANCE
+    ):
+        """
+        Initialize and start the batch scheduler.
+        
+        Args:
+            engine: Engine that runs the batched forward passes
+            window_ms: How long to wait for more requests after the first one
+            max_batch_size: Maximum number of requests per forward pass
+            length_tolerance: Max relative duration spread within one batch
+        """
+        self.engine = engine
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.length_tolerance = length_tolerance
+        
+        # Each queue item holds all requests from one caller
+        self._queue: "queue.Queue[List[SynthesisRequest]]" = queue.Queue()
+        
+        # Batch statistics
+        self._stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.request_count = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.padded_frames = 0
+        self.total_frames = 0
+        
+        self._thread = threading.Thread(target=self._run, name="f5tts-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, request: SynthesisRequest) -> Future:
+        """Queue a synthesis request and return a future for its audio."""
+        self._queue.put([request])
+        return request.future
+    
+    def submit_many(self, requests: List[SynthesisRequest]) -> List[Future]:
+        """Queue requests from one caller together so they can share batches."""
+        self._queue.put(list(requests))
+        return [request.future for request in requests]
+    
+    def _collect(self) -> List[SynthesisRequest]:
+        """Block for the first caller, then gather more within the window."""
+        requests = list(self._queue.get())
+        callers = 1
+        deadline = time.monotonic() + self.window_ms / 1000
+        
+        while len(requests) < self.max_batch_size:
+            # Nobody else is synthesizing - waiting would only add latency
+            if self.engine.queue_depth <= callers:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                requests.extend(self._queue.get(timeout=remaining))
+                callers += 1
+            except queue.Empty:
+                break
+        
+        return requests
+    
+    def _group(self, requests: List[SynthesisRequest]) -> List[List[SynthesisRequest]]:
+        """Group requests by reference voice, then by similar duration."""
+        by_voice: Dict[str, List[SynthesisRequest]] = {}
+        for request in requests:
+            by_voice.setdefault(request.ref_key, []).append(request)
+        
+        groups = []
+        for voice_requests in by_voice.values():
+            voice_requests.sort(key=lambda r: r.duration)
+            group = [voice_requests[0]]
+            for request in voice_requests[1:]:
+                if (len(group) < self.max_batch_size
+                        and request.duration <= group[0].duration * (1 + self.length_tolerance)):
+                    group.append(request)
+                else:
+                    groups.append(group)
+                    group = [request]
+            groups.append(group)
+        
+        return groups
+    
+    def _record_batch(self, group: List[SynthesisRequest]):
+        """Update batch-size and padding-waste statistics."""
+        max_duration = max(r.duration for r in group)
+        with self._stats_lock:
+            self.batch_count += 1
+            self.request_count += len(group)
+            self.batch_size_histogram[len(group)] = self.batch_size_histogram.get(len(group), 0) + 1
+            self.total_frames += max_duration * len(group)
+            self.padded_frames += sum(max_duration - r.duration for r in group)
+    
+    def _run(self):
+        """Scheduler loop - runs on a daemon thread for the worker lifetime."""
+        while True:
+            for group in self._group(self._collect()):
+                try:
+                    outputs = self.engine.infer_batch(group)
+                    self._record_batch(group)
+                    for request, audio in zip(group, outputs):
+                        request.future.set_result(audio)
+                except Exception as e:
+                    logger.error(f"Batched inference failed for {len(group)} requests: {e}")
+                    for request in group:
+                        request.future.set_exception(e)
+    
+    def get_stats(self) -> dict:
+        """Get batch-size and padding-waste statistics."""
+        with self._stats_lock:
+            return {
+                "window_ms": self.window_ms,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batch_count,
+                "requests": self.request_count,
+                "mean_batch_size": self.request_count / self.batch_count if self.batch_count else None,
+                "batch_size_histogram": dict(self.batch_size_histogram),
+                "padding_waste": self.padded_frames / self.total_frames if self.total_frames else None
+            }
+
+class ReferenceCache:
+    """
+    Two-tier cache of preprocessed reference voices, keyed by file content.
+    
+    Tier 1 keeps ready-to-use tensors (mono, 24kHz, on the engine device)
+    in an LRU bounded by bytes. Tier 2 keeps float16 ``.npy`` files on the
+    network volume, memory-mapped on load, so other workers and restarts
+    skip decoding and resampling too.
+    """
+    
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_PATH / "references",
+        max_memory_bytes: int = REFERENCE_CACHE_MAX_BYTES,
+        max_disk_bytes: int = REFERENCE_CACHE_DISK_MAX_BYTES
+    ):
+        """
+        Initialize reference cache.
+        
+        Args:
+            cache_dir: Directory for float16 .npy entries
+            max_memory_bytes: Tier 1 budget (device tensors)
+            max_disk_bytes: Tier 2 budget before oldest entries are removed
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._memory_bytes = 0
+        self._resamplers: Dict[int, torchaudio.transforms.Resample] = {}
+        self._resampler_lock = threading.Lock()
+        
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def content_key(self, audio_path: Union[str, Path]) -> str:
+        """Get the content hash of a reference file (shared memo, see result_cache.content_hash)."""
+        return content_hash(audio_path)
+    
+    def get_resampler(self, source_rate: int) -> torchaudio.transforms.Resample:
+        """Get a cached resampling transform from ``source_rate`` to 24kHz."""
+        resampler = self._resamplers.get(source_rate)
+        if resampler is None:
+            with self._resampler_lock:
+                resampler = self._resamplers.get(source_rate)
+                if resampler is None:
+                    resampler = torchaudio.transforms.Resample(source_rate, SAMPLE_RATE)
+                    self._resamplers[source_rate] = resampler
+        return resampler
+    
+    def _disk_path(self, key: str) -> Path:
+        """Get the tier 2 file for a key (sharded to keep directories small)."""
+        return self.cache_dir / key[:2] / f"{key}.npy"
+    
+    def get(self, key: str) -> Optional[Union[torch.Tensor, np.ndarray]]:
+        """
+        Look up a preprocessed reference.
+        
+        Returns:
+            Device tensor from tier 1, memory-mapped float16 array from
+            tier 2, or None on a miss
+        """
+        with self._lock:
+            tensor = self._memory.get(key)
+            if tensor is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return tensor
+        
+        disk_path = self._disk_path(key)
+        try:
+            array = np.load(disk_path, mmap_mode="r")
+            os.utime(disk_path)  # Refresh LRU position for eviction
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.disk_hits += 1
+        return array
+    
+    def put_memory(self, key: str, tensor: torch.Tensor):
+        """Store a ready tensor in tier 1, evicting least recently used entries."""
+        size = tensor.element_size() * tensor.numel()
+        if size > self.max_memory_bytes:
+            return
+        
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.element_size() * previous.numel()
+            self._memory[key] = tensor
+            self._memory_bytes += size
+            
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.element_size() * evicted.numel()
+                self.evictions += 1
+    
+    def put_disk(self, key: str, audio: torch.Tensor):
+        """Store a preprocessed (1, samples) waveform in tier 2 as float16."""
+        disk_path = self._disk_path(key)
+        if disk_path.exists():
+            return
+        
+        try:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Atomic write - other workers may be reading the same entry
+            tmp_path = disk_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, audio.detach().cpu().to(torch.float16).numpy())
+            os.replace(tmp_path, disk_path)
+            
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write reference cache entry: {e}")
+    
+    def _evict_disk(self):
+        """Remove the oldest tier 2 entries while over the disk budget."""
+        entries = []
+        total_bytes = 0
+        for entry_path in self.cache_dir.glob("*/*.npy"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_bytes += stat.st_size
+        
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_disk_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_bytes -= size
+    
+    def get_stats(self) -> dict:
+        """Get hit counters, tier 1 size and cached resamplers."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "resamplers": sorted(self._resamplers)
+            }
+
 class F5TTSEngine:
     """F5-TTS model engine with warm loading and caching."""
     
@@ -54,8 +382,23 @@ class F5TTSEngine:
         self.model_dir = F5TTS_MODELS_PATH / model_name
         self.model_dir.mkdir(parents=True, exist_ok=True)
         
+        # Inference serialization - concurrent jobs share one GPU model
+        self._load_lock = threading.Lock()
+        self._inference_lock = threading.Lock()
+        self._pending_inferences = 0
+        self._pending_lock = threading.Lock()
+        
+        # Cross-job micro-batching (disabled with a zero window or batch size 1)
+        self.batch_scheduler = None
+        if F5TTS_BATCH_WINDOW_MS > 0 and F5TTS_MAX_BATCH_SIZE > 1:
+            self.batch_scheduler = BatchScheduler(self)
+        
+        # Preprocessed reference voices (a handful of voices serve most jobs)
+        self.reference_cache = ReferenceCache()
+        
         # Performance tracking
         self.model_load_time = None
+        self.warmup_time = None
         self.last_inference_time = None
         
         logger.info(f"F5-TTS Engine initialized: {model_name} on {self.device}")
@@ -78,8 +421,18 @@ class F5TTSEngine:
             logger.error(f"Failed to setup model cache: {e}")
             raise
     
+    @property
+    def queue_depth(self) -> int:
+        """Number of synthesis calls in flight (preprocessing, queued or on the GPU)."""
+        return self._pending_inferences
+    
     def load_model(self):
         """Load F5-TTS model with caching for warm loading."""
+        with self._load_lock:
+            self._load_model()
+    
+    def _load_model(self):
+        """Load F5-TTS model (caller must hold the load lock)."""
         try:
             if self.model is not None:
                 logger.info("Model already loaded - using cached version")
@@ -127,33 +480,43 @@ class F5TTSEngine:
             self.model.eval()
             self.vocoder.eval()
             
-            with torch.no_grad():
-                # Warm up models with dummy input
-                logger.info("Warming up models...")
-                dummy_text = "Hello world"
-                dummy_audio = torch.randn(1, 24000).to(self.device)
-                
-                if self.compute_type == "float16":
-                    dummy_audio = dummy_audio.half()
-                
-                # Run dummy inference to load CUDA kernels
-                try:
-                    _ = self.model.infer(
-                        text=dummy_text,
-                        ref_audio=dummy_audio,
-                        ref_text="Reference audio",
-                        gen_text=dummy_text
-                    )
-                except Exception as e:
-                    logger.warning(f"Model warmup failed: {e}")
-            
             self.model_load_time = time.time() - start_time
             logger.info(f"F5-TTS model loaded successfully in {self.model_load_time:.2f}s")
             
+            self.warmup()
+            
         except Exception as e:
             logger.error(f"Failed to load F5-TTS model: {e}")
             raise
     
+    def warmup(self):
+        """Run a dummy inference so CUDA kernels are compiled before the first job."""
+        start_time = time.time()
+        
+        with torch.no_grad():
+            # Warm up models with dummy input
+            logger.info("Warming up models...")
+            dummy_text = "Hello world"
+            dummy_audio = torch.randn(1, 24000).to(self.device)
+            
+            if self.compute_type == "float16":
+                dummy_audio = dummy_audio.half()
+            
+            # Run dummy inference through the same entry point as real requests
+            try:
+                self.infer_batch([SynthesisRequest(
+                    ref_key="warmup",
+                    ref_audio=dummy_audio,
+                    ref_text="Reference audio",
+                    gen_text=dummy_text,
+                    duration=self.estimate_duration(dummy_audio, "Reference audio", dummy_text)
+                )])
+            except Exception as e:
+                logger.warning(f"Model warmup failed: {e}")
+        
+        self.warmup_time = time.time() - start_time
+        logger.info(f"F5-TTS warmup completed in {self.warmup_time:.2f}s")
+    
     def process_reference_audio(self, audio_path: Union[str, Path]) -> Tuple[torch.Tensor, str]:
         """
         Process reference audio for F5-TTS.
@@ -162,62 +525,70 @@ class F5TTSEngine:
             audio_path: Path to reference audio file
             
         Returns:
-            Tuple of (audio_tensor, reference_text)
+            Tuple of (audio_tensor, reference_text). The tensor may be shared
+            with other requests through the reference cache - don't modify
+            it in place.
         """
         try:
             audio_path = Path(audio_path)
             if not audio_path.exists():
                 raise FileNotFoundError(f"Reference audio not found: {audio_path}")
             
-            logger.info(f"Processing reference audio: {audio_path}")
-            
-            # Load audio
-            audio, sample_rate = torchaudio.load(str(audio_path))
+            key = self.reference_cache.content_key(audio_path)
+            cached = self.reference_cache.get(key)
             
-            # Resample to 24kHz if needed
-            if sample_rate != 24000:
-                resampler = torchaudio.transforms.Resample(sample_rate, 24000)
-                audio = resampler(audio)
-                logger.info(f"Resampled audio from {sample_rate}Hz to 24kHz")
-            
-            # Convert to mono if stereo
-            if audio.shape[0] > 1:
-                audio = torch.mean(audio, dim=0, keepdim=True)
-                logger.info("Converted stereo audio to mono")
-            
-            # Move to device and set compute type
-            audio = audio.to(self.device)
-            if self.compute_type == "float16":
-                audio = audio.half()
+            if isinstance(cached, torch.Tensor):
+                audio = cached
+            else:
+                if cached is not None:
+                    # Memory-mapped float16 from the volume cache
+                    audio = torch.from_numpy(np.array(cached))
+                else:
+                    logger.info(f"Processing reference audio: {audio_path}")
+                    
+                    # Load audio
+                    audio, sample_rate = torchaudio.load(str(audio_path))
+                    
+                    # Convert to mono first so only one channel is resampled
+                    if audio.shape[0] > 1:
+                        audio = torch.mean(audio, dim=0, keepdim=True)
+                        logger.info("Converted stereo audio to mono")
+                    
+                    # Resample to 24kHz if needed
+                    if sample_rate != SAMPLE_RATE:
+                        audio = self.reference_cache.get_resampler(sample_rate)(audio)
+                        logger.info(f"Resampled audio from {sample_rate}Hz to 24kHz")
+                    
+                    self.reference_cache.put_disk(key, audio)
+                
+                # Move to device and set compute type
+                audio = audio.to(self.device)
+                audio = audio.half() if self.compute_type == "float16" else audio.float()
+                self.reference_cache.put_memory(key, audio)
             
-            # For now, use a default reference text
-            # TODO: Implement ASR to get actual reference text
-            reference_text = "This is a reference audio sample."
+            # Resolved once per voice (sidecar or ASR), then served from memory;
+            # inference never waits on ASR (prepare_reference does, if asked)
+            reference_text = get_transcript_store().get_transcript(audio_path, wait_for_asr=False)
             
-            logger.info("Reference audio processed successfully")
             return audio, reference_text
             
         except Exception as e:
             logger.error(f"Failed to process reference audio: {e}")
             raise
     
-    def synthesize_speech(
-        self, 
-        text: str, 
-        reference_audio_path: Union[str, Path],
-        output_path: Optional[Union[str, Path]] = None
-    ) -> Path:
+    def synthesize_waveform(self, text: str, reference_audio_path: Union[str, Path]) -> torch.Tensor:
         """
-        Synthesize speech using F5-TTS.
+        Synthesize speech using F5-TTS without writing it to disk.
         
         Args:
             text: Text to synthesize
             reference_audio_path: Path to reference voice audio
-            output_path: Output audio file path (optional)
             
         Returns:
-            Path to generated audio file
+            Generated waveform (1, samples) at 24kHz, float32 on the CPU
         """
+        with self._pending_lock:
+            self._pending_inferences += 1
         try:
             start_time = time.time()
             logger.info(f"Synthesizing speech for text length: {len(text)}")
@@ -227,400 +598,280 @@ class F5TTSEngine:
                 self.load_model()
             
             # Process reference audio
-            ref_audio, ref_text = self.process_reference_audio(reference_audio_path)
+            with stage_timer("reference_preprocessing"):
+                ref_audio, ref_text = self.process_reference_audio(reference_audio_path)
             
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = int(time.time())
-                output_path = TEMP_PATH / f"f5tts_output_{timestamp}.wav"
-            
-            output_path = Path(output_path)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
+            # Long texts are split into chunks that keep reference + generated
+            # audio under the model's comfortable context length
+            chunks = chunk_text(text, self.max_chunk_chars(ref_audio, ref_text))
+            with stage_timer("inference"):
+                # Single and multi-chunk texts both run through infer_batch
+                # (via the scheduler when batching is on)
+                logger.info(f"Running F5-TTS inference on {len(chunks)} chunk(s)...")
+                generated_audio = self._synthesize_chunks(chunks, ref_audio, ref_text, reference_audio_path)
             
-            # Generate speech
-            logger.info("Running F5-TTS inference...")
-            
-            with torch.no_grad():
-                # Generate audio
-                generated_audio = self.model.infer(
-                    text=text,
-                    ref_audio=ref_audio,
-                    ref_text=ref_text,
-                    gen_text=text
-                )
-                
-                # Convert to CPU and save
-                if isinstance(generated_audio, torch.Tensor):
-                    generated_audio = generated_audio.cpu().float()
-                    
-                    # Save audio file
-                    torchaudio.save(
-                        str(output_path),
-                        generated_audio,
-                        24000  # 24kHz sample rate
-                    )
-                else:
-                    raise RuntimeError(f"Unexpected model output type: {type(generated_audio)}")
+            if not isinstance(generated_audio, torch.Tensor):
+                raise RuntimeError(f"Unexpected model output type: {type(generated_audio)}")
             
             # Performance tracking
             inference_time = time.time() - start_time
             self.last_inference_time = inference_time
-            
             logger.info(f"Speech synthesis completed in {inference_time:.2f}s")
-            logger.info(f"Output saved to: {output_path}")
             
-            return output_path
+            return generated_audio.cpu().float()
             
         except Exception as e:
             logger.error(f"Failed to synthesize speech: {e}")
             raise
+        finally:
+            with self._pending_lock:
+                self._pending_inferences -= 1
     
-    def get_model_info(self) -> dict:
-        """Get information about the loaded model."""
-        return {
-            "model_name": self.model_name,
-            "compute_type": self.compute_type,
-            "device": self.device,
-            "model_loaded": self.model is not None,
-            "model_load_time": self.model_load_time,
-            "last_inference_time": self.last_inference_time,
-            "cuda_available": torch.cuda.is_available(),
-            "cuda_memory": torch.cuda.get_device_properties(0).total_memory if torch.cuda.is_available() else None
-        }
-    
-    def cleanup(self):
-        """Clean up model and free memory."""
-        try:
-            if self.model is not None:
-                del self.model
-                self.model = None
-                
-            if self.vocoder is not None:
-                del self.vocoder
-                self.vocoder = None
-                
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                
-            logger.info("F5-TTS engine cleaned up")
-            
-        except Exception as e:
-            logger.error(f"Failed to cleanup F5-TTS engine: {e}")
-
-# Global engine instance for warm loading
-_f5tts_engine = None
-
-def get_f5tts_engine() -> F5TTSEngine:
-    """Get global F5-TTS engine instance."""
-    global _f5tts_engine
-    if _f5tts_engine is None:
-        _f5tts_engine = F5TTSEngine()
-    return _f5tts_engine
-
-def process_tts(text: str, reference_audio_path: Union[str, Path]) -> Path:
-    """
-    Convenience function for TTS processing.
-    
-    Args:
-        text: Text to synthesize  
-        reference_audio_path: Path to reference audio
-        
-    Returns:
-        Path to generated audio file
-    """
-    engine = get_f5tts_engine()
-    return engine.synthesize_speech(text, reference_audio_path)
-
-# Test function
-if __name__ == "__main__":
-    """Test F5-TTS engine."""
-    try:
-        engine = F5TTSEngine()
-        logger.info("F5-TTS engine test passed")
-        
-        # Print model info
-        info = engine.get_model_info()
-        for key, value in info.items():
-            logger.info(f"{key}: {value}")
-            
-    except Exception as e:
-        logger.error(f"F5-TTS engine test failed: {e}")
-        sys.exit(1)#!/usr/bin/env python3
-"""
-F5-TTS Engine for RunPod Serverless
-
-Handles F5-TTS model loading, caching, and inference with warm loading
-for 1-3 second inference performance.
-"""
-
-import os
-import sys
-import logging
-import torch
-import torchaudio
-import time
-from pathlib import Path
-from typing import Optional, Union, Tuple
-
-# Add container app path
-sys.path.append('/app')
-
-try:
-    from setup_network_venv import (  # config.py
-        F5TTS_MODELS_PATH, TEMP_PATH, DEFAULT_COMPUTE_TYPE
-    )
-except ImportError:
-    F5TTS_MODELS_PATH = Path("/runpod-volume/f5tts/models/f5-tts")
-    TEMP_PATH = Path("/runpod-volume/f5tts/temp")
-    DEFAULT_COMPUTE_TYPE = "float16"
-
-# Setup logging
-logger = logging.getLogger(__name__)
-
-class F5TTSEngine:
-    """F5-TTS model engine with warm loading and caching."""
-    
-    def __init__(self, model_name: str = "F5TTS_Base", compute_type: str = DEFAULT_COMPUTE_TYPE):
+    def synthesize_speech(
+        self, 
+        text: str, 
+        reference_audio_path: Union[str, Path],
+        output_path: Optional[Union[str, Path]] = None
+    ) -> Path:
         """
-        Initialize F5-TTS engine.
+        Synthesize speech using F5-TTS.
         
         Args:
-            model_name: Name of F5-TTS model to load
-            compute_type: Compute type (float16, float32, int8)
+            text: Text to synthesize
+            reference_audio_path: Path to reference voice audio
+            output_path: Output audio file path (optional)
+            
+        Returns:
+            Path to generated audio file
         """
-        self.model_name = model_name
-        self.compute_type = compute_type
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Model components
-        self.model = None
-        self.vocoder = None
-        self.tokenizer = None
-        
-        # Model cache paths
-        self.model_dir = F5TTS_MODELS_PATH / model_name
-        self.model_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Performance tracking
-        self.model_load_time = None
-        self.last_inference_time = None
+        generated_audio = self.synthesize_waveform(text, reference_audio_path)
         
-        logger.info(f"F5-TTS Engine initialized: {model_name} on {self.device}")
-    
-    def _setup_model_cache(self):
-        """Setup model cache directory structure."""
         try:
-            cache_dirs = [
-                self.model_dir / "checkpoints",
-                self.model_dir / "vocoder", 
-                self.model_dir / "tokenizer"
-            ]
-            
-            for cache_dir in cache_dirs:
-                cache_dir.mkdir(parents=True, exist_ok=True)
-            
-            logger.info(f"Model cache setup: {self.model_dir}")
-            
-        except Exception as e:
-            logger.error(f"Failed to setup model cache: {e}")
-            raise
-    
-    def load_model(self):
-        """Load F5-TTS model with caching for warm loading."""
-        try:
-            if self.model is not None:
-                logger.info("Model already loaded - using cached version")
-                return
-                
-            start_time = time.time()
-            logger.info(f"Loading F5-TTS model: {self.model_name}")
+            # Generate output path if not provided
+            if output_path is None:
+                # Unique suffix - concurrent jobs can finish within the same second
+                timestamp = int(time.time())
+                output_path = TEMP_PATH / f"f5tts_output_{timestamp}_{uuid.uuid4().hex[:8]}.wav"
             
-            # Setup cache directories
-            self._setup_model_cache()
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Import F5-TTS modules (only available after environment setup)
-            try:
-                from f5_tts.api import F5TTS
-                from f5_tts.infer.utils_infer import (
-                    load_model as load_f5tts_model,
-                    load_vocoder
+            # Save audio file
+            with stage_timer("wav_write"):
+                torchaudio.save(
+                    str(output_path),
+                    generated_audio,
+                    SAMPLE_RATE
                 )
-            except ImportError as e:
-                logger.error(f"F5-TTS import failed: {e}")
-                raise RuntimeError("F5-TTS not available - check environment setup")
-            
-            # Load main model
-            logger.info("Loading F5-TTS main model...")
-            self.model = load_f5tts_model(
-                model_name=self.model_name,
-                device=self.device,
-                cache_dir=str(self.model_dir / "checkpoints")
-            )
-            
-            # Load vocoder
-            logger.info("Loading vocoder...")  
-            self.vocoder = load_vocoder(
-                device=self.device,
-                cache_dir=str(self.model_dir / "vocoder")
-            )
             
-            # Set compute type
-            if self.compute_type == "float16" and self.device == "cuda":
-                self.model = self.model.half()
-                self.vocoder = self.vocoder.half()
-                logger.info("Models converted to float16")
-            
-            # Model optimization for inference
-            self.model.eval()
-            self.vocoder.eval()
-            
-            with torch.no_grad():
-                # Warm up models with dummy input
-                logger.info("Warming up models...")
-                dummy_text = "Hello world"
-                dummy_audio = torch.randn(1, 24000).to(self.device)
-                
-                if self.compute_type == "float16":
-                    dummy_audio = dummy_audio.half()
-                
-                # Run dummy inference to load CUDA kernels
-                try:
-                    _ = self.model.infer(
-                        text=dummy_text,
-                        ref_audio=dummy_audio,
-                        ref_text="Reference audio",
-                        gen_text=dummy_text
-                    )
-                except Exception as e:
-                    logger.warning(f"Model warmup failed: {e}")
-            
-            self.model_load_time = time.time() - start_time
-            logger.info(f"F5-TTS model loaded successfully in {self.model_load_time:.2f}s")
+            logger.info(f"Output saved to: {output_path}")
+            return output_path
             
         except Exception as e:
-            logger.error(f"Failed to load F5-TTS model: {e}")
+            logger.error(f"Failed to save synthesized speech: {e}")
             raise
     
-    def process_reference_audio(self, audio_path: Union[str, Path]) -> Tuple[torch.Tensor, str]:
+    def synthesize_wav(self, text: str, reference_audio_path: Union[str, Path]) -> bytes:
         """
-        Process reference audio for F5-TTS.
+        Synthesize speech using F5-TTS and encode it as WAV in memory.
         
         Args:
-            audio_path: Path to reference audio file
+            text: Text to synthesize
+            reference_audio_path: Path to reference voice audio
             
         Returns:
-            Tuple of (audio_tensor, reference_text)
+            WAV file bytes, ready for upload without a temp file
         """
-        try:
-            audio_path = Path(audio_path)
-            if not audio_path.exists():
-                raise FileNotFoundError(f"Reference audio not found: {audio_path}")
-            
-            logger.info(f"Processing reference audio: {audio_path}")
-            
-            # Load audio
-            audio, sample_rate = torchaudio.load(str(audio_path))
-            
-            # Resample to 24kHz if needed
-            if sample_rate != 24000:
-                resampler = torchaudio.transforms.Resample(sample_rate, 24000)
-                audio = resampler(audio)
-                logger.info(f"Resampled audio from {sample_rate}Hz to 24kHz")
-            
-            # Convert to mono if stereo
-            if audio.shape[0] > 1:
-                audio = torch.mean(audio, dim=0, keepdim=True)
-                logger.info("Converted stereo audio to mono")
-            
-            # Move to device and set compute type
-            audio = audio.to(self.device)
-            if self.compute_type == "float16":
-                audio = audio.half()
-            
-            # For now, use a default reference text
-            # TODO: Implement ASR to get actual reference text
-            reference_text = "This is a reference audio sample."
-            
-            logger.info("Reference audio processed successfully")
-            return audio, reference_text
-            
-        except Exception as e:
-            logger.error(f"Failed to process reference audio: {e}")
-            raise
+        generated_audio = self.synthesize_waveform(text, reference_audio_path)
+        with stage_timer("wav_encode"):
+            return encode_wav(generated_audio)
     
-    def synthesize_speech(
-        self, 
-        text: str, 
-        reference_audio_path: Union[str, Path],
-        output_path: Optional[Union[str, Path]] = None
-    ) -> Path:
+    def max_chunk_chars(self, ref_audio: torch.Tensor, ref_text: str) -> int:
         """
-        Synthesize speech using F5-TTS.
+        Size text chunks from the reference speaking rate.
+        
+        Each chunk gets whatever is left of F5TTS_MAX_CHUNK_SECONDS after the
+        reference audio, converted to characters at the reference rate. The
+        placeholder transcript says nothing about the rate, so voices without
+        a real transcript use F5TTS_DEFAULT_CHARS_PER_SECOND instead.
+        """
+        ref_seconds = ref_audio.shape[-1] / SAMPLE_RATE
+        if ref_text == DEFAULT_REFERENCE_TEXT:
+            chars_per_second = F5TTS_DEFAULT_CHARS_PER_SECOND
+        else:
+            chars_per_second = len(ref_text.encode("utf-8")) / max(ref_seconds, 1e-3)
+        remaining_seconds = max(F5TTS_MAX_CHUNK_SECONDS - ref_seconds, 4.0)
+        return max(int(chars_per_second * remaining_seconds), 32)
+    
+    def _run_requests(self, requests: List[SynthesisRequest]) -> List[torch.Tensor]:
+        """Run requests through the batch scheduler, or in direct batches if it is off."""
+        if self.batch_scheduler is not None:
+            futures = self.batch_scheduler.submit_many(requests)
+            return [future.result() for future in futures]
+        
+        batch_size = max(F5TTS_MAX_BATCH_SIZE, 1)
+        waves = []
+        for start in range(0, len(requests), batch_size):
+            waves.extend(self.infer_batch(requests[start:start + batch_size]))
+        return waves
+    
+    def _chunk_requests(
+        self,
+        chunks: List[str],
+        ref_audio: torch.Tensor,
+        ref_text: str,
+        reference_audio_path: Union[str, Path]
+    ) -> List[SynthesisRequest]:
+        """Build synthesis requests for text chunks sharing one reference voice."""
+        ref_key = self._reference_key(reference_audio_path)
+        return [
+            SynthesisRequest(
+                ref_key=ref_key,
+                ref_audio=ref_audio,
+                ref_text=ref_text,
+                gen_text=chunk,
+                duration=self.estimate_duration(ref_audio, ref_text, chunk)
+            )
+            for chunk in chunks
+        ]
+    
+    def _stitch(self, waves: List[torch.Tensor]) -> torch.Tensor:
+        """Crossfade chunk waveforms into one (1, samples) waveform."""
+        if len(waves) == 1:
+            return waves[0]
+        crossfade_samples = int(SAMPLE_RATE * F5TTS_CROSSFADE_MS / 1000)
+        stitched = crossfade_concat([wave[0].float().numpy() for wave in waves], crossfade_samples)
+        return torch.from_numpy(stitched).unsqueeze(0)
+    
+    def _synthesize_chunks(
+        self,
+        chunks: List[str],
+        ref_audio: torch.Tensor,
+        ref_text: str,
+        reference_audio_path: Union[str, Path]
+    ) -> torch.Tensor:
+        """Synthesize text chunks as batches and crossfade them into one waveform."""
+        requests = self._chunk_requests(chunks, ref_audio, ref_text, reference_audio_path)
+        return self._stitch(self._run_requests(requests))
+    
+    def synthesize_batch(self, texts: List[str], reference_audio_path: Union[str, Path]) -> List[torch.Tensor]:
+        """
+        Synthesize many texts with one reference voice.
+        
+        The reference is processed once and every text (chunked if long) is
+        submitted together, so items share padded forward passes.
         
         Args:
-            text: Text to synthesize
+            texts: Texts to synthesize
             reference_audio_path: Path to reference voice audio
-            output_path: Output audio file path (optional)
             
         Returns:
-            Path to generated audio file
+            Generated waveform (1, samples) per text, float32 on the CPU
         """
+        with self._pending_lock:
+            self._pending_inferences += 1
         try:
             start_time = time.time()
-            logger.info(f"Synthesizing speech for text length: {len(text)}")
+            logger.info(f"Synthesizing batch of {len(texts)} texts")
             
-            # Ensure model is loaded
             if self.model is None:
                 self.load_model()
             
-            # Process reference audio
-            ref_audio, ref_text = self.process_reference_audio(reference_audio_path)
-            
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = int(time.time())
-                output_path = TEMP_PATH / f"f5tts_output_{timestamp}.wav"
-            
-            output_path = Path(output_path)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Generate speech
-            logger.info("Running F5-TTS inference...")
+            with stage_timer("reference_preprocessing"):
+                ref_audio, ref_text = self.process_reference_audio(reference_audio_path)
+            max_chars = self.max_chunk_chars(ref_audio, ref_text)
             
-            with torch.no_grad():
-                # Generate audio
-                generated_audio = self.model.infer(
-                    text=text,
-                    ref_audio=ref_audio,
-                    ref_text=ref_text,
-                    gen_text=text
-                )
-                
-                # Convert to CPU and save
-                if isinstance(generated_audio, torch.Tensor):
-                    generated_audio = generated_audio.cpu().float()
-                    
-                    # Save audio file
-                    torchaudio.save(
-                        str(output_path),
-                        generated_audio,
-                        24000  # 24kHz sample rate
-                    )
-                else:
-                    raise RuntimeError(f"Unexpected model output type: {type(generated_audio)}")
+            # Flatten every item's chunks into one submission
+            item_chunks = [chunk_text(text, max_chars) for text in texts]
+            requests = self._chunk_requests(
+                [chunk for chunks in item_chunks for chunk in chunks],
+                ref_audio, ref_text, reference_audio_path
+            )
+            with stage_timer("inference"):
+                waves = self._run_requests(requests)
             
-            # Performance tracking
-            inference_time = time.time() - start_time
-            self.last_inference_time = inference_time
+            outputs = []
+            position = 0
+            for chunks in item_chunks:
+                outputs.append(self._stitch(waves[position:position + len(chunks)]).float())
+                position += len(chunks)
             
-            logger.info(f"Speech synthesis completed in {inference_time:.2f}s")
-            logger.info(f"Output saved to: {output_path}")
-            
-            return output_path
+            self.last_inference_time = time.time() - start_time
+            logger.info(f"Batch synthesis completed in {self.last_inference_time:.2f}s")
+            return outputs
             
         except Exception as e:
-            logger.error(f"Failed to synthesize speech: {e}")
+            logger.error(f"Failed to synthesize batch: {e}")
             raise
+        finally:
+            with self._pending_lock:
+                self._pending_inferences -= 1
+    
+    def _reference_key(self, reference_audio_path: Union[str, Path]) -> str:
+        """Identify a reference voice by content so requests sharing it can be batched."""
+        return self.reference_cache.content_key(reference_audio_path)
+    
+    def estimate_duration(self, ref_audio: torch.Tensor, ref_text: str, gen_text: str, speed: float = 1.0) -> int:
+        """
+        Estimate total mel frames (reference + generated) for a request.
+        
+        Uses the F5-TTS heuristic of scaling the reference duration by the
+        UTF-8 length ratio of generated to reference text.
+        """
+        ref_frames = ref_audio.shape[-1] // HOP_LENGTH
+        ref_text_len = max(len(ref_text.encode("utf-8")), 1)
+        gen_text_len = len(gen_text.encode("utf-8"))
+        return ref_frames + int(ref_frames / ref_text_len * gen_text_len / speed)
+    
+    def infer_batch(self, requests: List[SynthesisRequest]) -> List[torch.Tensor]:
+        """
+        Run one padded forward pass for requests sharing a reference voice.
+        
+        This is the only inference entry point: single requests are a batch
+        of one, so every request uses the same model and vocoder calls.
+        
+        Args:
+            requests: Requests with the same reference audio and text
+            
+        Returns:
+            Generated waveform (1, samples) per request, on the CPU
+        """
+        ref_audio = requests[0].ref_audio
+        ref_text = requests[0].ref_text
+        ref_frames = ref_audio.shape[-1] // HOP_LENGTH
+        batch_size = len(requests)
+        
+        durations = torch.tensor([r.duration for r in requests], device=self.device, dtype=torch.long)
+        ref_lens = torch.full((batch_size,), ref_frames, device=self.device, dtype=torch.long)
+        texts = [f"{ref_text} {r.gen_text}" for r in requests]
+        
+        with self._inference_lock, torch.no_grad():
+            # Sequences are padded to the longest duration inside the model
+            mel, _ = self.model.sample(
+                cond=ref_audio.expand(batch_size, -1),
+                text=texts,
+                duration=durations,
+                lens=ref_lens
+            )
+            
+            # Drop the reference prefix and vocode the whole batch at once
+            # (the vocoder is float16 on CUDA by default - match its weights)
+            vocoder_dtype = next(self.vocoder.parameters()).dtype
+            gen_mel = mel[:, ref_frames:int(durations.max()), :].permute(0, 2, 1).to(vocoder_dtype)
+            waves = self.vocoder.decode(gen_mel)
+        
+        outputs = []
+        for i, request in enumerate(requests):
+            num_samples = (request.duration - ref_frames) * HOP_LENGTH
+            outputs.append(waves[i:i + 1, :num_samples].cpu())
+        
+        return outputs
+    
+    def get_batch_stats(self) -> Optional[dict]:
+        """Get micro-batching statistics, or None if batching is disabled."""
+        if self.batch_scheduler is None:
+            return None
+        return self.batch_scheduler.get_stats()
     
     def get_model_info(self) -> dict:
         """Get information about the loaded model."""
@@ -630,6 +881,10 @@ class F5TTSEngine:
             "device": self.device,
             "model_loaded": self.model is not None,
             "model_load_time": self.model_load_time,
+            "warmup_time": self.warmup_time,
+            "batching": self.get_batch_stats(),
+            "reference_cache": self.reference_cache.get_stats(),
+            "reference_transcripts": get_transcript_store().get_stats(),
             "last_inference_time": self.last_inference_time,
             "cuda_available": torch.cuda.is_available(),
             "cuda_memory": torch.cuda.get_device_properties(0).total_memory if torch.cuda.is_available() else None
@@ -654,14 +909,140 @@ class F5TTSEngine:
         except Exception as e:
             logger.error(f"Failed to cleanup F5-TTS engine: {e}")
 
+# Sentence boundary: whitespace after terminal punctuation (optionally
+# followed by a closing quote/bracket), or directly after CJK full stops
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?:(?<=[.!?])|(?<=[.!?]["\')\]\u201d\u2019]))\s+|(?<=[\u3002\uff01\uff1f])\s*'
+)
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.", "e.g.", "i.e.", "no."}
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences for incremental synthesis.
+    
+    Args:
+        text: Text to split
+        
+    Returns:
+        Non-empty sentences in order
+    """
+    sentences = []
+    for part in _SENTENCE_BOUNDARY.split(text.strip()):
+        part = part.strip()
+        if not part:
+            continue
+        # Re-join splits after abbreviations like "Dr." or "e.g."
+        if sentences and sentences[-1].split()[-1].lower() in _ABBREVIATIONS:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+# Clause boundary used when a single sentence exceeds the chunk size
+_CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:\u2014\uff0c\uff1b])\s*')
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    """Split a sentence at clause boundaries, then at word boundaries."""
+    parts = []
+    for clause in _CLAUSE_BOUNDARY.split(sentence):
+        clause = clause.strip()
+        while len(clause.encode("utf-8")) > max_chars and " " in clause:
+            cut = clause.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = clause.find(" ")
+            parts.append(clause[:cut])
+            clause = clause[cut:].strip()
+        if clause:
+            parts.append(clause)
+    return parts
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """
+    Pack text into chunks of at most ``max_chars`` UTF-8 bytes.
+    
+    Chunks break at sentence boundaries where possible, falling back to
+    clause and word boundaries for very long sentences.
+    
+    Args:
+        text: Text to chunk
+        max_chars: Chunk size budget in UTF-8 bytes
+        
+    Returns:
+        Non-empty chunks in order
+    """
+    pieces = []
+    for sentence in split_sentences(text):
+        if len(sentence.encode("utf-8")) > max_chars:
+            pieces.extend(_split_long_sentence(sentence, max_chars))
+        else:
+            pieces.append(sentence)
+    
+    chunks = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if current and len(candidate.encode("utf-8")) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    
+    return chunks
+
+def crossfade_concat(waves: List[np.ndarray], crossfade_samples: int) -> np.ndarray:
+    """
+    Join 1-D waveforms with linear crossfades into a preallocated buffer.
+    
+    Args:
+        waves: Waveforms to join, in order
+        crossfade_samples: Overlap between neighbouring waveforms
+        
+    Returns:
+        Stitched float32 waveform
+    """
+    if len(waves) == 1:
+        return waves[0].astype(np.float32, copy=False)
+    
+    # Overlap can't exceed the shortest chunk
+    overlap = min([crossfade_samples] + [len(wave) for wave in waves])
+    total = sum(len(wave) for wave in waves) - overlap * (len(waves) - 1)
+    output = np.zeros(total, dtype=np.float32)
+    
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+    fade_out = fade_in[::-1]
+    
+    position = 0
+    for index, wave in enumerate(waves):
+        segment = wave.astype(np.float32)
+        if overlap:
+            if index > 0:
+                segment[:overlap] *= fade_in
+            if index < len(waves) - 1:
+                segment[-overlap:] *= fade_out
+        output[position:position + len(segment)] += segment
+        position += len(segment) - overlap
+    
+    return output
+
 # Global engine instance for warm loading
 _f5tts_engine = None
+_f5tts_engine_lock = threading.Lock()
+
+def encode_wav(waveform: torch.Tensor, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Encode a (channels, samples) waveform as a WAV file in memory."""
+    buffer = io.BytesIO()
+    torchaudio.save(buffer, waveform, sample_rate, format="wav")
+    return buffer.getvalue()
 
 def get_f5tts_engine() -> F5TTSEngine:
-    """Get global F5-TTS engine instance."""
+    """Get global F5-TTS engine instance (safe to call from concurrent jobs)."""
     global _f5tts_engine
     if _f5tts_engine is None:
-        _f5tts_engine = F5TTSEngine()
+        with _f5tts_engine_lock:
+            if _f5tts_engine is None:
+                _f5tts_engine = F5TTSEngine()
     return _f5tts_engine
 
 def process_tts(text: str, reference_audio_path: Union[str, Path]) -> Path:
@@ -692,4 +1073,4 @@ if __name__ == "__main__":
             
     except Exception as e:
         logger.error(f"F5-TTS engine test failed: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -7,13 +7,32 @@ and retry logic. Integrates with RunPod's S3 utilities.
 """
 
 import os
+import io
 import sys
+import json
 import boto3
+import random
+import re
+import socket
+import hashlib
 import logging
+import shutil
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional, Union
-from botocore.exceptions import ClientError, NoCredentialsError
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Union
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError, NoCredentialsError, HTTPClientError, IncompleteReadError,
+    ConnectionError as BotocoreConnectionError
+)
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Add container app directory to path
 sys.path.append('/app')
@@ -21,8 +40,15 @@ sys.path.append('/app')
 try:
     from setup_network_venv import (  # config.py
         S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
-        AWS_REGION, AWS_ENDPOINT_URL, S3_RETRY_COUNT, S3_RETRY_DELAY,
-        TEMP_PATH
+        AWS_REGION, AWS_ENDPOINT_URL, S3_RETRY_COUNT, S3_RETRY_BASE_DELAY,
+        S3_RETRY_MAX_DELAY, S3_RETRY_BUDGET, S3_HEDGE_READS, S3_HEDGE_QUANTILE,
+        S3_HEDGE_MIN_SAMPLES, TEMP_PATH, S3_CACHE_ENABLED, S3_CACHE_PATH, S3_CACHE_MAX_BYTES,
+        S3_CACHE_TTL, S3_MULTIPART_THRESHOLD, S3_MULTIPART_CHUNKSIZE,
+        S3_MAX_CONCURRENCY, S3_MAX_POOL_CONNECTIONS, S3_CONNECT_TIMEOUT,
+        S3_READ_TIMEOUT, S3_TCP_KEEPALIVE, S3_PREWARM_CONNECTIONS,
+        S3_RANGE_THRESHOLD, S3_RANGE_PART_SIZE, S3_RANGE_WORKERS,
+        S3_VERIFY_DOWNLOADS, S3_UPLOAD_DEDUP, S3_UPLOAD_INDEX_PATH,
+        S3_UPLOAD_INDEX_MAX_ENTRIES, S3_UPLOAD_JOB_MARKER_TTL
     )
 except ImportError:
     # Fallback to environment variables if config not available
@@ -31,18 +57,573 @@ except ImportError:
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
     AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
-    S3_RETRY_COUNT = 3
-    S3_RETRY_DELAY = 2
+    S3_RETRY_COUNT = int(os.getenv("S3_RETRY_COUNT", "4"))
+    S3_RETRY_BASE_DELAY = float(os.getenv("S3_RETRY_BASE_DELAY", "0.05"))
+    S3_RETRY_MAX_DELAY = float(os.getenv("S3_RETRY_MAX_DELAY", "2"))
+    S3_RETRY_BUDGET = float(os.getenv("S3_RETRY_BUDGET", "20"))
+    S3_HEDGE_READS = os.getenv("S3_HEDGE_READS", "false").lower() == "true"
+    S3_HEDGE_QUANTILE = float(os.getenv("S3_HEDGE_QUANTILE", "0.95"))
+    S3_HEDGE_MIN_SAMPLES = int(os.getenv("S3_HEDGE_MIN_SAMPLES", "50"))
     TEMP_PATH = Path("/tmp")
+    S3_CACHE_ENABLED = os.getenv("S3_CACHE_ENABLED", "true").lower() == "true"
+    S3_CACHE_PATH = Path(os.getenv("S3_CACHE_PATH", "/tmp/s3-cache"))
+    S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    S3_CACHE_TTL = int(os.getenv("S3_CACHE_TTL", "300"))
+    S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+    S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+    S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "10"))
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+    S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+    S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+    S3_TCP_KEEPALIVE = os.getenv("S3_TCP_KEEPALIVE", "true").lower() == "true"
+    S3_PREWARM_CONNECTIONS = int(os.getenv("S3_PREWARM_CONNECTIONS", "4"))
+    S3_RANGE_THRESHOLD = int(os.getenv("S3_RANGE_THRESHOLD", str(16 * 1024 * 1024)))
+    S3_RANGE_PART_SIZE = int(os.getenv("S3_RANGE_PART_SIZE", str(8 * 1024 * 1024)))
+    S3_RANGE_WORKERS = int(os.getenv("S3_RANGE_WORKERS", "8"))
+    S3_VERIFY_DOWNLOADS = os.getenv("S3_VERIFY_DOWNLOADS", "true").lower() == "true"
+    S3_UPLOAD_DEDUP = os.getenv("S3_UPLOAD_DEDUP", "true").lower() == "true"
+    S3_UPLOAD_INDEX_PATH = Path(os.getenv("S3_UPLOAD_INDEX_PATH", "/runpod-volume/f5tts/cache/upload-index"))
+    S3_UPLOAD_INDEX_MAX_ENTRIES = int(os.getenv("S3_UPLOAD_INDEX_MAX_ENTRIES", "100000"))
+    S3_UPLOAD_JOB_MARKER_TTL = int(os.getenv("S3_UPLOAD_JOB_MARKER_TTL", "86400"))
+
+from metrics import get_metrics_registry
+from result_cache import hash_file
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+
+# Error codes worth another attempt: S3 asking us to slow down, and server-side failures
+THROTTLING_ERRORS = {
+    "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+    "TooManyRequestsException", "429", "503"
+}
+SERVER_ERRORS = {"InternalError", "ServiceUnavailable", "RequestTimeout", "500", "502", "504"}
+
+# Connection resets, timeouts and truncated bodies - the failures seen in practice
+NETWORK_ERRORS = (
+    BotocoreConnectionError, HTTPClientError, IncompleteReadError,
+    ConnectionError, TimeoutError, socket.timeout
+)
+
+# ETags that are an MD5 (plain upload) or an MD5 of part MD5s (multipart)
+MD5_ETAG_PATTERN = re.compile(r"[0-9a-f]{32}(-[0-9]+)?")
+
+# Server-side encryption whose ETag is not an MD5 of the content (SSE-S3
+# "AES256", the AWS default, keeps the content MD5 as the ETag)
+NON_MD5_ETAG_ENCRYPTION = {"aws:kms", "aws:kms:dsse"}
+
+def _error_code(error: ClientError) -> str:
+    """Get the S3 error code of a ClientError."""
+    return error.response.get('Error', {}).get('Code', 'Unknown')
+
+class RetryPolicy:
+    """
+    Retries for S3 calls: full-jitter exponential backoff within a time budget.
+    
+    Only errors a retry can fix are retried: network failures, throttling
+    and 5xx responses. A retry is not started if its backoff would end
+    past the call's budget.
+    """
+    
+    def __init__(
+        self,
+        max_attempts: int = S3_RETRY_COUNT,
+        base_delay: float = S3_RETRY_BASE_DELAY,
+        max_delay: float = S3_RETRY_MAX_DELAY,
+        budget: float = S3_RETRY_BUDGET
+    ):
+        """
+        Initialize retry policy.
+        
+        Args:
+            max_attempts: Attempts per call, including the first
+            base_delay: Backoff base in seconds (doubled per retry, then jittered)
+            max_delay: Cap on a single backoff in seconds
+            budget: Seconds from the first attempt after which no retry starts
+        """
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.retries = 0
+        self.network_errors = 0
+        self.throttles = 0
+        self.server_errors = 0
+        self.budget_exhausted = 0
+        self.failures = 0  # Retryable errors that still failed after all attempts or the budget
+    
+    @staticmethod
+    def classify(error: BaseException) -> Optional[str]:
+        """Classify an error as "network", "throttle" or "server", or None if not retryable."""
+        if isinstance(error, S3UploadFailedError):
+            # Managed uploads wrap the ClientError (raised while handling it)
+            error = error.__cause__ or error.__context__ or error
+        if isinstance(error, ClientError):
+            code = _error_code(error)
+            if code in THROTTLING_ERRORS:
+                return "throttle"
+            if code in SERVER_ERRORS:
+                return "server"
+            return None
+        if isinstance(error, NETWORK_ERRORS):
+            return "network"
+        return None
+    
+    def backoff(self, error: BaseException, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Decide whether to retry after a failed attempt.
+        
+        Args:
+            error: Error raised by the attempt
+            attempt: Number of the failed attempt (1-based)
+            deadline: Time after which no retry may start
+            
+        Returns:
+            Seconds to sleep before the next attempt, or None to give up
+        """
+        kind = self.classify(error)
+        with self._lock:
+            if kind == "network":
+                self.network_errors += 1
+            elif kind == "throttle":
+                self.throttles += 1
+            elif kind == "server":
+                self.server_errors += 1
+            
+            if kind is None:
+                return None
+            if attempt >= self.max_attempts:
+                self.failures += 1
+                return None
+            
+            # Full jitter: uniform over [0, capped exponential]
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+            if time.time() + delay > deadline:
+                self.budget_exhausted += 1
+                self.failures += 1
+                return None
+            
+            self.retries += 1
+            return delay
+    
+    def call(self, operation, *args, **kwargs):
+        """Run an S3 call, retrying retryable failures within the budget."""
+        deadline = time.time() + self.budget
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return operation(*args, **kwargs)
+            except Exception as e:
+                delay = self.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                label = _error_code(e) if isinstance(e, ClientError) else type(e).__name__
+                logger.warning(f"S3 operation failed (attempt {attempt}/{self.max_attempts}): {label} - retrying in {delay:.2f}s")
+                time.sleep(delay)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get retry counters by error class."""
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "network_errors": self.network_errors,
+                "throttles": self.throttles,
+                "server_errors": self.server_errors,
+                "budget_exhausted": self.budget_exhausted,
+                "failures": self.failures
+            }
+
+class HedgePolicy:
+    """
+    Hedged GETs: a second identical request once the first is slower than usual.
+    
+    The hedge fires after the configured quantile of recent GET latencies
+    (time to response headers), and whichever request answers first wins.
+    That trims the latency tail from slow connections or overloaded S3
+    partitions at the cost of a few percent extra GETs.
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = S3_HEDGE_READS,
+        quantile: float = S3_HEDGE_QUANTILE,
+        min_samples: int = S3_HEDGE_MIN_SAMPLES,
+        max_workers: int = S3_MAX_POOL_CONNECTIONS
+    ):
+        """
+        Initialize hedge policy.
+        
+        Args:
+            enabled: Whether GETs are hedged
+            quantile: Latency quantile after which the hedge fires
+            min_samples: GET latencies observed before hedging starts
+            max_workers: Threads available for in-flight hedged GETs
+        """
+        self.enabled = enabled
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.hedges = 0
+        self.hedge_wins = 0
+    
+    def hedge_delay(self) -> Optional[float]:
+        """Get the delay after which to hedge, or None if not hedging yet."""
+        if not self.enabled:
+            return None
+        return get_metrics_registry().quantile("s3_get", self.quantile, self.min_samples)
+    
+    def run(self, get):
+        """
+        Run a GET, hedging it if it is slower than the hedge delay.
+        
+        Args:
+            get: Zero-argument callable performing the GET
+            
+        Returns:
+            Response of the first request to succeed
+        """
+        def timed_get():
+            start = time.perf_counter()
+            response = get()
+            get_metrics_registry().observe("s3_get", time.perf_counter() - start)
+            return response
+        
+        delay = self.hedge_delay()
+        if delay is None:
+            return timed_get()
+        
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="s3-hedge")
+        
+        primary = self._executor.submit(timed_get)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        hedge = self._executor.submit(timed_get)
+        with self._lock:
+            self.hedges += 1
+        
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                # Release the loser's connection once it answers
+                for other in pending:
+                    other.add_done_callback(_close_response)
+                return future.result()
+        raise error
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedge counters and the current hedge delay."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_delay": self.hedge_delay()
+            }
+
+def _close_response(future):
+    """Close the body of a GET response nobody will read."""
+    if not future.cancelled() and future.exception() is None:
+        future.result()["Body"].close()
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterable of byte chunks (for upload_fileobj)."""
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        """
+        Initialize chunk stream.
+        
+        Args:
+            chunks: Byte chunks, consumed lazily as the upload reads
+        """
+        self._chunks = iter(chunks)
+        self._pending = b""
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        """Fill ``buffer`` from the pending chunk, pulling the next one when empty."""
+        while not self._pending:
+            try:
+                self._pending = bytes(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+class S3DownloadCache:
+    """
+    Local cache of downloaded S3 objects, keyed by bucket and key.
+    
+    Objects younger than ``ttl`` are served without contacting S3; older
+    ones are revalidated with a conditional GET on their ETag, which costs
+    one round trip and no body when unchanged. Each entry is a data file
+    plus a small JSON record, both written atomically. Eviction keeps the
+    total data size under ``max_bytes``, least recently used first, and
+    skips entries pinned by a job of this worker that is still using them.
+    """
+    
+    def __init__(self, cache_dir: Path = S3_CACHE_PATH, max_bytes: int = S3_CACHE_MAX_BYTES, ttl: int = S3_CACHE_TTL):
+        """
+        Initialize download cache.
+        
+        Args:
+            cache_dir: Directory holding cached objects
+            max_bytes: Total object size budget before eviction
+            ttl: Seconds an object is served before revalidation
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._pins: Dict[str, int] = {}  # entry id -> jobs using the cached file
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # entry id -> object size
+        self._total_bytes = 0
+        self._loaded = False
+        
+        # Counters
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+    
+    @staticmethod
+    def entry_id(bucket: str, s3_key: str) -> str:
+        """Get the cache entry id of an object."""
+        return hashlib.sha256(f"{bucket}/{s3_key}".encode("utf-8")).hexdigest()
+    
+    def _record_path(self, entry_id: str) -> Path:
+        """Get the JSON record of an entry (sharded to keep directories small)."""
+        return self.cache_dir / "records" / entry_id[:2] / f"{entry_id}.json"
+    
+    def _data_path(self, entry_id: str, s3_key: str) -> Path:
+        """Get the data file of an entry (keeps the key's extension for audio loaders)."""
+        return self.cache_dir / "objects" / entry_id[:2] / f"{entry_id}{Path(s3_key).suffix}"
+    
+    def _load_index(self):
+        """Build the LRU index from records on disk (caller holds the lock)."""
+        if self._loaded:
+            return
+        
+        entries = []
+        records_dir = self.cache_dir / "records"
+        if records_dir.exists():
+            for record_path in records_dir.glob("*/*.json"):
+                try:
+                    record = json.loads(record_path.read_text())
+                    entries.append((record_path.stat().st_mtime, record_path.stem, record["size"]))
+                except (OSError, ValueError, KeyError):
+                    continue
+        
+        for _, entry_id, size in sorted(entries):
+            self._index[entry_id] = size
+            self._total_bytes += size
+        
+        self._loaded = True
+        logger.info(f"S3 cache index loaded: {len(self._index)} objects, {self._total_bytes} bytes")
+    
+    def _read_record(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """Read an entry's record, or None if the entry is missing or incomplete."""
+        try:
+            record = json.loads(self._record_path(entry_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if not self._data_path(entry_id, record["key"]).exists():
+            return None
+        return record
+    
+    def _write_record(self, entry_id: str, record: Dict[str, Any]):
+        """Write an entry's record atomically (also refreshes its LRU position on disk)."""
+        record_path = self._record_path(entry_id)
+        record_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = record_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(record))
+        os.replace(tmp_path, record_path)
+    
+    def _touch(self, entry_id: str, size: int):
+        """Move an entry to the most recently used end of the index."""
+        with self._lock:
+            self._load_index()
+            if entry_id not in self._index:
+                # Cached by another worker sharing the directory
+                self._index[entry_id] = size
+                self._total_bytes += size
+            self._index.move_to_end(entry_id)
+    
+    def _pin(self, entry_id: str):
+        """Keep an entry from being evicted until it is released (caller holds the lock)."""
+        self._pins[entry_id] = self._pins.get(entry_id, 0) + 1
+    
+    def release(self, path: Union[str, Path]):
+        """
+        Let eviction remove a cached file returned by fetch() again.
+        
+        Args:
+            path: Path returned by fetch()
+        """
+        # Data files are named "{entry_id}{suffix}"
+        entry_id = Path(path).name.split(".", 1)[0]
+        with self._lock:
+            pins = self._pins.get(entry_id, 0) - 1
+            if pins > 0:
+                self._pins[entry_id] = pins
+            else:
+                self._pins.pop(entry_id, None)
+        self._evict()
+    
+    def _evict(self):
+        """Remove least recently used unpinned entries over budget, keeping the newest one."""
+        with self._lock:
+            for entry_id in list(self._index):
+                if self._total_bytes <= self.max_bytes or len(self._index) <= 1:
+                    break
+                if entry_id in self._pins:
+                    continue
+                size = self._index.pop(entry_id)
+                self._total_bytes -= size
+                record = self._read_record(entry_id)
+                if record is not None:
+                    self._data_path(entry_id, record["key"]).unlink(missing_ok=True)
+                self._record_path(entry_id).unlink(missing_ok=True)
+                self.evictions += 1
+    
+    def fetch(self, client: "S3Client", s3_key: str) -> Path:
+        """
+        Get a local copy of an object, downloading or revalidating as needed.
+        
+        Args:
+            client: S3 client used for conditional GETs
+            s3_key: S3 key in the client's bucket
+            
+        Returns:
+            Path to the cached object. Shared with other jobs - don't
+            modify or delete it, and release() it once it is no longer
+            needed so it can be evicted again.
+        """
+        entry_id = self.entry_id(client.bucket, s3_key)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(entry_id, threading.Lock())
+        
+        # Concurrent requests for one object share a single download
+        try:
+            with key_lock:
+                record = self._read_record(entry_id)
+                
+                if record is not None and time.time() - record["validated_at"] < self.ttl:
+                    self._touch(entry_id, record["size"])
+                    with self._lock:
+                        self._pin(entry_id)
+                        self.hits += 1
+                        self.bytes_saved += record["size"]
+                    return self._data_path(entry_id, s3_key)
+                
+                data_path = self._data_path(entry_id, s3_key)
+                data_path.parent.mkdir(parents=True, exist_ok=True)
+                
+                # Conditional when a copy exists - an unchanged object costs no body
+                download = client.fetch_object(s3_key, data_path, if_none_match=record["etag"] if record else None)
+                if download is None:
+                    # Unchanged since it was cached - only the record is refreshed
+                    record["validated_at"] = time.time()
+                    self._write_record(entry_id, record)
+                    self._touch(entry_id, record["size"])
+                    with self._lock:
+                        self._pin(entry_id)
+                        self.revalidations += 1
+                        self.bytes_saved += record["size"]
+                    return data_path
+                
+                size = download["size"]
+                self._write_record(entry_id, {
+                    "bucket": client.bucket,
+                    "key": s3_key,
+                    "etag": download["etag"],
+                    "size": size,
+                    "validated_at": time.time()
+                })
+                
+                with self._lock:
+                    self._load_index()
+                    self._total_bytes -= self._index.pop(entry_id, 0)
+                    self._index[entry_id] = size
+                    self._total_bytes += size
+                    self._pin(entry_id)
+                    self.misses += 1
+                    self.bytes_downloaded += size
+        finally:
+            # Waiters still hold the lock object; later requests find the record
+            with self._lock:
+                self._key_locks.pop(entry_id, None)
+        
+        logger.info(f"Cached s3://{client.bucket}/{s3_key} ({size} bytes)")
+        self._evict()
+        return data_path
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters, bytes saved and cache size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "revalidations": self.revalidations,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_saved": self.bytes_saved,
+                "bytes_downloaded": self.bytes_downloaded,
+                "objects": len(self._index),
+                "bytes": self._total_bytes
+            }
+
 class S3Client:
-    """S3 client with error handling and retry logic."""
+    """
+    S3 client with error handling and retry logic.
     
-    def __init__(self):
-        """Initialize S3 client with credentials."""
+    One instance is shared by all jobs of the worker: the boto3 session is
+    only used during construction, and the botocore client (with its
+    connection pool) is thread-safe.
+    """
+    
+    def __init__(
+        self,
+        max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+        connect_timeout: float = S3_CONNECT_TIMEOUT,
+        read_timeout: float = S3_READ_TIMEOUT,
+        tcp_keepalive: bool = S3_TCP_KEEPALIVE
+    ):
+        """
+        Initialize S3 client with credentials.
+        
+        Args:
+            max_pool_connections: Pooled HTTP connections shared by all threads
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for response data
+            tcp_keepalive: Enable TCP keepalive on pooled connections
+        """
         self.bucket = S3_BUCKET
         self.session = boto3.Session(
             aws_access_key_id=AWS_ACCESS_KEY_ID,
@@ -51,15 +632,85 @@ class S3Client:
         )
         
         # Create S3 client
-        s3_config = {}
+        s3_config = {
+            'config': Config(
+                max_pool_connections=max_pool_connections,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                tcp_keepalive=tcp_keepalive,
+                retries={'mode': 'standard', 'total_max_attempts': 1}
+            )
+        }
         if AWS_ENDPOINT_URL:
             s3_config['endpoint_url'] = AWS_ENDPOINT_URL
             
         self.s3 = self.session.client('s3', **s3_config)
+        self.max_pool_connections = max_pool_connections
+        
+        # Retries and hedging are ours; botocore's own retries are disabled above
+        self.retry_policy = RetryPolicy()
+        self.hedge_policy = HedgePolicy(max_workers=max_pool_connections)
+        
+        # Download counters
+        self._stats_lock = threading.Lock()
+        self.downloads = 0
+        self.ranged_downloads = 0
+        self.bytes_downloaded = 0
+        self.download_seconds = 0.0
+        
+        # Multipart tuning shared by all managed transfers (parts never
+        # outnumber the pooled connections)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=min(S3_MAX_CONCURRENCY, max_pool_connections),
+            use_threads=True
+        )
         
         # Validate configuration
         self._validate_config()
     
+    def prewarm(self, connections: int = S3_PREWARM_CONNECTIONS) -> Dict[str, Any]:
+        """
+        Open pooled connections before the first job needs them.
+        
+        Concurrent HeadBucket calls resolve credentials and the endpoint and
+        complete the TCP/TLS handshakes, leaving that many keep-alive
+        connections in the pool. Any HTTP response (even 403) counts as
+        warm - only the connection matters.
+        
+        Args:
+            connections: Number of connections to open
+            
+        Returns:
+            Connections opened, failures and wall time
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        connections = min(connections, self.max_pool_connections)
+        
+        def warm(_) -> bool:
+            try:
+                self.s3.head_bucket(Bucket=self.bucket)
+            except ClientError:
+                pass
+            except Exception as e:
+                logger.warning(f"S3 connection pre-warm failed: {e}")
+                return False
+            return True
+        
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max(connections, 1), thread_name_prefix="s3-prewarm") as executor:
+            results = list(executor.map(warm, range(connections)))
+        
+        info = {
+            "connections": sum(results),
+            "failed": len(results) - sum(results),
+            "seconds": round(time.time() - start_time, 3)
+        }
+        logger.info(f"Pre-warmed {info['connections']} S3 connections in {info['seconds']:.2f}s")
+        return info
+    
     def _validate_config(self):
         """Validate S3 configuration."""
         if not self.bucket:
@@ -70,27 +721,12 @@ class S3Client:
             raise ValueError("AWS_SECRET_ACCESS_KEY environment variable is required")
     
     def _retry_operation(self, operation, *args, **kwargs):
-        """Retry S3 operations with exponential backoff."""
-        last_exception = None
-        
-        for attempt in range(S3_RETRY_COUNT):
-            try:
-                return operation(*args, **kwargs)
-            except ClientError as e:
-                last_exception = e
-                error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-                logger.warning(f"S3 operation failed (attempt {attempt + 1}/{S3_RETRY_COUNT}): {error_code}")
-                
-                if attempt < S3_RETRY_COUNT - 1:
-                    delay = S3_RETRY_DELAY * (2 ** attempt)
-                    logger.info(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
-            except Exception as e:
-                last_exception = e
-                logger.error(f"Unexpected error in S3 operation: {e}")
-                break
-        
-        raise last_exception
+        """Run an S3 operation under the client's retry policy."""
+        return self.retry_policy.call(operation, *args, **kwargs)
+    
+    def _get_object(self, **request) -> Dict[str, Any]:
+        """GetObject, hedged with a second request when it is unusually slow."""
+        return self.hedge_policy.run(lambda: self.s3.get_object(**request))
     
     def upload_file(self, local_path: Union[str, Path], s3_key: str) -> str:
         """
@@ -116,15 +752,11 @@ class S3Client:
                 self.s3.upload_file,
                 str(local_path),
                 self.bucket,
-                s3_key
+                s3_key,
+                Config=self.transfer_config
             )
             
-            # Generate URL
-            if AWS_ENDPOINT_URL:
-                url = f"{AWS_ENDPOINT_URL}/{self.bucket}/{s3_key}"
-            else:
-                url = f"https://s3.{AWS_REGION}.amazonaws.com/{self.bucket}/{s3_key}"
-            
+            url = self.object_url(s3_key)
             logger.info(f"Successfully uploaded to: {url}")
             return url
             
@@ -132,292 +764,354 @@ class S3Client:
             logger.error(f"Failed to upload {local_path}: {e}")
             raise
     
-    def download_file(self, s3_key: str, local_path: Optional[Union[str, Path]] = None) -> Path:
+    def upload_bytes(
+        self,
+        data: Union[bytes, bytearray, memoryview, BinaryIO],
+        s3_key: str,
+        content_type: Optional[str] = None
+    ) -> str:
         """
-        Download file from S3.
+        Upload an in-memory buffer to S3 and return the URL.
         
         Args:
-            s3_key: S3 key of file to download
-            local_path: Local path to save file (optional)
+            data: Bytes, or a seekable binary file object (e.g. io.BytesIO)
+            s3_key: S3 key (path) for the uploaded object
+            content_type: Content-Type of the object (optional)
             
         Returns:
-            Path to downloaded file
+            S3 URL of uploaded object
         """
         try:
-            if local_path is None:
-                # Generate temporary filename
-                filename = Path(s3_key).name
-                local_path = TEMP_PATH / filename
+            fileobj = data if hasattr(data, "read") else io.BytesIO(data)
+            start = fileobj.tell()
+            extra_args = {"ContentType": content_type} if content_type else None
             
-            local_path = Path(local_path)
-            local_path.parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Uploading buffer to s3://{self.bucket}/{s3_key}")
             
-            logger.info(f"Downloading s3://{self.bucket}/{s3_key} to {local_path}")
+            def upload():
+                # Rewind so a retried attempt sends the whole buffer again
+                fileobj.seek(start)
+                self.s3.upload_fileobj(fileobj, self.bucket, s3_key, ExtraArgs=extra_args, Config=self.transfer_config)
             
-            # Download with retry
-            self._retry_operation(
-                self.s3.download_file,
-                self.bucket,
-                s3_key,
-                str(local_path)
-            )
+            self._retry_operation(upload)
             
-            if not local_path.exists():
-                raise RuntimeError(f"Download failed - file not created: {local_path}")
-            
-            logger.info(f"Successfully downloaded to: {local_path}")
-            return local_path
+            url = self.object_url(s3_key)
+            logger.info(f"Successfully uploaded to: {url}")
+            return url
             
         except Exception as e:
-            logger.error(f"Failed to download {s3_key}: {e}")
+            logger.error(f"Failed to upload buffer to {s3_key}: {e}")
             raise
     
-    def download_from_url(self, s3_url: str, local_path: Optional[Union[str, Path]] = None) -> Path:
+    def upload_stream(self, chunks: Iterable[bytes], s3_key: str, content_type: Optional[str] = None) -> str:
         """
-        Download file from S3 URL.
+        Upload a stream of byte chunks to S3 and return the URL.
+        
+        Chunks are consumed as the upload proceeds, so the full object never
+        needs to be in memory; parts are buffered up to the multipart chunk
+        size. A consumed stream cannot be replayed, so this is not retried.
         
         Args:
-            s3_url: Full S3 URL (s3://bucket/key or https://...)
-            local_path: Local path to save file (optional)
+            chunks: Iterable (e.g. generator) of byte chunks
+            s3_key: S3 key (path) for the uploaded object
+            content_type: Content-Type of the object (optional)
             
         Returns:
-            Path to downloaded file
+            S3 URL of uploaded object
         """
         try:
-            # Parse S3 URL to extract bucket and key
-            if s3_url.startswith('s3://'):
-                # s3://bucket/key format
-                s3_parts = s3_url[5:].split('/', 1)
-                if len(s3_parts) != 2:
-                    raise ValueError(f"Invalid S3 URL format: {s3_url}")
-                bucket, s3_key = s3_parts
-                
-                if bucket != self.bucket:
-                    logger.warning(f"URL bucket ({bucket}) differs from configured bucket ({self.bucket})")
-            
-            elif 'amazonaws.com' in s3_url or AWS_ENDPOINT_URL in s3_url:
-                # HTTP(S) URL format
-                # Extract key from URL
-                if f"/{self.bucket}/" in s3_url:
-                    s3_key = s3_url.split(f"/{self.bucket}/", 1)[1]
-                else:
-                    raise ValueError(f"Cannot extract S3 key from URL: {s3_url}")
+            extra_args = {"ContentType": content_type} if content_type else None
             
-            else:
-                raise ValueError(f"Unsupported URL format: {s3_url}")
+            logger.info(f"Streaming upload to s3://{self.bucket}/{s3_key}")
+            self.s3.upload_fileobj(
+                io.BufferedReader(ChunkStream(chunks)),
+                self.bucket,
+                s3_key,
+                ExtraArgs=extra_args,
+                Config=self.transfer_config
+            )
             
-            return self.download_file(s3_key, local_path)
+            url = self.object_url(s3_key)
+            logger.info(f"Successfully uploaded to: {url}")
+            return url
             
         except Exception as e:
-            logger.error(f"Failed to download from URL {s3_url}: {e}")
+            logger.error(f"Failed to stream upload to {s3_key}: {e}")
             raise
     
-    def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> str:
+    def object_url(self, s3_key: str) -> str:
+        """Get the URL of an object in the configured bucket."""
+        if AWS_ENDPOINT_URL:
+            return f"{AWS_ENDPOINT_URL}/{self.bucket}/{s3_key}"
+        return f"https://s3.{AWS_REGION}.amazonaws.com/{self.bucket}/{s3_key}"
+    
+    def fetch_object(
+        self,
+        s3_key: str,
+        local_path: Union[str, Path],
+        if_none_match: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
         """
-        Generate presigned URL for S3 object.
+        Download an object, splitting large ones into concurrent byte ranges.
+        
+        The first GET asks for the first S3_RANGE_THRESHOLD bytes, so small
+        objects still take a single request and the response tells the
+        total size. For larger objects the rest is split into
+        S3_RANGE_PART_SIZE ranges. Those are fetched concurrently, pinned
+        to the first response's ETag, and retried individually from where
+        they stopped. All ranges are written with ``pwrite`` into a
+        preallocated temp file, which is verified and then renamed over
+        ``local_path``.
         
         Args:
             s3_key: S3 key of the object
-            expiration: URL expiration time in seconds
+            local_path: Destination file
+            if_none_match: ETag of a local copy (conditional download)
             
         Returns:
-            Presigned URL
+            Download info (etag, size, ranges, throughput), or None if the
+            object still matches ``if_none_match``
         """
+        local_path = Path(local_path)
+        tmp_path = local_path.with_name(f"{local_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        start_time = time.time()
+        
+        request = {"Bucket": self.bucket, "Key": s3_key, "Range": f"bytes=0-{S3_RANGE_THRESHOLD - 1}"}
+        if if_none_match:
+            request["IfNoneMatch"] = if_none_match
         try:
-            url = self._retry_operation(
-                self.s3.generate_presigned_url,
-                'get_object',
-                Params={'Bucket': self.bucket, 'Key': s3_key},
-                ExpiresIn=expiration
-            )
+            response = self._retry_operation(self._get_object, **request)
+        except ClientError as e:
+            code = _error_code(e)
+            if code in ("304", "NotModified"):
+                return None
+            if code != "InvalidRange":
+                raise
+            # Empty object - no byte range is satisfiable
+            del request["Range"]
+            response = self._retry_operation(self._get_object, **request)
+        
+        etag = response.get("ETag")
+        first_size = response["ContentLength"]
+        content_range = response.get("ContentRange")
+        total_size = int(content_range.rsplit("/", 1)[1]) if content_range else first_size
+        
+        fd = os.open(tmp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o644)
+        try:
+            # Preallocate so concurrent ranges write into place without extending the file
+            if total_size:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, total_size)
+                else:
+                    os.ftruncate(fd, total_size)
             
-            logger.info(f"Generated presigned URL for {s3_key}")
-            return url
+            written = self._pwrite_body(fd, response["Body"], 0)
+            if written > first_size:
+                raise IOError(f"Long read of {s3_key}: expected {first_size} bytes, got {written}")
+            attempts = 1
+            if written < first_size:
+                # Connection dropped mid-body - resume the rest like any other range
+                attempts += self._fetch_range(fd, s3_key, etag, written, first_size - written)["attempts"]
+            ranges = [self._range_stats(0, first_size, attempts, start_time)]
             
-        except Exception as e:
-            logger.error(f"Failed to generate presigned URL for {s3_key}: {e}")
+            remaining = [
+                (offset, min(S3_RANGE_PART_SIZE, total_size - offset))
+                for offset in range(first_size, total_size, S3_RANGE_PART_SIZE)
+            ]
+            if remaining:
+                from concurrent.futures import ThreadPoolExecutor
+                workers = max(1, min(S3_RANGE_WORKERS, len(remaining), self.max_pool_connections))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-range") as executor:
+                    ranges.extend(executor.map(
+                        lambda part: self._fetch_range(fd, s3_key, etag, *part),
+                        remaining
+                    ))
+        except BaseException:
+            os.close(fd)
+            tmp_path.unlink(missing_ok=True)
             raise
-
-# Global S3 client instance
-_s3_client = None
-
-def get_s3_client() -> S3Client:
-    """Get global S3 client instance."""
-    global _s3_client
-    if _s3_client is None:
-        _s3_client = S3Client()
-    return _s3_client
-
-# Convenience functions
-def upload_audio_to_s3(local_path: Union[str, Path], prefix: str = "audio") -> str:
-    """Upload audio file to S3 with timestamp prefix."""
-    local_path = Path(local_path)
-    timestamp = int(time.time())
-    s3_key = f"{prefix}/{timestamp}_{local_path.name}"
-    
-    client = get_s3_client()
-    return client.upload_file(local_path, s3_key)
-
-def download_audio_from_s3(s3_url: str) -> Path:
-    """Download audio file from S3 URL."""
-    client = get_s3_client()
-    return client.download_from_url(s3_url)
-
-def upload_subtitles_to_s3(local_path: Union[str, Path]) -> str:
-    """Upload subtitle file to S3."""
-    return upload_audio_to_s3(local_path, "subtitles")
-
-# Test function
-if __name__ == "__main__":
-    """Test S3 client functionality."""
-    try:
-        client = get_s3_client()
-        logger.info("S3 client initialized successfully")
+        os.close(fd)
         
-        # Test basic configuration
-        logger.info(f"Bucket: {client.bucket}")
-        logger.info(f"Region: {AWS_REGION}")
+        try:
+            verification = self._verify_download(tmp_path, s3_key, etag, total_size, response) if S3_VERIFY_DOWNLOADS else "skipped"
+            os.replace(tmp_path, local_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
         
-    except Exception as e:
-        logger.error(f"S3 client test failed: {e}")
-        sys.exit(1)#!/usr/bin/env python3
-"""
-S3 Client for F5-TTS RunPod Serverless
-
-Handles S3 operations for audio file input/output with proper error handling
-and retry logic. Integrates with RunPod's S3 utilities.
-"""
-
-import os
-import sys
-import boto3
-import logging
-import time
-from pathlib import Path
-from typing import Optional, Union
-from botocore.exceptions import ClientError, NoCredentialsError
-
-# Add container app directory to path
-sys.path.append('/app')
-
-try:
-    from setup_network_venv import (  # config.py
-        S3_BUCKET, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
-        AWS_REGION, AWS_ENDPOINT_URL, S3_RETRY_COUNT, S3_RETRY_DELAY,
-        TEMP_PATH
-    )
-except ImportError:
-    # Fallback to environment variables if config not available
-    S3_BUCKET = os.getenv("S3_BUCKET")
-    AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID") 
-    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-    AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-    AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
-    S3_RETRY_COUNT = 3
-    S3_RETRY_DELAY = 2
-    TEMP_PATH = Path("/tmp")
-
-# Setup logging
-logger = logging.getLogger(__name__)
-
-class S3Client:
-    """S3 client with error handling and retry logic."""
-    
-    def __init__(self):
-        """Initialize S3 client with credentials."""
-        self.bucket = S3_BUCKET
-        self.session = boto3.Session(
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
+        seconds = time.time() - start_time
+        info = {
+            "etag": etag,
+            "size": total_size,
+            "ranges": ranges,
+            "verification": verification,
+            "seconds": round(seconds, 3),
+            "throughput_mbps": round(total_size / (1024 * 1024) / max(seconds, 1e-6), 2)
+        }
+        with self._stats_lock:
+            self.downloads += 1
+            self.ranged_downloads += len(ranges) > 1
+            self.bytes_downloaded += total_size
+            self.download_seconds += seconds
         
-        # Create S3 client
-        s3_config = {}
-        if AWS_ENDPOINT_URL:
-            s3_config['endpoint_url'] = AWS_ENDPOINT_URL
-            
-        self.s3 = self.session.client('s3', **s3_config)
+        if len(ranges) > 1:
+            logger.info(
+                f"Downloaded s3://{self.bucket}/{s3_key} in {len(ranges)} ranges: "
+                f"{total_size} bytes, {info['throughput_mbps']} MB/s"
+            )
+        return info
+    
+    @staticmethod
+    def _pwrite_body(fd: int, body, position: int) -> int:
+        """
+        Stream a response body into the file at ``position``.
         
-        # Validate configuration
-        self._validate_config()
+        Returns:
+            Bytes written - short if the connection dropped with a retryable
+            error (timeout, truncated body), so the caller can resume
+        """
+        written = 0
+        try:
+            for chunk in iter(lambda: body.read(1024 * 1024), b""):
+                os.pwrite(fd, chunk, position + written)
+                written += len(chunk)
+        except Exception as e:
+            if RetryPolicy.classify(e) is None:
+                raise
+            logger.warning(f"Response body interrupted after {written} bytes: {type(e).__name__} - {e}")
+        finally:
+            body.close()
+        return written
     
-    def _validate_config(self):
-        """Validate S3 configuration."""
-        if not self.bucket:
-            raise ValueError("S3_BUCKET environment variable is required")
-        if not AWS_ACCESS_KEY_ID:
-            raise ValueError("AWS_ACCESS_KEY_ID environment variable is required")
-        if not AWS_SECRET_ACCESS_KEY:
-            raise ValueError("AWS_SECRET_ACCESS_KEY environment variable is required")
+    @staticmethod
+    def _range_stats(offset: int, length: int, attempts: int, start_time: float) -> Dict[str, Any]:
+        """Summarize one fetched range."""
+        seconds = time.time() - start_time
+        return {
+            "offset": offset,
+            "bytes": length,
+            "attempts": attempts,
+            "seconds": round(seconds, 3),
+            "throughput_mbps": round(length / (1024 * 1024) / max(seconds, 1e-6), 2)
+        }
     
-    def _retry_operation(self, operation, *args, **kwargs):
-        """Retry S3 operations with exponential backoff."""
-        last_exception = None
+    def _fetch_range(self, fd: int, s3_key: str, etag: Optional[str], offset: int, length: int) -> Dict[str, Any]:
+        """
+        Fetch one byte range with its own retries.
         
-        for attempt in range(S3_RETRY_COUNT):
+        A retry resumes after the bytes already written. ``If-Match`` pins
+        every range to the same object version, so an overwrite during the
+        download fails it instead of mixing versions.
+        """
+        start_time = time.time()
+        deadline = start_time + self.retry_policy.budget
+        written = 0
+        attempt = 0
+        while True:
+            attempt += 1
+            request = {
+                "Bucket": self.bucket,
+                "Key": s3_key,
+                "Range": f"bytes={offset + written}-{offset + length - 1}"
+            }
+            if etag:
+                request["IfMatch"] = etag
             try:
-                return operation(*args, **kwargs)
-            except ClientError as e:
-                last_exception = e
-                error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-                logger.warning(f"S3 operation failed (attempt {attempt + 1}/{S3_RETRY_COUNT}): {error_code}")
-                
-                if attempt < S3_RETRY_COUNT - 1:
-                    delay = S3_RETRY_DELAY * (2 ** attempt)
-                    logger.info(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
+                body = self._get_object(**request)["Body"]
+                try:
+                    # Progress is kept per chunk so a dropped connection resumes in place
+                    for chunk in iter(lambda: body.read(1024 * 1024), b""):
+                        os.pwrite(fd, chunk, offset + written)
+                        written += len(chunk)
+                finally:
+                    body.close()
+                if written != length:
+                    raise IncompleteReadError(actual_bytes=written, expected_bytes=length)
+                return self._range_stats(offset, length, attempt, start_time)
             except Exception as e:
-                last_exception = e
-                logger.error(f"Unexpected error in S3 operation: {e}")
-                break
-        
-        raise last_exception
+                delay = self.retry_policy.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                logger.warning(f"Range {offset}+{length} of {s3_key} failed (attempt {attempt}): {e} - retrying in {delay:.2f}s")
+                time.sleep(delay)
     
-    def upload_file(self, local_path: Union[str, Path], s3_key: str) -> str:
+    def _verify_download(self, path: Path, s3_key: str, etag: Optional[str], total_size: int, response: Dict[str, Any]) -> str:
         """
-        Upload file to S3 and return the URL.
+        Check a downloaded file against the object's size and ETag.
+        
+        The ETag is the MD5 of the content for plain uploads, and the MD5
+        of the part MD5s ("-N" suffix) for multipart uploads. The part
+        size comes from a HEAD of part 1. Objects encrypted with SSE-KMS or
+        SSE-C, and ETags without that shape (some S3-compatible endpoints),
+        get the size check only; SSE-S3 objects are checksummed.
         
-        Args:
-            local_path: Path to local file
-            s3_key: S3 key (path) for the uploaded file
-            
         Returns:
-            S3 URL of uploaded file
+            "md5", "multipart-md5" or "size" (what was verified)
+        
+        Raises:
+            IOError: Size or checksum mismatch
         """
+        size = path.stat().st_size
+        if size != total_size:
+            raise IOError(f"Size mismatch for {s3_key}: got {size}, expected {total_size}")
+        
+        etag = (etag or "").strip('"').lower()
+        opaque_etag = response.get("ServerSideEncryption") in NON_MD5_ETAG_ENCRYPTION or response.get("SSECustomerAlgorithm")
+        if opaque_etag or not MD5_ETAG_PATTERN.fullmatch(etag):
+            return "size"
+        
+        if "-" not in etag:
+            digest = hashlib.md5(usedforsecurity=False)
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != etag:
+                raise IOError(f"Checksum mismatch for {s3_key}: MD5 {digest.hexdigest()} != ETag {etag}")
+            return "md5"
+        
+        parts = int(etag.rsplit("-", 1)[1])
         try:
-            local_path = Path(local_path)
-            
-            if not local_path.exists():
-                raise FileNotFoundError(f"Local file not found: {local_path}")
-            
-            logger.info(f"Uploading {local_path} to s3://{self.bucket}/{s3_key}")
-            
-            # Upload with retry
-            self._retry_operation(
-                self.s3.upload_file,
-                str(local_path),
-                self.bucket,
-                s3_key
-            )
-            
-            # Generate URL
-            if AWS_ENDPOINT_URL:
-                url = f"{AWS_ENDPOINT_URL}/{self.bucket}/{s3_key}"
-            else:
-                url = f"https://s3.{AWS_REGION}.amazonaws.com/{self.bucket}/{s3_key}"
-            
-            logger.info(f"Successfully uploaded to: {url}")
-            return url
-            
+            part_size = self.s3.head_object(Bucket=self.bucket, Key=s3_key, PartNumber=1)["ContentLength"]
         except Exception as e:
-            logger.error(f"Failed to upload {local_path}: {e}")
-            raise
+            logger.warning(f"Cannot determine part size of {s3_key} - size check only: {e}")
+            return "size"
+        
+        part_digests = b""
+        with open(path, "rb") as f:
+            for _ in range(parts):
+                part_digest = hashlib.md5(usedforsecurity=False)
+                remaining = part_size
+                while remaining:
+                    chunk = f.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    part_digest.update(chunk)
+                    remaining -= len(chunk)
+                part_digests += part_digest.digest()
+        expected = f"{hashlib.md5(part_digests, usedforsecurity=False).hexdigest()}-{parts}"
+        if expected != etag:
+            raise IOError(f"Checksum mismatch for {s3_key}: multipart MD5 {expected} != ETag {etag}")
+        return "multipart-md5"
+    
+    def get_transfer_stats(self) -> Dict[str, Any]:
+        """Get download counters and average throughput."""
+        with self._stats_lock:
+            return {
+                "downloads": self.downloads,
+                "ranged_downloads": self.ranged_downloads,
+                "bytes_downloaded": self.bytes_downloaded,
+                "throughput_mbps": round(self.bytes_downloaded / (1024 * 1024) / self.download_seconds, 2) if self.download_seconds else None,
+                "retries": self.retry_policy.get_stats(),
+                "hedging": self.hedge_policy.get_stats()
+            }
     
     def download_file(self, s3_key: str, local_path: Optional[Union[str, Path]] = None) -> Path:
         """
         Download file from S3.
         
+        Goes through the local object cache when it is enabled. Without
+        ``local_path`` the cached file itself is returned, so callers must
+        treat it as read-only and pass it to release_download() when done.
+        
         Args:
             s3_key: S3 key of file to download
             local_path: Local path to save file (optional)
@@ -426,23 +1120,29 @@ class S3Client:
             Path to downloaded file
         """
         try:
+            download_cache = get_download_cache()
+            if download_cache is not None:
+                cached_path = download_cache.fetch(self, s3_key)
+                if local_path is None:
+                    return cached_path
+                try:
+                    local_path = Path(local_path)
+                    local_path.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(cached_path, local_path)
+                finally:
+                    download_cache.release(cached_path)
+                return local_path
+            
             if local_path is None:
-                # Generate temporary filename
-                filename = Path(s3_key).name
-                local_path = TEMP_PATH / filename
+                # Unique per bucket+key - keys sharing a basename don't collide
+                entry_id = S3DownloadCache.entry_id(self.bucket, s3_key)
+                local_path = TEMP_PATH / f"{entry_id[:16]}_{Path(s3_key).name}"
             
             local_path = Path(local_path)
             local_path.parent.mkdir(parents=True, exist_ok=True)
             
             logger.info(f"Downloading s3://{self.bucket}/{s3_key} to {local_path}")
-            
-            # Download with retry
-            self._retry_operation(
-                self.s3.download_file,
-                self.bucket,
-                s3_key,
-                str(local_path)
-            )
+            self.fetch_object(s3_key, local_path)
             
             if not local_path.exists():
                 raise RuntimeError(f"Download failed - file not created: {local_path}")
@@ -454,6 +1154,38 @@ class S3Client:
             logger.error(f"Failed to download {s3_key}: {e}")
             raise
     
+    def key_from_url(self, s3_url: str) -> str:
+        """
+        Extract the object key from an S3 URL.
+        
+        Args:
+            s3_url: Full S3 URL (s3://bucket/key or https://...)
+            
+        Returns:
+            S3 key in the configured bucket
+            
+        Raises:
+            ValueError: URL is not an S3 URL for this bucket
+        """
+        if s3_url.startswith('s3://'):
+            # s3://bucket/key format
+            s3_parts = s3_url[5:].split('/', 1)
+            if len(s3_parts) != 2:
+                raise ValueError(f"Invalid S3 URL format: {s3_url}")
+            bucket, s3_key = s3_parts
+            
+            if bucket != self.bucket:
+                logger.warning(f"URL bucket ({bucket}) differs from configured bucket ({self.bucket})")
+            return s3_key
+        
+        if 'amazonaws.com' in s3_url or (AWS_ENDPOINT_URL and AWS_ENDPOINT_URL in s3_url):
+            # HTTP(S) URL format
+            if f"/{self.bucket}/" in s3_url:
+                return s3_url.split(f"/{self.bucket}/", 1)[1]
+            raise ValueError(f"Cannot extract S3 key from URL: {s3_url}")
+        
+        raise ValueError(f"Unsupported URL format: {s3_url}")
+    
     def download_from_url(self, s3_url: str, local_path: Optional[Union[str, Path]] = None) -> Path:
         """
         Download file from S3 URL.
@@ -466,34 +1198,65 @@ class S3Client:
             Path to downloaded file
         """
         try:
-            # Parse S3 URL to extract bucket and key
-            if s3_url.startswith('s3://'):
-                # s3://bucket/key format
-                s3_parts = s3_url[5:].split('/', 1)
-                if len(s3_parts) != 2:
-                    raise ValueError(f"Invalid S3 URL format: {s3_url}")
-                bucket, s3_key = s3_parts
-                
-                if bucket != self.bucket:
-                    logger.warning(f"URL bucket ({bucket}) differs from configured bucket ({self.bucket})")
-            
-            elif 'amazonaws.com' in s3_url or AWS_ENDPOINT_URL in s3_url:
-                # HTTP(S) URL format
-                # Extract key from URL
-                if f"/{self.bucket}/" in s3_url:
-                    s3_key = s3_url.split(f"/{self.bucket}/", 1)[1]
-                else:
-                    raise ValueError(f"Cannot extract S3 key from URL: {s3_url}")
-            
-            else:
-                raise ValueError(f"Unsupported URL format: {s3_url}")
-            
-            return self.download_file(s3_key, local_path)
+            return self.download_file(self.key_from_url(s3_url), local_path)
             
         except Exception as e:
             logger.error(f"Failed to download from URL {s3_url}: {e}")
             raise
     
+    def head_size(self, s3_key: str) -> Optional[int]:
+        """
+        Get the size of an object.
+        
+        Args:
+            s3_key: S3 key of the object
+            
+        Returns:
+            Object size in bytes, or None if the object does not exist
+        """
+        try:
+            response = self._retry_operation(self.s3.head_object, Bucket=self.bucket, Key=s3_key)
+        except ClientError as e:
+            if _error_code(e) in ("NoSuchKey", "404", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"]
+    
+    def get_text(self, s3_key: str) -> Optional[str]:
+        """
+        Read a small UTF-8 text object.
+        
+        Args:
+            s3_key: S3 key of the object
+            
+        Returns:
+            Object text, or None if the object does not exist
+        """
+        try:
+            response = self._retry_operation(self._get_object, Bucket=self.bucket, Key=s3_key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ("NoSuchKey", "404", "NotFound"):
+                return None
+            raise
+        return response['Body'].read().decode('utf-8')
+    
+    def put_text(self, s3_key: str, text: str):
+        """
+        Write a small UTF-8 text object.
+        
+        Args:
+            s3_key: S3 key of the object
+            text: Object content
+        """
+        self._retry_operation(
+            self.s3.put_object,
+            Bucket=self.bucket,
+            Key=s3_key,
+            Body=text.encode('utf-8'),
+            ContentType='text/plain; charset=utf-8'
+        )
+        logger.info(f"Wrote s3://{self.bucket}/{s3_key}")
+    
     def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> str:
         """
         Generate presigned URL for S3 object.
@@ -520,31 +1283,397 @@ class S3Client:
             logger.error(f"Failed to generate presigned URL for {s3_key}: {e}")
             raise
 
-# Global S3 client instance
+class JobScope:
+    """One attempt of a job whose outputs are being uploaded."""
+    
+    def __init__(self, job_id: str):
+        """
+        Initialize job scope.
+        
+        Args:
+            job_id: RunPod job id (names the output keys)
+        """
+        self.job_id = job_id
+        self.retry: Optional[bool] = None  # Whether an earlier attempt uploaded outputs (checked once)
+        self.marker_path: Optional[Path] = None  # Set once the attempt uploads (see UploadDeduplicator)
+        self.lock = threading.Lock()
+
+# Job attempt whose outputs are being uploaded
+_current_job: ContextVar[Optional[JobScope]] = ContextVar("current_job", default=None)
+
+@contextmanager
+def job_scope(job: Union[str, JobScope, None]) -> Iterator[None]:
+    """
+    Name output keys of uploads in the enclosed block after a job.
+    
+    Args:
+        job: Job id, or a JobScope to share one attempt across several
+            blocks (e.g. the chunks of a streaming job). Without a job id,
+            each upload gets a random key prefix. A job id scopes the
+            whole job: it is finished (see finish_job) when the block
+            exits; a shared JobScope is finished by its owner.
+    """
+    owned = isinstance(job, str)
+    if owned:
+        job = JobScope(job)
+    token = _current_job.set(job)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+        if owned:
+            finish_job(job)
+
+def _output_prefix_id() -> str:
+    """Get the job id that names output keys, or a random one outside a job."""
+    job = _current_job.get()
+    return job.job_id if job is not None else uuid.uuid4().hex
+
+class UploadDeduplicator:
+    """
+    Content-hashed output keys with upload deduplication.
+    
+    Outputs are stored at ``{prefix}/{job_id}/{sha256[:16]}{ext}``, so
+    concurrent jobs never overwrite each other. Before a PUT the content
+    hash is looked up in an index on the volume (hash -> key, shared by
+    workers); only an index hit is confirmed with a HEAD, so unique
+    outputs cost no extra round trip. Content that already exists is not
+    uploaded again, and the existing URL is returned.
+    
+    A retried job (one whose earlier attempt left a marker in the index)
+    also checks its own key, which covers an attempt that uploaded but
+    died before recording the upload. Markers are removed when a job
+    finishes; those of attempts that died are removed after ``marker_ttl``.
+    The index keeps at most ``max_entries`` records, least recently used
+    first out.
+    """
+    
+    def __init__(
+        self,
+        index_dir: Path = S3_UPLOAD_INDEX_PATH,
+        max_entries: int = S3_UPLOAD_INDEX_MAX_ENTRIES,
+        marker_ttl: int = S3_UPLOAD_JOB_MARKER_TTL
+    ):
+        """
+        Initialize upload deduplicator.
+        
+        Args:
+            index_dir: Directory holding the content hash index
+            max_entries: Index records kept before eviction
+            marker_ttl: Seconds before a marker of an unfinished job is removed
+        """
+        self.index_dir = Path(index_dir)
+        self.max_entries = max_entries
+        self.marker_ttl = marker_ttl
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, Optional[str]]" = OrderedDict()  # bucket/digest -> key (None until read)
+        self._loaded = False
+        
+        # Counters
+        self.uploads = 0
+        self.deduplicated = 0
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self.expired_markers = 0
+    
+    def _load_index(self):
+        """
+        Build the LRU index from records on disk and drop stale job markers.
+        
+        Runs once per process (caller holds the lock).
+        """
+        if self._loaded:
+            return
+        
+        entries = []
+        expired_before = time.time() - self.marker_ttl
+        for bucket_dir in self.index_dir.glob("*"):
+            for record_path in bucket_dir.glob("*/*.json"):
+                try:
+                    entries.append((record_path.stat().st_mtime, f"{bucket_dir.name}/{record_path.stem}"))
+                except FileNotFoundError:
+                    continue
+            for marker_path in bucket_dir.glob("jobs/*"):
+                try:
+                    if marker_path.stat().st_mtime < expired_before:
+                        marker_path.unlink()
+                        self.expired_markers += 1
+                except OSError:
+                    continue
+        
+        for _, entry in sorted(entries):
+            self._index[entry] = None
+        
+        self._loaded = True
+        logger.info(f"Upload index loaded: {len(self._index)} records")
+        self._evict()
+    
+    def _evict(self):
+        """Remove least recently used index records over budget (caller holds the lock)."""
+        while len(self._index) > self.max_entries:
+            entry, _ = self._index.popitem(last=False)
+            bucket, digest = entry.split("/", 1)
+            try:
+                self._index_path(bucket, digest).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Failed to evict upload index record {digest[:16]}: {e}")
+            self.evictions += 1
+    
+    def _is_retry(self, bucket: str, job: Optional[JobScope]) -> bool:
+        """
+        Check whether an earlier attempt of the job uploaded outputs.
+        
+        The first upload of an attempt leaves a marker, so only a later
+        attempt of the same job id finds one.
+        """
+        if job is None:
+            return False
+        with job.lock:
+            if job.retry is None:
+                marker_path = self.index_dir / bucket / "jobs" / job.job_id
+                job.retry = marker_path.exists()
+                job.marker_path = marker_path
+                if not job.retry:
+                    try:
+                        marker_path.parent.mkdir(parents=True, exist_ok=True)
+                        marker_path.touch()
+                    except OSError as e:
+                        logger.warning(f"Failed to mark job uploads: {e}")
+            return job.retry
+    
+    def finish_job(self, job: JobScope):
+        """Remove the job's marker - a finished job is not retried."""
+        with job.lock:
+            marker_path, job.marker_path = job.marker_path, None
+        if marker_path is None:
+            return
+        try:
+            marker_path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to remove job upload marker: {e}")
+    
+    def _index_path(self, bucket: str, digest: str) -> Path:
+        """Get the index record of a content hash (sharded to keep directories small)."""
+        return self.index_dir / bucket / digest[:2] / f"{digest}.json"
+    
+    def _lookup(self, bucket: str, digest: str) -> Optional[str]:
+        """Find the key an identical object was uploaded to."""
+        entry = f"{bucket}/{digest}"
+        with self._lock:
+            self._load_index()
+            s3_key = self._index.get(entry)
+        if s3_key is not None:
+            return s3_key
+        try:
+            s3_key = json.loads(self._index_path(bucket, digest).read_text())["key"]
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            # Also covers records written by other workers on the same volume
+            self._index[entry] = s3_key
+            self._index.move_to_end(entry)
+            self._evict()
+        return s3_key
+    
+    def _remember(self, bucket: str, digest: str, s3_key: str, size: int):
+        """Record an uploaded object in memory and on the volume (refreshes its LRU position)."""
+        entry = f"{bucket}/{digest}"
+        index_path = self._index_path(bucket, digest)
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps({"key": s3_key, "size": size, "uploaded_at": time.time()}))
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.warning(f"Failed to record upload in index: {e}")
+        with self._lock:
+            self._load_index()
+            self._index[entry] = s3_key
+            self._index.move_to_end(entry)
+            self._evict()
+    
+    def upload(
+        self,
+        client: "S3Client",
+        data: Union[bytes, Path],
+        prefix: str,
+        suffix: str,
+        content_type: Optional[str] = None
+    ) -> str:
+        """
+        Upload content under a job- and content-derived key, unless it exists.
+        
+        Args:
+            client: S3 client to upload with
+            data: Content bytes, or a local file
+            prefix: Key prefix (e.g. "output")
+            suffix: File extension including the dot
+            content_type: Content-Type of the object (optional)
+            
+        Returns:
+            S3 URL of the new or existing object
+        """
+        if isinstance(data, Path):
+            digest = hash_file(data)
+            size = data.stat().st_size
+        else:
+            digest = hashlib.sha256(data).hexdigest()
+            size = len(data)
+        
+        # An identical object from any job, or from an earlier attempt of this one
+        job = _current_job.get()
+        s3_key = f"{prefix}/{_output_prefix_id()}/{digest[:16]}{suffix}"
+        candidates = [self._lookup(client.bucket, digest)]
+        if self._is_retry(client.bucket, job):
+            candidates.append(s3_key)
+        for candidate in dict.fromkeys(key for key in candidates if key):
+            if client.head_size(candidate) == size:
+                with self._lock:
+                    self.deduplicated += 1
+                    self.bytes_saved += size
+                self._remember(client.bucket, digest, candidate, size)
+                logger.info(f"Skipped upload of {size} bytes - identical object at {candidate}")
+                return client.object_url(candidate)
+        
+        if isinstance(data, Path):
+            url = client.upload_file(data, s3_key)
+        else:
+            url = client.upload_bytes(data, s3_key, content_type=content_type)
+        
+        self._remember(client.bucket, digest, s3_key, size)
+        with self._lock:
+            self.uploads += 1
+            self.bytes_uploaded += size
+        return url
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get upload and deduplication counters and index size."""
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "bytes_uploaded": self.bytes_uploaded,
+                "bytes_saved": self.bytes_saved,
+                "index_entries": len(self._index),
+                "evictions": self.evictions,
+                "expired_markers": self.expired_markers
+            }
+
+# Global S3 client instance (boto3 clients are thread-safe once created)
 _s3_client = None
+_s3_client_lock = threading.Lock()
 
 def get_s3_client() -> S3Client:
-    """Get global S3 client instance."""
+    """Get global S3 client instance (safe to call from concurrent jobs)."""
     global _s3_client
     if _s3_client is None:
-        _s3_client = S3Client()
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = S3Client()
     return _s3_client
 
+_prewarm_info: Optional[Dict[str, Any]] = None
+
+def start_prewarm(connections: int = S3_PREWARM_CONNECTIONS):
+    """Create the shared client and pre-warm its connections in the background."""
+    if connections <= 0:
+        return
+    
+    def prewarm():
+        global _prewarm_info
+        try:
+            _prewarm_info = get_s3_client().prewarm(connections)
+        except Exception as e:
+            logger.warning(f"S3 pre-warm skipped: {e}")
+            _prewarm_info = {"error": str(e)}
+    
+    threading.Thread(target=prewarm, name="s3-prewarm", daemon=True).start()
+
+def get_prewarm_info() -> Optional[Dict[str, Any]]:
+    """Get the result of the boot-time pre-warm, or None if it has not finished."""
+    return _prewarm_info
+
+# Global upload deduplicator instance
+_upload_deduplicator = None
+_upload_deduplicator_lock = threading.Lock()
+
+def get_upload_deduplicator() -> Optional[UploadDeduplicator]:
+    """Get global upload deduplicator instance, or None if deduplication is disabled."""
+    global _upload_deduplicator
+    if not S3_UPLOAD_DEDUP:
+        return None
+    if _upload_deduplicator is None:
+        with _upload_deduplicator_lock:
+            if _upload_deduplicator is None:
+                _upload_deduplicator = UploadDeduplicator()
+    return _upload_deduplicator
+
+def finish_job(job: Optional[JobScope]):
+    """Drop the upload marker of a job whose attempt has finished."""
+    deduplicator = get_upload_deduplicator()
+    if deduplicator is not None and job is not None:
+        deduplicator.finish_job(job)
+
+def get_transfer_stats() -> Optional[Dict[str, Any]]:
+    """Get download counters of the shared client, or None if it was never created."""
+    return _s3_client.get_transfer_stats() if _s3_client is not None else None
+
+# Global download cache instance
+_download_cache = None
+_download_cache_lock = threading.Lock()
+
+def get_download_cache() -> Optional[S3DownloadCache]:
+    """Get global S3 download cache instance, or None if caching is disabled."""
+    global _download_cache
+    if not S3_CACHE_ENABLED:
+        return None
+    if _download_cache is None:
+        with _download_cache_lock:
+            if _download_cache is None:
+                _download_cache = S3DownloadCache()
+    return _download_cache
+
 # Convenience functions
 def upload_audio_to_s3(local_path: Union[str, Path], prefix: str = "audio") -> str:
-    """Upload audio file to S3 with timestamp prefix."""
+    """Upload a file to S3 under a job- and content-derived key (deduplicated)."""
     local_path = Path(local_path)
-    timestamp = int(time.time())
-    s3_key = f"{prefix}/{timestamp}_{local_path.name}"
-    
     client = get_s3_client()
+    
+    deduplicator = get_upload_deduplicator()
+    if deduplicator is not None:
+        return deduplicator.upload(client, local_path, prefix, local_path.suffix)
+    
+    s3_key = f"{prefix}/{_output_prefix_id()}/{local_path.name}"
     return client.upload_file(local_path, s3_key)
 
+def upload_audio_bytes_to_s3(data: bytes, filename: str, prefix: str = "audio") -> str:
+    """
+    Upload in-memory WAV audio to S3 (no temp file, deduplicated).
+    
+    ``filename`` only supplies the extension when deduplication is on;
+    the key is derived from the job id and the content hash.
+    """
+    client = get_s3_client()
+    
+    deduplicator = get_upload_deduplicator()
+    if deduplicator is not None:
+        return deduplicator.upload(client, data, prefix, Path(filename).suffix, content_type="audio/wav")
+    
+    s3_key = f"{prefix}/{_output_prefix_id()}/{filename}"
+    return client.upload_bytes(data, s3_key, content_type="audio/wav")
+
 def download_audio_from_s3(s3_url: str) -> Path:
     """Download audio file from S3 URL."""
     client = get_s3_client()
     return client.download_from_url(s3_url)
 
+def release_download(local_path: Union[str, Path]):
+    """Release a file returned by download_audio_from_s3 (lets the cache evict it again)."""
+    download_cache = get_download_cache()
+    if download_cache is not None:
+        download_cache.release(local_path)
+
 def upload_subtitles_to_s3(local_path: Union[str, Path]) -> str:
     """Upload subtitle file to S3."""
     return upload_audio_to_s3(local_path, "subtitles")
@@ -562,4 +1691,4 @@ if __name__ == "__main__":
         
     except Exception as e:
         logger.error(f"S3 client test failed: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
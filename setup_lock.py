@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Cross-Worker Setup Lock for F5-TTS RunPod Serverless
+
+Lease-based file lock on the shared network volume. Exactly one worker
+installs the environment while the others wait on a shared progress file.
+The lease holder refreshes a heartbeat; a lease whose heartbeat is older
+than the TTL is considered abandoned and taken over.
+"""
+
+import os
+import sys
+import json
+import uuid
+import socket
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Add container app directory to path
+sys.path.append('/app')
+
+try:
+    from setup_network_venv import (  # config.py
+        NETWORK_VOLUME_PATH, SETUP_COMPLETE_FLAG, SETUP_LEASE_TTL,
+        SETUP_HEARTBEAT_INTERVAL, SETUP_WAIT_TIMEOUT
+    )
+except ImportError:
+    NETWORK_VOLUME_PATH = Path("/runpod-volume/f5tts")
+    SETUP_COMPLETE_FLAG = NETWORK_VOLUME_PATH / "setup_complete.flag"
+    SETUP_LEASE_TTL = int(os.getenv("SETUP_LEASE_TTL", "120"))
+    SETUP_HEARTBEAT_INTERVAL = int(os.getenv("SETUP_HEARTBEAT_INTERVAL", "15"))
+    SETUP_WAIT_TIMEOUT = int(os.getenv("SETUP_WAIT_TIMEOUT", "3600"))
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class SetupLease:
+    """
+    Exclusive, heartbeated lease file on the network volume.
+
+    Acquisition is an ``O_CREAT | O_EXCL`` create. Takeover of a stale
+    lease renames it aside first, so only one of several competing
+    workers can win it.
+    """
+
+    def __init__(
+        self,
+        lease_path: Path = NETWORK_VOLUME_PATH / "setup.lease",
+        progress_path: Path = NETWORK_VOLUME_PATH / "setup_progress.json",
+        ttl: int = SETUP_LEASE_TTL,
+        heartbeat_interval: int = SETUP_HEARTBEAT_INTERVAL
+    ):
+        """
+        Initialize setup lease.
+
+        Args:
+            lease_path: Lease file shared by all workers
+            progress_path: Progress file written by the lease holder
+            ttl: Seconds without a heartbeat before the lease is stale
+            heartbeat_interval: Seconds between heartbeats
+        """
+        self.lease_path = Path(lease_path)
+        self.progress_path = Path(progress_path)
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{os.getenv('RUNPOD_POD_ID', socket.gethostname())}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lost = False
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def _read_lease(self) -> Optional[Dict[str, Any]]:
+        """Read the current lease, or None if there is none."""
+        try:
+            return json.loads(self.lease_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _is_stale(self) -> bool:
+        """Check whether the current lease has missed its heartbeats."""
+        try:
+            return time.time() - self.lease_path.stat().st_mtime > self.ttl
+        except FileNotFoundError:
+            return False
+
+    def try_acquire(self) -> bool:
+        """
+        Try to take the lease without blocking.
+
+        Returns:
+            True if this worker now holds the lease
+        """
+        self.lease_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self._is_stale():
+            holder = self._read_lease() or {}
+            stale_path = self.lease_path.with_name(f"{self.lease_path.name}.stale.{self.owner.replace(':', '-')}")
+            try:
+                os.rename(self.lease_path, stale_path)
+                if time.time() - stale_path.stat().st_mtime <= self.ttl:
+                    # Lost the race - this is a fresh lease another worker just took over
+                    try:
+                        os.link(stale_path, self.lease_path)
+                    except FileExistsError:
+                        pass
+                    stale_path.unlink(missing_ok=True)
+                    return False
+                stale_path.unlink(missing_ok=True)
+                logger.warning(f"Took over stale setup lease from {holder.get('owner', 'unknown')}")
+            except FileNotFoundError:
+                pass  # Another worker moved it first
+
+        try:
+            fd = os.open(self.lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, "w") as f:
+            json.dump({"owner": self.owner, "acquired_at": time.time()}, f)
+
+        self.lost = False
+        self._start_heartbeat()
+        logger.info(f"Acquired setup lease as {self.owner}")
+        return True
+
+    def _start_heartbeat(self):
+        """Refresh the lease mtime until released."""
+        self._heartbeat_stop.clear()
+
+        def heartbeat_loop():
+            while not self._heartbeat_stop.wait(self.heartbeat_interval):
+                lease = self._read_lease()
+                if lease is None or lease.get("owner") != self.owner:
+                    self.lost = True
+                    logger.error("Setup lease lost to another worker")
+                    return
+                try:
+                    os.utime(self.lease_path)
+                except OSError as e:
+                    logger.warning(f"Failed to heartbeat setup lease: {e}")
+
+        self._heartbeat_thread = threading.Thread(target=heartbeat_loop, name="setup-lease-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def release(self):
+        """Stop heartbeating and remove the lease if this worker still holds it."""
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=5)
+            self._heartbeat_thread = None
+
+        lease = self._read_lease()
+        if lease is not None and lease.get("owner") == self.owner:
+            self.lease_path.unlink(missing_ok=True)
+            logger.info("Released setup lease")
+
+    def write_progress(self, status: str, message: str = ""):
+        """Publish setup progress for waiting workers."""
+        progress = {
+            "owner": self.owner,
+            "status": status,
+            "message": message,
+            "updated_at": time.time()
+        }
+        try:
+            tmp_path = self.progress_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(progress))
+            os.replace(tmp_path, self.progress_path)
+        except OSError as e:
+            logger.warning(f"Failed to write setup progress: {e}")
+
+    def read_progress(self) -> Optional[Dict[str, Any]]:
+        """Read the latest progress published by the lease holder."""
+        try:
+            return json.loads(self.progress_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+def run_exclusive(fn: Callable[[], Any], wait_timeout: int = SETUP_WAIT_TIMEOUT, poll_interval: float = 1.0) -> Any:
+    """
+    Run ``fn`` while holding the setup lease, waiting for any current holder.
+
+    Used for short maintenance (e.g. venv repair) after setup is complete;
+    ``fn`` should re-check whether its work is still needed.
+    """
+    lease = SetupLease()
+    start_time = time.time()
+    while not lease.try_acquire():
+        if time.time() - start_time > wait_timeout:
+            raise TimeoutError(f"Timed out after {wait_timeout}s waiting for the setup lease")
+        time.sleep(poll_interval)
+
+    try:
+        return fn()
+    finally:
+        lease.release()
+
+def run_exclusive_setup(
+    setup_fn: Callable[[Callable[[str], None]], None],
+    complete_flag: Path = SETUP_COMPLETE_FLAG,
+    wait_timeout: int = SETUP_WAIT_TIMEOUT,
+    poll_interval: float = 5.0
+) -> Dict[str, Any]:
+    """
+    Run environment setup on exactly one worker of the volume.
+
+    The lease holder runs ``setup_fn`` and touches ``complete_flag``; other
+    workers wait for the flag, and take over if the holder fails or dies.
+
+    Args:
+        setup_fn: Setup function, called with a progress callback
+        complete_flag: Flag file marking a finished setup
+        wait_timeout: Max seconds to wait for another worker
+        poll_interval: Seconds between checks while waiting
+
+    Returns:
+        Role ("installer", "waiter" or "none"), wait time and setup time
+    """
+    lease = SetupLease()
+    start_time = time.time()
+    last_message = None
+
+    while True:
+        if complete_flag.exists():
+            wait_time = round(time.time() - start_time, 3)
+            if wait_time > 0.5:
+                logger.info(f"Environment set up by another worker after {wait_time:.1f}s wait")
+                return {"role": "waiter", "wait_time": wait_time}
+            return {"role": "none", "wait_time": wait_time}
+
+        if lease.try_acquire():
+            wait_time = round(time.time() - start_time, 3)
+            try:
+                # Re-check under the lease - the previous holder may have finished
+                if complete_flag.exists():
+                    return {"role": "waiter", "wait_time": wait_time}
+
+                setup_start = time.time()
+                lease.write_progress("running", "Starting environment setup")
+                setup_fn(lambda message: lease.write_progress("running", message))
+                if lease.lost:
+                    raise RuntimeError("Setup lease was lost during setup")
+
+                complete_flag.touch()
+                lease.write_progress("complete", "Environment setup completed")
+                return {
+                    "role": "installer",
+                    "wait_time": wait_time,
+                    "setup_time": round(time.time() - setup_start, 3)
+                }
+            except Exception as e:
+                lease.write_progress("failed", str(e))
+                raise
+            finally:
+                lease.release()
+
+        progress = lease.read_progress()
+        if progress is not None and progress.get("message") != last_message:
+            last_message = progress.get("message")
+            logger.info(f"Waiting for setup by {progress.get('owner')}: {last_message}")
+
+        if time.time() - start_time > wait_timeout:
+            raise TimeoutError(f"Timed out after {wait_timeout}s waiting for environment setup by another worker")
+
+        time.sleep(poll_interval)
@@ -42,81 +42,86 @@ DEFAULT_BATCH_SIZE = 16
 DEFAULT_COMPUTE_TYPE = "float16"
 WHISPERX_MODEL = "large-v2"
 
-# Timeouts and Retries
-SETUP_TIMEOUT = 1800  # 30 minutes for first-time setup
-MODEL_LOAD_TIMEOUT = 600  # 10 minutes for model loading
-S3_RETRY_COUNT = 3
-S3_RETRY_DELAY = 2
-
-# Logging Configuration
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-
-# Runtime Requirements (installed on network volume)
-RUNTIME_REQUIREMENTS = [
-    f"{PYTORCH_VERSION} --index-url {PYTORCH_INDEX_URL}",
-    f"{FLASH_ATTN_WHEEL}",
-    "whisperx",
-    "git+https://github.com/SWivid/F5-TTS.git",
-    "python-ass>=0.5.0",
-    "librosa>=0.10.0",
-    "soundfile>=0.12.0",
-    "torchaudio>=2.6.0",
-    "transformers>=4.40.0",
-    "accelerate>=0.30.0",
-    "datasets>=2.20.0",
-    "nltk>=3.8.1",
-    "pyannote-audio>=3.1.0",
-    "faster-whisper>=1.0.0"
-]
-Configuration constants for F5-TTS RunPod Serverless
-
-Defines paths, URLs, and constants for the 2-layer architecture.
-"""
-
-import os
-from pathlib import Path
-
-# Network Volume Configuration
-NETWORK_VOLUME_PATH = Path("/runpod-volume/f5tts")
-VENV_PATH = NETWORK_VOLUME_PATH / "venv"
-MODELS_PATH = NETWORK_VOLUME_PATH / "models"
-TEMP_PATH = NETWORK_VOLUME_PATH / "temp"
-LOGS_PATH = NETWORK_VOLUME_PATH / "logs"
-CACHE_PATH = NETWORK_VOLUME_PATH / "cache"
-SETUP_COMPLETE_FLAG = NETWORK_VOLUME_PATH / "setup_complete.flag"
-
-# Model Paths
-F5TTS_MODELS_PATH = MODELS_PATH / "f5-tts"
-WHISPERX_MODELS_PATH = MODELS_PATH / "whisperx"
-
-# PyTorch Installation
-PYTORCH_INDEX_URL = "https://download.pytorch.org/whl/cu126"
-PYTORCH_VERSION = "torch==2.6.0 torchvision==0.21.0 torchaudio==2.6.0"
-
-# Flash Attention Wheel for Python 3.10 + CUDA 12.6 + PyTorch 2.6
-FLASH_ATTN_WHEEL = (
-    "https://github.com/Dao-AILab/flash-attention/releases/download/"
-    "v2.8.0.post2/flash_attn-2.8.0.post2+cu12torch2.6cxx11abiFALSE-cp310-cp310-linux_x86_64.whl"
-)
-
-# S3 Configuration
-S3_BUCKET = os.getenv("S3_BUCKET")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
-
-# Performance Settings
-DEFAULT_BATCH_SIZE = 16
-DEFAULT_COMPUTE_TYPE = "float16"
-WHISPERX_MODEL = "large-v2"
+# F5-TTS micro-batching across concurrent jobs
+F5TTS_BATCH_WINDOW_MS = int(os.getenv("F5TTS_BATCH_WINDOW_MS", "30"))
+F5TTS_MAX_BATCH_SIZE = int(os.getenv("F5TTS_MAX_BATCH_SIZE", "8"))
+F5TTS_BATCH_LENGTH_TOLERANCE = float(os.getenv("F5TTS_BATCH_LENGTH_TOLERANCE", "0.25"))
+
+# Long-text chunking (F5-TTS degrades past ~30s of reference + generated audio)
+F5TTS_MAX_CHUNK_SECONDS = float(os.getenv("F5TTS_MAX_CHUNK_SECONDS", "30"))
+F5TTS_CROSSFADE_MS = int(os.getenv("F5TTS_CROSSFADE_MS", "50"))
+F5TTS_DEFAULT_CHARS_PER_SECOND = float(os.getenv("F5TTS_DEFAULT_CHARS_PER_SECOND", "15"))
+
+# Content-addressed result cache (repeated requests skip inference)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Preprocessed reference voice cache (tier 1: device tensors, tier 2: float16 .npy on CACHE_PATH)
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REFERENCE_CACHE_DISK_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Reference transcripts (ASR is not retried for a voice this long after it failed)
+REFERENCE_TRANSCRIPT_RETRY_AFTER = float(os.getenv("REFERENCE_TRANSCRIPT_RETRY_AFTER", "300"))
+
+# Local S3 object cache (downloads revalidated by ETag after the TTL)
+S3_CACHE_ENABLED = os.getenv("S3_CACHE_ENABLED", "true").lower() == "true"
+S3_CACHE_PATH = Path(os.getenv("S3_CACHE_PATH", str(CACHE_PATH / "s3")))
+S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+S3_CACHE_TTL = int(os.getenv("S3_CACHE_TTL", "300"))
+
+# Content-hashed output keys; identical outputs are uploaded once
+S3_UPLOAD_DEDUP = os.getenv("S3_UPLOAD_DEDUP", "true").lower() == "true"
+S3_UPLOAD_INDEX_PATH = Path(os.getenv("S3_UPLOAD_INDEX_PATH", str(CACHE_PATH / "upload-index")))
+S3_UPLOAD_INDEX_MAX_ENTRIES = int(os.getenv("S3_UPLOAD_INDEX_MAX_ENTRIES", "100000"))
+S3_UPLOAD_JOB_MARKER_TTL = int(os.getenv("S3_UPLOAD_JOB_MARKER_TTL", "86400"))
+
+# S3 transfer tuning (multipart part size and parallel parts per transfer)
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "10"))
+
+# Parallel ranged downloads (objects above the threshold are fetched as concurrent byte ranges)
+S3_RANGE_THRESHOLD = int(os.getenv("S3_RANGE_THRESHOLD", str(16 * 1024 * 1024)))
+S3_RANGE_PART_SIZE = int(os.getenv("S3_RANGE_PART_SIZE", str(8 * 1024 * 1024)))
+S3_RANGE_WORKERS = int(os.getenv("S3_RANGE_WORKERS", "8"))
+S3_VERIFY_DOWNLOADS = os.getenv("S3_VERIFY_DOWNLOADS", "true").lower() == "true"
+
+# S3 connection pool (one shared client; connections opened during boot)
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+S3_TCP_KEEPALIVE = os.getenv("S3_TCP_KEEPALIVE", "true").lower() == "true"
+S3_PREWARM_CONNECTIONS = int(os.getenv("S3_PREWARM_CONNECTIONS", "4"))
+
+# Latency metrics (Prometheus text written to LOGS_PATH)
+METRICS_EXPORT_INTERVAL = int(os.getenv("METRICS_EXPORT_INTERVAL", "30"))
+METRICS_WINDOW_SIZE = int(os.getenv("METRICS_WINDOW_SIZE", "1024"))
+
+# Prebuilt venv snapshots (restored on cold start instead of a live pip install)
+VENV_SNAPSHOT_ENABLED = os.getenv("VENV_SNAPSHOT_ENABLED", "true").lower() == "true"
+VENV_SNAPSHOT_PATH = Path(os.getenv("VENV_SNAPSHOT_PATH", str(CACHE_PATH / "venv-snapshots")))
+VENV_SNAPSHOT_WORKERS = int(os.getenv("VENV_SNAPSHOT_WORKERS", "8"))
+
+# Persistent wheelhouse (resolve once, download in parallel, install offline)
+WHEELHOUSE_PATH = Path(os.getenv("WHEELHOUSE_PATH", str(CACHE_PATH / "wheelhouse")))
+WHEEL_DOWNLOAD_WORKERS = int(os.getenv("WHEEL_DOWNLOAD_WORKERS", "8"))
+
+# Venv integrity manifest (checked on every boot)
+VENV_MANIFEST_HASHES = os.getenv("VENV_MANIFEST_HASHES", "false").lower() == "true"
 
 # Timeouts and Retries
 SETUP_TIMEOUT = 1800  # 30 minutes for first-time setup
+SETUP_LEASE_TTL = int(os.getenv("SETUP_LEASE_TTL", "120"))  # Lease is stale after this long without a heartbeat
+SETUP_HEARTBEAT_INTERVAL = int(os.getenv("SETUP_HEARTBEAT_INTERVAL", "15"))
+SETUP_WAIT_TIMEOUT = int(os.getenv("SETUP_WAIT_TIMEOUT", "3600"))  # Max wait for another worker's setup
 MODEL_LOAD_TIMEOUT = 600  # 10 minutes for model loading
-S3_RETRY_COUNT = 3
-S3_RETRY_DELAY = 2
+S3_RETRY_COUNT = int(os.getenv("S3_RETRY_COUNT", "4"))  # Attempts per S3 call, including the first
+S3_RETRY_BASE_DELAY = float(os.getenv("S3_RETRY_BASE_DELAY", "0.05"))  # Full-jitter backoff base
+S3_RETRY_MAX_DELAY = float(os.getenv("S3_RETRY_MAX_DELAY", "2"))  # Backoff cap per retry
+S3_RETRY_BUDGET = float(os.getenv("S3_RETRY_BUDGET", "20"))  # No retry starts after this many seconds
+S3_HEDGE_READS = os.getenv("S3_HEDGE_READS", "false").lower() == "true"  # Hedge slow GETs with a second request
+S3_HEDGE_QUANTILE = float(os.getenv("S3_HEDGE_QUANTILE", "0.95"))  # GET latency quantile that triggers the hedge
+S3_HEDGE_MIN_SAMPLES = int(os.getenv("S3_HEDGE_MIN_SAMPLES", "50"))  # GET latencies needed before hedging
 
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -138,4 +143,4 @@ RUNTIME_REQUIREMENTS = [
     "nltk>=3.8.1",
     "pyannote-audio>=3.1.0",
     "faster-whisper>=1.0.0"
-]
\ No newline at end of file
+]
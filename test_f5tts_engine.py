@@ -0,0 +1,272 @@
+"""
+Tests for F5-TTS engine batching, chunking and stitching.
+
+Run with: python -m unittest test_f5tts_engine.py
+"""
+
+import importlib.util
+import sys
+import threading
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+def make_torch_stand_ins():
+    """
+    Minimal torch/torchaudio modules for importing the engine without the GPU stack.
+    
+    Only the names used in annotations at import time exist, so tests that
+    touch real tensors must still skip without torch.
+    """
+    fake_torch = types.ModuleType("torch")
+    fake_torch.Tensor = type("Tensor", (), {})
+    fake_torchaudio = types.ModuleType("torchaudio")
+    fake_torchaudio.transforms = types.SimpleNamespace(Resample=type("Resample", (), {}))
+    return {"torch": fake_torch, "torchaudio": fake_torchaudio}
+
+def load_engine_module():
+    """Load s3_utils-new.py under its container module name."""
+    stand_ins = make_torch_stand_ins() if torch is None else {}
+    sys.modules.update(stand_ins)
+    try:
+        spec = importlib.util.spec_from_file_location("f5tts_engine", Path(__file__).parent / "s3_utils-new.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["f5tts_engine"] = module
+        spec.loader.exec_module(module)
+    finally:
+        # Removed again so the stand-ins never leak into other imports
+        for name in stand_ins:
+            sys.modules.pop(name, None)
+    return module
+
+class FakeBatchEngine:
+    """Engine side of the batch scheduler: records every forward pass."""
+
+    def __init__(self, callers):
+        self.queue_depth = callers
+        self.batches = []
+
+    def infer_batch(self, requests):
+        self.batches.append([request.gen_text for request in requests])
+        return [f"audio:{request.gen_text}" for request in requests]
+
+if torch is not None:
+    class FakeModel:
+        """Stands in for the F5-TTS CFM model; returns float32 mels like a float32 ODE solve."""
+
+        def __init__(self):
+            self.sample_calls = 0
+
+        def sample(self, cond, text, duration, lens):
+            self.sample_calls += 1
+            return torch.zeros(cond.shape[0], int(duration.max()), 100), None
+
+        def infer(self, **kwargs):
+            raise AssertionError("model.infer must not be used - infer_batch is the only entry point")
+
+    class FakeVocoder(torch.nn.Module):
+        """Vocoder that, like Vocos, fails when the mel dtype differs from its weights."""
+
+        def __init__(self):
+            super().__init__()
+            self.proj = torch.nn.Linear(100, 4)
+
+        def decode(self, mel):
+            if mel.dtype != self.proj.weight.dtype:
+                raise RuntimeError(f"expected {self.proj.weight.dtype} mel, got {mel.dtype}")
+            return torch.zeros(mel.shape[0], mel.shape[-1] * 256, dtype=mel.dtype)
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestInferBatch(unittest.TestCase):
+    """Test the shared batched inference path."""
+
+    def setUp(self):
+        self.engine_module = load_engine_module()
+        engine = self.engine_module.F5TTSEngine.__new__(self.engine_module.F5TTSEngine)
+        engine.device = "cpu"
+        engine.model = FakeModel()
+        engine.vocoder = FakeVocoder()
+        engine._inference_lock = threading.Lock()
+        self.engine = engine
+
+    def make_request(self, gen_text):
+        ref_audio = torch.zeros(1, 24000)
+        return self.engine_module.SynthesisRequest(
+            ref_key="voice",
+            ref_audio=ref_audio,
+            ref_text="Reference audio",
+            gen_text=gen_text,
+            duration=self.engine.estimate_duration(ref_audio, "Reference audio", gen_text)
+        )
+
+    def test_half_precision_vocoder(self):
+        """Test that mels are cast to the float16 vocoder's dtype."""
+        self.engine.vocoder = self.engine.vocoder.half()
+        outputs = self.engine.infer_batch([self.make_request("Hello"), self.make_request("Hello world again")])
+        self.assertEqual(len(outputs), 2)
+        self.assertEqual(outputs[0].dtype, torch.float16)
+
+    def test_single_request_uses_batch_entry_point(self):
+        """Test that a batch of one goes through model.sample like larger batches."""
+        outputs = self.engine.infer_batch([self.make_request("Hello")])
+        self.assertEqual(len(outputs), 1)
+        self.assertEqual(self.engine.model.sample_calls, 1)
+
+    def test_concurrent_callers_share_one_sample_call(self):
+        """Test that concurrent jobs are vocoded from a single model.sample call."""
+        self.engine._pending_inferences = 3
+        self.engine.batch_scheduler = self.engine_module.BatchScheduler(self.engine, window_ms=2000, max_batch_size=8)
+
+        outputs = []
+        def caller(text):
+            outputs.extend(self.engine._run_requests([self.make_request(text)]))
+
+        threads = [threading.Thread(target=caller, args=(text,)) for text in ("One", "Two", "Three")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outputs), 3)
+        self.assertEqual(self.engine.model.sample_calls, 1)
+
+class TestBatchScheduler(unittest.TestCase):
+    """Test micro-batching across concurrent callers."""
+
+    def setUp(self):
+        self.engine_module = load_engine_module()
+
+    def make_request(self, gen_text, ref_key="voice", duration=100):
+        return self.engine_module.SynthesisRequest(
+            ref_key=ref_key,
+            ref_audio=None,
+            ref_text="Reference audio",
+            gen_text=gen_text,
+            duration=duration
+        )
+
+    def test_concurrent_callers_share_one_forward_pass(self):
+        """Test that concurrent jobs with one voice land in a single infer_batch call."""
+        engine = FakeBatchEngine(callers=4)
+        scheduler = self.engine_module.BatchScheduler(engine, window_ms=2000, max_batch_size=8)
+
+        results = {}
+        def caller(index):
+            results[index] = scheduler.submit(self.make_request(f"text {index}")).result(timeout=10)
+
+        threads = [threading.Thread(target=caller, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(engine.batches), 1)
+        self.assertEqual(sorted(engine.batches[0]), [f"text {index}" for index in range(4)])
+        self.assertEqual(results, {index: f"audio:text {index}" for index in range(4)})
+        self.assertEqual(scheduler.get_stats()["batch_size_histogram"], {4: 1})
+
+    def test_groups_by_voice_and_length(self):
+        """Test that batches never mix voices or very different lengths."""
+        scheduler = self.engine_module.BatchScheduler.__new__(self.engine_module.BatchScheduler)
+        scheduler.max_batch_size = 8
+        scheduler.length_tolerance = 0.25
+        groups = scheduler._group([
+            self.make_request("a", "voice1", 100),
+            self.make_request("b", "voice2", 100),
+            self.make_request("c", "voice1", 110),
+            self.make_request("d", "voice1", 300)
+        ])
+        self.assertEqual(sorted([r.gen_text for r in group] for group in groups), [["a", "c"], ["b"], ["d"]])
+
+    def test_failed_batch_fails_every_caller(self):
+        """Test that an inference error reaches all futures of the batch."""
+        engine = FakeBatchEngine(callers=1)
+        engine.infer_batch = mock.Mock(side_effect=RuntimeError("CUDA out of memory"))
+        scheduler = self.engine_module.BatchScheduler(engine, window_ms=0, max_batch_size=8)
+
+        futures = scheduler.submit_many([self.make_request("a"), self.make_request("b")])
+        for future in futures:
+            with self.assertRaisesRegex(RuntimeError, "CUDA out of memory"):
+                future.result(timeout=10)
+
+class TestChunking(unittest.TestCase):
+    """Test long-text chunk sizing, splitting and stitching."""
+
+    def setUp(self):
+        self.engine_module = load_engine_module()
+        self.engine = self.engine_module.F5TTSEngine.__new__(self.engine_module.F5TTSEngine)
+
+    def reference(self, seconds):
+        return np.zeros((1, int(seconds * self.engine_module.SAMPLE_RATE)), dtype=np.float32)
+
+    def test_max_chunk_chars_uses_reference_rate(self):
+        """Test that chunks are sized from the reference transcript's speaking rate."""
+        # 50 bytes over 5s = 10 chars/s, 25s left of the 30s budget
+        with mock.patch.object(self.engine_module, "F5TTS_MAX_CHUNK_SECONDS", 30.0):
+            self.assertEqual(self.engine.max_chunk_chars(self.reference(5), "x" * 50), 250)
+
+    def test_max_chunk_chars_ignores_placeholder_rate(self):
+        """Test that the placeholder transcript falls back to the default speaking rate."""
+        placeholder = self.engine_module.DEFAULT_REFERENCE_TEXT
+        with mock.patch.object(self.engine_module, "F5TTS_MAX_CHUNK_SECONDS", 30.0), \
+                mock.patch.object(self.engine_module, "F5TTS_DEFAULT_CHARS_PER_SECOND", 15.0):
+            # The placeholder over 20s of audio would give ~1.6 chars/s
+            self.assertEqual(self.engine.max_chunk_chars(self.reference(20), placeholder), 150)
+            self.assertEqual(self.engine.max_chunk_chars(self.reference(5), placeholder), 375)
+
+    def test_max_chunk_chars_floors(self):
+        """Test that long references still leave a minimum chunk size."""
+        with mock.patch.object(self.engine_module, "F5TTS_MAX_CHUNK_SECONDS", 30.0):
+            self.assertEqual(self.engine.max_chunk_chars(self.reference(40), "x" * 40), 32)
+
+    def test_chunk_text_packs_sentences(self):
+        """Test that sentences are packed up to the budget without splitting them."""
+        text = "First sentence here. Second one. Third sentence is here."
+        self.assertEqual(
+            self.engine_module.chunk_text(text, 35),
+            ["First sentence here. Second one.", "Third sentence is here."]
+        )
+
+    def test_chunk_text_splits_long_sentence(self):
+        """Test that an over-long sentence is split at clauses, then words, within the budget."""
+        text = "one two three four five, six seven eight nine ten eleven twelve"
+        chunks = self.engine_module.chunk_text(text, 20)
+        self.assertTrue(all(len(chunk.encode("utf-8")) <= 20 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).replace(",", "").split(), text.replace(",", "").split())
+
+    def test_chunk_text_counts_utf8_bytes(self):
+        """Test that the budget is in UTF-8 bytes, not characters."""
+        chunks = self.engine_module.chunk_text("\u00e9t\u00e9 \u00e9t\u00e9 \u00e9t\u00e9", 13)
+        self.assertEqual(chunks, ["\u00e9t\u00e9 \u00e9t\u00e9", "\u00e9t\u00e9"])
+
+    def test_crossfade_concat(self):
+        """Test that neighbouring chunks overlap by the crossfade with gains summing to one."""
+        waves = [np.ones(100, dtype=np.float32), np.ones(100, dtype=np.float32)]
+        output = self.engine_module.crossfade_concat(waves, 20)
+        self.assertEqual(output.dtype, np.float32)
+        self.assertEqual(len(output), 180)
+        np.testing.assert_allclose(output, np.ones(180), atol=1e-6)
+
+    def test_crossfade_concat_limits_overlap(self):
+        """Test that the overlap never exceeds the shortest chunk."""
+        waves = [np.ones(100, dtype=np.float32), np.ones(10, dtype=np.float32), np.ones(100, dtype=np.float32)]
+        self.assertEqual(len(self.engine_module.crossfade_concat(waves, 50)), 190)
+
+    def test_crossfade_concat_single_chunk(self):
+        """Test that a single chunk is returned unchanged."""
+        wave = np.arange(10, dtype=np.float32)
+        np.testing.assert_array_equal(self.engine_module.crossfade_concat([wave], 20), wave)
+
+if __name__ == '__main__':
+    unittest.main()
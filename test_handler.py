@@ -0,0 +1,197 @@
+"""
+Tests for the RunPod handler's capability loading and async intake.
+
+Run with: python -m unittest test_handler.py
+"""
+
+import importlib.machinery
+import importlib.util
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from capabilities import CapabilityRegistry
+
+REPO_DIR = Path(__file__).parent
+
+def load_module(module_name, file_name):
+    """Load a repo file under its container module name."""
+    spec = importlib.util.spec_from_file_location(module_name, REPO_DIR / file_name)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def make_fake_torch():
+    """Minimal torch module: enough for the WhisperX engine to pick a device."""
+    fake_torch = types.ModuleType("torch")
+    fake_torch.cuda = types.SimpleNamespace(is_available=lambda: False)
+    return fake_torch
+
+def make_fake_whisperx():
+    """WhisperX module whose load_model records its calls."""
+    fake_whisperx = types.ModuleType("whisperx")
+    fake_whisperx.load_model_calls = []
+
+    def load_model(model_name, **kwargs):
+        fake_whisperx.load_model_calls.append(model_name)
+        return object()
+
+    fake_whisperx.load_model = load_model
+    return fake_whisperx
+
+class TestWordTimingsCapability(unittest.TestCase):
+    """Test that the word_timings capability loads against the real WhisperX engine."""
+
+    def setUp(self):
+        self.model_dir = tempfile.TemporaryDirectory()
+        self.fake_whisperx = make_fake_whisperx()
+        # Scoped so the fake torch never leaks into tests that need the real one
+        self.modules = mock.patch.dict(sys.modules, {"torch": make_fake_torch(), "whisperx": self.fake_whisperx})
+        self.modules.start()
+
+        # The engine lives in runpod-handler.py.broken-backup and is copied to /app/whisperx_engine.py
+        loader = importlib.machinery.SourceFileLoader("whisperx_engine", str(REPO_DIR / "runpod-handler.py.broken-backup"))
+        spec = importlib.util.spec_from_loader("whisperx_engine", loader)
+        whisperx_engine = importlib.util.module_from_spec(spec)
+        sys.modules["whisperx_engine"] = whisperx_engine
+        loader.exec_module(whisperx_engine)
+        whisperx_engine.WHISPERX_MODELS_PATH = Path(self.model_dir.name)
+        self.whisperx_engine = whisperx_engine
+
+        self.handler = load_module("handler", "runpod-handler.py")
+        self.registry = CapabilityRegistry()
+        self.handler.get_capability_registry = lambda: self.registry
+
+    def tearDown(self):
+        self.modules.stop()
+        self.model_dir.cleanup()
+
+    def test_require_loads_real_engine(self):
+        """Test that requiring word_timings loads the WhisperX transcription model."""
+        self.handler.register_capabilities()
+        engine, timings = self.registry.require("word_timings")
+
+        self.assertIsInstance(engine, self.whisperx_engine.WhisperXEngine)
+        self.assertIsNotNone(engine.transcription_model)
+        self.assertEqual(self.fake_whisperx.load_model_calls, [engine.model_name])
+        self.assertIn("model_load_time", timings)
+        self.assertEqual(self.registry.get_stats()["word_timings"]["state"], "ready")
+
+    def test_load_failure_is_reported(self):
+        """Test that a WhisperX load error surfaces from require() instead of hanging."""
+        def fail(model_name, **kwargs):
+            raise RuntimeError("CUDA out of memory")
+        self.fake_whisperx.load_model = fail
+
+        self.handler.register_capabilities()
+        with self.assertRaisesRegex(RuntimeError, "CUDA out of memory"):
+            self.registry.require("word_timings")
+        self.assertEqual(self.registry.get_stats()["word_timings"]["state"], "failed")
+
+class TestConcurrencyModifier(unittest.TestCase):
+    """Test async intake concurrency adjustments."""
+
+    def setUp(self):
+        self.handler = load_module("handler", "runpod-handler.py")
+        self.handler.MAX_CONCURRENCY = 4
+        self.handler.MIN_FREE_GPU_MEMORY_MB = 2048
+        self.handler.CONCURRENCY_COOLDOWN = 10
+        self.free_memory_mb = None
+        self.queue_depth = 0
+        self.capacity = 1
+        self.handler._get_free_gpu_memory_mb = lambda: self.free_memory_mb
+        self.handler._get_inference_queue_depth = lambda: self.queue_depth
+        self.handler._get_inference_capacity = lambda: self.capacity
+
+    def expire_cooldown(self):
+        self.handler._last_concurrency_change = float("-inf")
+
+    def test_low_memory_backs_off(self):
+        """Test that low free GPU memory shrinks intake, even during the cooldown."""
+        self.free_memory_mb = 1024
+        self.handler._inflight_jobs = 4
+        self.assertEqual(self.handler.concurrency_modifier(3), 2)
+        self.assertEqual(self.handler.concurrency_modifier(2), 1)
+        self.assertEqual(self.handler.concurrency_modifier(1), 1)
+
+    def test_queue_backlog_backs_off(self):
+        """Test that jobs waiting for the GPU shrink intake."""
+        self.expire_cooldown()
+        self.free_memory_mb = 8192
+        self.queue_depth = 3
+        self.handler._inflight_jobs = 3
+        self.assertEqual(self.handler.concurrency_modifier(3), 2)
+
+    def test_grows_when_slots_busy_and_gpu_idle(self):
+        """Test that intake grows while every slot is busy and nothing waits for the GPU."""
+        self.expire_cooldown()
+        self.handler._inflight_jobs = 2
+        self.assertEqual(self.handler.concurrency_modifier(2), 3)
+        self.handler._inflight_jobs = 4
+        self.assertEqual(self.handler.concurrency_modifier(4), 4)
+
+    def test_batching_keeps_intake_up_while_batches_form(self):
+        """Test that a queue the batch scheduler can absorb does not shrink intake."""
+        self.expire_cooldown()
+        self.capacity = 8
+        self.queue_depth = 3
+        self.handler._inflight_jobs = 3
+        self.assertEqual(self.handler.concurrency_modifier(3), 4)
+
+        self.expire_cooldown()
+        self.queue_depth = 9
+        self.assertEqual(self.handler.concurrency_modifier(4), 3)
+
+    def test_holds_between_thresholds(self):
+        """Test that a busy but not backlogged GPU neither grows nor shrinks intake."""
+        self.expire_cooldown()
+        self.queue_depth = 1
+        self.handler._inflight_jobs = 2
+        self.assertEqual(self.handler.concurrency_modifier(2), 2)
+
+    def test_cooldown_prevents_flapping(self):
+        """Test that steady load does not flip concurrency on consecutive polls."""
+        self.expire_cooldown()
+        self.handler._inflight_jobs = 2
+        self.assertEqual(self.handler.concurrency_modifier(2), 3)
+
+        # Next poll sees a backlog, but the change above is still cooling down
+        self.queue_depth = 4
+        self.handler._inflight_jobs = 3
+        self.assertEqual(self.handler.concurrency_modifier(3), 3)
+
+    def test_probe_failure_keeps_concurrency(self):
+        """Test that a failing GPU probe keeps the current concurrency."""
+        def fail():
+            raise RuntimeError("CUDA error")
+        self.handler._get_free_gpu_memory_mb = fail
+        self.assertEqual(self.handler.concurrency_modifier(3), 3)
+        self.assertEqual(self.handler.concurrency_modifier(9), 4)
+
+class TestValidateSynthesisOptions(unittest.TestCase):
+    """Test that options the engine cannot apply are rejected."""
+
+    def setUp(self):
+        self.handler = load_module("handler", "runpod-handler.py")
+
+    def test_defaults_pass(self):
+        """Test that requests without seed or speed, or with the default speed, are accepted."""
+        self.handler.validate_synthesis_options({})
+        self.handler.validate_synthesis_options({"speed": 1.0, "create_subtitles": True})
+
+    def test_seed_and_speed_are_rejected(self):
+        """Test that a seed or non-default speed fails instead of being ignored."""
+        with self.assertRaisesRegex(ValueError, "seed"):
+            self.handler.validate_synthesis_options({"seed": 42})
+        with self.assertRaisesRegex(ValueError, "speed"):
+            self.handler.validate_synthesis_options({"speed": 1.5})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Tests for the reference transcript store.
+
+Run with: python -m unittest test_reference_transcripts.py
+"""
+
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from reference_transcripts import ReferenceTranscriptStore, DEFAULT_REFERENCE_TEXT
+
+class FakeTranscriptStore(ReferenceTranscriptStore):
+    """Store whose ASR returns a fixed text (or raises) and counts its calls."""
+
+    def __init__(self, cache_dir, result="Hello from the reference voice.", **kwargs):
+        super().__init__(cache_dir, **kwargs)
+        self.result = result
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def _transcribe(self, audio_path):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+class TestReferenceTranscriptStore(unittest.TestCase):
+    """Test transcript resolution, negative caching and key locking."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = Path(self.temp_dir.name) / "voice.wav"
+        self.audio_path.write_bytes(b"RIFF-reference-audio")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_store(self, **kwargs):
+        return FakeTranscriptStore(Path(self.temp_dir.name) / "transcripts", **kwargs)
+
+    def drain(self, store):
+        if store._executor is not None:
+            store._executor.shutdown(wait=True)
+            store._executor = None
+
+    def test_asr_result_is_persisted(self):
+        """Test that a transcribed voice is served from memory, then from the volume."""
+        store = self.make_store()
+        self.assertEqual(store.get_transcript(self.audio_path), "Hello from the reference voice.")
+        self.assertEqual(store.get_transcript(self.audio_path), "Hello from the reference voice.")
+        self.assertEqual(store.calls, 1)
+        self.assertEqual(store.get_stats()["memory_hits"], 1)
+
+        restarted = self.make_store()
+        self.assertEqual(restarted.get_transcript(self.audio_path), "Hello from the reference voice.")
+        self.assertEqual(restarted.calls, 0)
+        self.assertEqual(restarted.get_stats()["local_hits"], 1)
+
+    def test_failure_is_negatively_cached(self):
+        """Test that a failed ASR returns the placeholder and is not retried within retry_after."""
+        store = self.make_store(result=RuntimeError("CUDA out of memory"), retry_after=300)
+        self.assertEqual(store.get_transcript(self.audio_path), DEFAULT_REFERENCE_TEXT)
+        self.assertEqual(store.get_transcript(self.audio_path), DEFAULT_REFERENCE_TEXT)
+        self.assertEqual(store.calls, 1)
+        self.assertEqual(store.get_stats()["failed_voices"], 1)
+
+        # The placeholder is never stored as the voice's transcript
+        self.assertEqual(store.get_stats()["voices"], 0)
+        self.assertFalse((Path(self.temp_dir.name) / "transcripts").exists())
+
+    def test_failure_is_retried_after_retry_after(self):
+        """Test that a voice is transcribed again once the failure has expired."""
+        store = self.make_store(result="", retry_after=0)
+        self.assertEqual(store.get_transcript(self.audio_path), DEFAULT_REFERENCE_TEXT)
+
+        store.result = "Second attempt."
+        self.assertEqual(store.get_transcript(self.audio_path), "Second attempt.")
+        self.assertEqual(store.calls, 2)
+        self.assertEqual(store.get_stats()["failed_voices"], 0)
+
+    def test_concurrent_first_requests_transcribe_once(self):
+        """Test that concurrent first requests for a voice share one ASR run."""
+        store = self.make_store()
+        store.release.clear()
+        results = []
+
+        def request():
+            results.append(store.get_transcript(self.audio_path))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(store.started.wait(5))
+        store.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, ["Hello from the reference voice."] * 4)
+        self.assertEqual(store.calls, 1)
+        self.assertEqual(store._key_locks, {})
+
+    def test_tts_only_request_does_not_wait_for_asr(self):
+        """Test that a request not waiting for ASR gets the placeholder and ASR runs in the background."""
+        store = self.make_store()
+        store.release.clear()
+
+        self.assertEqual(store.get_transcript(self.audio_path, wait_for_asr=False), DEFAULT_REFERENCE_TEXT)
+        self.assertTrue(store.started.wait(5))
+
+        # ASR still running: neither the pending voice nor its key lock blocks the next job
+        self.assertEqual(store.get_transcript(self.audio_path, wait_for_asr=False), DEFAULT_REFERENCE_TEXT)
+        self.assertEqual(store.get_stats()["deferred"], 2)
+
+        store.release.set()
+        self.drain(store)
+        self.assertEqual(store.get_transcript(self.audio_path, wait_for_asr=False), "Hello from the reference voice.")
+        self.assertEqual(store.calls, 1)
+        self.assertEqual(store.get_stats()["pending_asr"], 0)
+        self.assertEqual(list((Path(self.temp_dir.name) / "transcripts" / "pending").iterdir()), [])
+
+    def test_background_asr_survives_reference_removal(self):
+        """Test that background ASR works on its own copy of the reference."""
+        store = self.make_store()
+        store.release.clear()
+        store.get_transcript(self.audio_path, wait_for_asr=False)
+
+        # The download cache may evict the reference as soon as the job ends
+        self.audio_path.unlink()
+        store.release.set()
+        self.drain(store)
+        self.assertEqual(store.get_stats()["voices"], 1)
+        self.assertEqual(store.get_stats()["fallbacks"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
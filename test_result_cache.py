@@ -0,0 +1,121 @@
+"""
+Tests for the content-addressed result cache.
+
+Run with: python -m unittest test_result_cache.py
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from result_cache import ResultCache, content_hash, hash_file
+
+class TestResultCache(unittest.TestCase):
+    """Test keys, lookups, per-request fields and eviction."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.temp_dir.name) / "results"
+        self.reference_path = Path(self.temp_dir.name) / "voice.wav"
+        self.reference_path.write_bytes(b"RIFF-reference-audio")
+        self.cache = ResultCache(self.cache_dir, max_bytes=64 * 1024)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_key(self, text="Hello world", **extra):
+        return self.cache.make_key(
+            text=text,
+            reference_audio_path=self.reference_path,
+            model_name="F5TTS_v1_Base",
+            compute_type="float16",
+            **extra
+        )
+
+    def test_key_normalizes_text(self):
+        """Test that whitespace and Unicode form differences share a key."""
+        self.assertEqual(self.make_key("Hello  world\n"), self.make_key("Hello world"))
+        self.assertEqual(self.make_key("café"), self.make_key("café"))
+        self.assertNotEqual(self.make_key("Hello world"), self.make_key("Hello there"))
+
+    def test_key_covers_output_affecting_options(self):
+        """Test that reference transcript and subtitle settings change the key."""
+        base = self.make_key(reference_text="A", create_subtitles=False)
+        self.assertNotEqual(base, self.make_key(reference_text="B", create_subtitles=False))
+        self.assertNotEqual(base, self.make_key(reference_text="A", create_subtitles=True))
+
+    def test_key_hashes_reference_content(self):
+        """Test that the key follows the reference audio content, not its path."""
+        key = self.make_key()
+        copy_path = Path(self.temp_dir.name) / "copy.wav"
+        copy_path.write_bytes(self.reference_path.read_bytes())
+        self.reference_path = copy_path
+        self.assertEqual(self.make_key(), key)
+
+    def test_put_get_strips_request_fields(self):
+        """Test that per-request fields are never served from the cache."""
+        key = self.make_key()
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, {"audio_url": "s3://bucket/out.wav", "processing_time": 1.2, "timings": {"f5tts": 1.0}})
+
+        self.assertEqual(self.cache.get(key), {"audio_url": "s3://bucket/out.wav"})
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+        self.assertEqual(self.cache.get_stats()["misses"], 1)
+
+    def test_shared_between_workers(self):
+        """Test that an entry written by one worker is a hit for another on the same volume."""
+        key = self.make_key()
+        self.cache.put(key, {"audio_url": "s3://bucket/out.wav"})
+        other_worker = ResultCache(self.cache_dir)
+        self.assertEqual(other_worker.get(key), {"audio_url": "s3://bucket/out.wav"})
+        self.assertEqual(other_worker.get_stats()["entries"], 1)
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest entry is evicted once the budget is exceeded."""
+        keys = [self.make_key(f"text {index}") for index in range(3)]
+        self.cache.put(keys[0], {"audio_url": "a" * 100})
+        entry_size = self.cache.get_stats()["bytes"]
+        self.cache.max_bytes = entry_size * 2 + 10
+
+        self.cache.put(keys[1], {"audio_url": "b" * 100})
+        self.cache.get(keys[0])  # keys[1] is now least recently used
+        self.cache.put(keys[2], {"audio_url": "c" * 100})
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+
+    def test_corrupt_entry_is_a_miss(self):
+        """Test that an unreadable entry is treated as a miss."""
+        key = self.make_key()
+        self.cache.put(key, {"audio_url": "s3://bucket/out.wav"})
+        self.cache._entry_path(key).write_text("{not json")
+        self.assertIsNone(self.cache.get(key))
+
+class TestContentHash(unittest.TestCase):
+    """Test the memoized file content hash."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "voice.wav"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_follows_file_changes(self):
+        """Test that rewriting a file is not served from the memo."""
+        self.path.write_bytes(b"first")
+        first = content_hash(self.path)
+        self.assertEqual(first, hash_file(self.path))
+
+        self.path.write_bytes(b"second content")
+        self.assertNotEqual(content_hash(self.path), first)
+        self.assertEqual(content_hash(self.path), hash_file(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,373 @@
+"""
+Tests for the S3 client (s3_utils.py, copied to /app/s3_client.py).
+
+Run with: python -m unittest test_s3_client.py
+"""
+
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Configuration is read at import time
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+def load_s3_client_module():
+    """Load s3_utils.py under its container module name."""
+    spec = importlib.util.spec_from_file_location("s3_client", Path(__file__).parent / "s3_utils.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["s3_client"] = module
+    spec.loader.exec_module(module)
+    return module
+
+s3_client = load_s3_client_module() if boto3 is not None else None
+
+class FakeS3:
+    """Answers HEAD of part 1 with a fixed part size."""
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+
+    def head_object(self, Bucket, Key, PartNumber=None, **kwargs):
+        return {"ContentLength": self.part_size}
+
+@unittest.skipIf(boto3 is None, "boto3 is not installed")
+class TestVerifyDownload(unittest.TestCase):
+    """Test checksum verification of downloaded objects."""
+
+    PART_SIZE = 1024
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(self.PART_SIZE * 2 + 100)
+        self.path = Path(self.temp_dir.name) / "object.bin"
+        self.path.write_bytes(self.data)
+
+        self.client = s3_client.S3Client.__new__(s3_client.S3Client)
+        self.client.bucket = "test-bucket"
+        self.client.s3 = FakeS3(self.PART_SIZE)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def verify(self, etag, **response):
+        return self.client._verify_download(self.path, "object.bin", f'"{etag}"', len(self.data), response)
+
+    def multipart_etag(self, data):
+        parts = [data[i:i + self.PART_SIZE] for i in range(0, len(data), self.PART_SIZE)]
+        digests = b"".join(hashlib.md5(part).digest() for part in parts)
+        return f"{hashlib.md5(digests).hexdigest()}-{len(parts)}"
+
+    def test_plain_md5(self):
+        """Test that an unencrypted single-part object is checksummed."""
+        self.assertEqual(self.verify(hashlib.md5(self.data).hexdigest()), "md5")
+
+    def test_sse_s3_is_checksummed(self):
+        """Test that SSE-S3 (AES256, the AWS default) still gets an MD5 check."""
+        etag = hashlib.md5(self.data).hexdigest()
+        self.assertEqual(self.verify(etag, ServerSideEncryption="AES256"), "md5")
+
+        with self.assertRaises(IOError):
+            self.verify(hashlib.md5(b"other").hexdigest(), ServerSideEncryption="AES256")
+
+    def test_kms_is_size_only(self):
+        """Test that SSE-KMS ETags are not compared against the content MD5."""
+        opaque_etag = hashlib.md5(b"not the content").hexdigest()
+        self.assertEqual(self.verify(opaque_etag, ServerSideEncryption="aws:kms"), "size")
+        self.assertEqual(self.verify(opaque_etag, ServerSideEncryption="aws:kms:dsse"), "size")
+
+    def test_sse_c_is_size_only(self):
+        """Test that SSE-C ETags are not compared against the content MD5."""
+        opaque_etag = hashlib.md5(b"not the content").hexdigest()
+        self.assertEqual(self.verify(opaque_etag, SSECustomerAlgorithm="AES256"), "size")
+
+    def test_multipart_md5(self):
+        """Test that multipart ETags are checked part by part, with or without SSE-S3."""
+        etag = self.multipart_etag(self.data)
+        self.assertEqual(self.verify(etag), "multipart-md5")
+        self.assertEqual(self.verify(etag, ServerSideEncryption="AES256"), "multipart-md5")
+
+        with self.assertRaises(IOError):
+            self.verify(self.multipart_etag(self.data[::-1]))
+
+    def test_non_md5_etag_is_size_only(self):
+        """Test that ETags without the MD5 shape (S3-compatible endpoints) get a size check."""
+        self.assertEqual(self.verify("opaque-etag-value"), "size")
+
+    def test_size_mismatch(self):
+        """Test that a truncated file fails before any checksum."""
+        with self.assertRaises(IOError):
+            self.client._verify_download(self.path, "object.bin", None, len(self.data) + 1, {})
+
+def client_error(code):
+    from botocore.exceptions import ClientError
+    return ClientError({"Error": {"Code": code, "Message": code}}, "GetObject")
+
+@unittest.skipIf(boto3 is None, "boto3 is not installed")
+class TestRetryPolicy(unittest.TestCase):
+    """Test retry classification, backoff and the retry budget."""
+
+    def setUp(self):
+        self.policy = s3_client.RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.002, budget=5.0)
+
+    def test_classify(self):
+        """Test that only errors a retry can fix are retryable."""
+        classify = s3_client.RetryPolicy.classify
+        self.assertEqual(classify(client_error("SlowDown")), "throttle")
+        self.assertEqual(classify(client_error("503")), "throttle")
+        self.assertEqual(classify(client_error("InternalError")), "server")
+        self.assertEqual(classify(ConnectionResetError()), "network")
+        self.assertEqual(classify(TimeoutError()), "network")
+        self.assertIsNone(classify(client_error("AccessDenied")))
+        self.assertIsNone(classify(client_error("NoSuchKey")))
+        self.assertIsNone(classify(ValueError("bad input")))
+
+    def test_classify_unwraps_managed_upload_errors(self):
+        """Test that S3UploadFailedError is classified by the ClientError it wraps."""
+        def failed_upload(code):
+            try:
+                try:
+                    raise client_error(code)
+                except Exception as e:
+                    raise s3_client.S3UploadFailedError("upload failed") from e
+            except s3_client.S3UploadFailedError as e:
+                return e
+
+        self.assertEqual(s3_client.RetryPolicy.classify(failed_upload("SlowDown")), "throttle")
+        self.assertIsNone(s3_client.RetryPolicy.classify(failed_upload("AccessDenied")))
+
+    def test_retries_until_success(self):
+        """Test that transient failures are retried and the call succeeds."""
+        errors = [client_error("SlowDown"), ConnectionResetError()]
+
+        def operation():
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        self.assertEqual(self.policy.call(operation), "ok")
+        stats = self.policy.get_stats()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["throttles"], 1)
+        self.assertEqual(stats["network_errors"], 1)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that a persistent retryable error is raised after max_attempts."""
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            raise client_error("InternalError")
+
+        with self.assertRaises(s3_client.ClientError):
+            self.policy.call(operation)
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.policy.get_stats()["failures"], 1)
+
+    def test_non_retryable_raised_immediately(self):
+        """Test that errors a retry can't fix are not retried."""
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            raise client_error("AccessDenied")
+
+        with self.assertRaises(s3_client.ClientError):
+            self.policy.call(operation)
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(self.policy.get_stats()["retries"], 0)
+
+    def test_backoff_respects_budget(self):
+        """Test that no retry starts whose backoff would end past the deadline."""
+        self.policy.base_delay = self.policy.max_delay = 10.0
+        self.assertIsNone(self.policy.backoff(client_error("SlowDown"), 1, time.time() + 1.0))
+        self.assertEqual(self.policy.get_stats()["budget_exhausted"], 1)
+
+    def test_backoff_is_capped(self):
+        """Test that a single backoff never exceeds max_delay."""
+        self.policy.max_attempts = 20
+        delays = [self.policy.backoff(ConnectionResetError(), attempt, time.time() + 60) for attempt in range(1, 15)]
+        self.assertTrue(all(0 <= delay <= self.policy.max_delay for delay in delays))
+
+class FakeDownloadClient:
+    """Serves objects from memory through fetch_object, like S3Client."""
+
+    bucket = "test-bucket"
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.fetches = 0
+
+    def fetch_object(self, s3_key, local_path, if_none_match=None):
+        data = self.objects[s3_key]
+        etag = hashlib.md5(data).hexdigest()
+        if if_none_match == etag:
+            return None
+        self.fetches += 1
+        Path(local_path).write_bytes(data)
+        return {"etag": etag, "size": len(data)}
+
+@unittest.skipIf(boto3 is None, "boto3 is not installed")
+class TestS3DownloadCache(unittest.TestCase):
+    """Test the local object cache: sharing, key locks and eviction."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.client = FakeDownloadClient({f"voices/voice{index}.wav": bytes([index]) * 100 for index in range(3)})
+        self.cache = s3_client.S3DownloadCache(Path(self.temp_dir.name), max_bytes=150, ttl=300)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_hit_skips_download(self):
+        """Test that a fresh entry is served without fetching again."""
+        first = self.cache.fetch(self.client, "voices/voice0.wav")
+        second = self.cache.fetch(self.client, "voices/voice0.wav")
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.fetches, 1)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_key_locks_are_removed(self):
+        """Test that per-object locks do not accumulate once fetches settle."""
+        for index in range(3):
+            path = self.cache.fetch(self.client, f"voices/voice{index}.wav")
+            self.cache.release(path)
+        with self.assertRaises(KeyError):
+            self.cache.fetch(self.client, "voices/missing.wav")
+        self.assertEqual(self.cache._key_locks, {})
+
+    def test_pinned_entry_is_not_evicted(self):
+        """Test that eviction skips a file another job is still using."""
+        in_use = self.cache.fetch(self.client, "voices/voice0.wav")
+        other = self.cache.fetch(self.client, "voices/voice1.wav")
+        self.cache.release(other)
+
+        # Over budget: voice0 is least recently used but pinned, so voice1 goes
+        newest = self.cache.fetch(self.client, "voices/voice2.wav")
+        self.assertTrue(in_use.exists())
+        self.assertEqual(in_use.read_bytes(), bytes([0]) * 100)
+        self.assertFalse(other.exists())
+
+        # Once released, voice0 can be evicted again
+        self.cache.release(in_use)
+        self.assertFalse(in_use.exists())
+        self.assertTrue(newest.exists())
+        self.assertEqual(self.cache.get_stats()["evictions"], 2)
+
+class FakeUploadClient:
+    """Records uploads and HEADs against an in-memory bucket."""
+
+    bucket = "test-bucket"
+
+    def __init__(self):
+        self.objects = {}
+        self.heads = []
+
+    def head_size(self, s3_key):
+        self.heads.append(s3_key)
+        data = self.objects.get(s3_key)
+        return len(data) if data is not None else None
+
+    def upload_bytes(self, data, s3_key, content_type=None):
+        self.objects[s3_key] = data
+        return self.object_url(s3_key)
+
+    def object_url(self, s3_key):
+        return f"s3://{self.bucket}/{s3_key}"
+
+@unittest.skipIf(boto3 is None, "boto3 is not installed")
+class TestUploadDeduplicator(unittest.TestCase):
+    """Test content-hashed uploads, retry markers and index pruning."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_dir = Path(self.temp_dir.name)
+        self.client = FakeUploadClient()
+        self.deduplicator = s3_client.UploadDeduplicator(self.index_dir, max_entries=100)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def upload(self, data, job_id="job-1"):
+        with s3_client.job_scope(job_id):
+            return self.deduplicator.upload(self.client, data, "output", ".wav")
+
+    def records(self):
+        return list((self.index_dir / "test-bucket").glob("*/*.json"))
+
+    def test_unique_upload_costs_no_head(self):
+        """Test that new content is uploaded without a HEAD."""
+        url = self.upload(b"audio-1")
+        self.assertTrue(url.startswith("s3://test-bucket/output/job-1/"))
+        self.assertEqual(self.client.heads, [])
+        self.assertEqual(len(self.records()), 1)
+
+    def test_duplicate_content_is_not_uploaded(self):
+        """Test that identical content from another job reuses the existing object."""
+        first_url = self.upload(b"audio-1", "job-1")
+        second_url = self.upload(b"audio-1", "job-2")
+        self.assertEqual(first_url, second_url)
+        self.assertEqual(len(self.client.heads), 1)
+        self.assertEqual(self.deduplicator.get_stats()["deduplicated"], 1)
+
+    def test_job_marker_removed_when_job_finishes(self):
+        """Test that a finished job leaves no marker behind."""
+        self.upload(b"audio-1")
+        self.assertEqual(list((self.index_dir / "test-bucket" / "jobs").iterdir()), [])
+
+    def test_retry_checks_own_key(self):
+        """Test that an attempt of a job whose marker survived HEADs its own key."""
+        job = s3_client.JobScope("job-1")
+        with s3_client.job_scope(job):
+            self.deduplicator.upload(self.client, b"audio-1", "output", ".wav")
+        # The attempt died before finishing; its index record was lost too
+        for record in self.records():
+            record.unlink()
+        deduplicator = s3_client.UploadDeduplicator(self.index_dir)
+
+        with s3_client.job_scope("job-1"):
+            deduplicator.upload(self.client, b"audio-1", "output", ".wav")
+        self.assertEqual(len(self.client.heads), 1)
+        self.assertEqual(deduplicator.get_stats()["deduplicated"], 1)
+
+    def test_index_evicts_least_recently_used(self):
+        """Test that the index keeps at most max_entries records."""
+        self.deduplicator.max_entries = 2
+        for index in range(3):
+            self.upload(f"audio-{index}".encode(), f"job-{index}")
+
+        self.assertEqual(len(self.records()), 2)
+        self.assertEqual(self.deduplicator.get_stats()["evictions"], 1)
+        self.assertEqual(self.deduplicator.get_stats()["index_entries"], 2)
+
+    def test_stale_markers_expire(self):
+        """Test that markers of attempts that never finished are removed after the TTL."""
+        marker_path = self.index_dir / "test-bucket" / "jobs" / "dead-job"
+        marker_path.parent.mkdir(parents=True)
+        marker_path.touch()
+        stale = time.time() - 7200
+        os.utime(marker_path, (stale, stale))
+
+        deduplicator = s3_client.UploadDeduplicator(self.index_dir, marker_ttl=3600)
+        with s3_client.job_scope("job-1"):
+            deduplicator.upload(self.client, b"audio-1", "output", ".wav")
+        self.assertFalse(marker_path.exists())
+        self.assertEqual(deduplicator.get_stats()["expired_markers"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for the cross-worker setup lease.
+
+Run with: python -m unittest test_setup_lock.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from setup_lock import SetupLease, run_exclusive_setup
+
+class TestSetupLease(unittest.TestCase):
+    """Test exclusive acquisition, release and stale-lease takeover."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.volume = Path(self.temp_dir.name)
+        self.leases = []
+
+    def tearDown(self):
+        for lease in self.leases:
+            lease.release()
+        self.temp_dir.cleanup()
+
+    def make_lease(self, ttl=60):
+        lease = SetupLease(self.volume / "setup.lease", self.volume / "setup_progress.json", ttl=ttl, heartbeat_interval=60)
+        self.leases.append(lease)
+        return lease
+
+    def age_lease(self, seconds):
+        stale = time.time() - seconds
+        os.utime(self.volume / "setup.lease", (stale, stale))
+
+    def test_exclusive(self):
+        """Test that only one worker holds a fresh lease."""
+        first, second = self.make_lease(), self.make_lease()
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+
+    def test_release_frees_lease(self):
+        """Test that a released lease can be taken by another worker."""
+        first, second = self.make_lease(), self.make_lease()
+        self.assertTrue(first.try_acquire())
+        first.release()
+        self.assertTrue(second.try_acquire())
+
+    def test_release_keeps_other_owner(self):
+        """Test that a worker whose lease was taken over does not delete the new holder's lease."""
+        first, second = self.make_lease(ttl=10), self.make_lease(ttl=10)
+        self.assertTrue(first.try_acquire())
+        self.age_lease(60)
+        self.assertTrue(second.try_acquire())
+
+        first.release()
+        lease = json.loads((self.volume / "setup.lease").read_text())
+        self.assertEqual(lease["owner"], second.owner)
+
+    def test_stale_lease_taken_over(self):
+        """Test that a lease whose heartbeat stopped is taken over."""
+        dead, successor = self.make_lease(ttl=10), self.make_lease(ttl=10)
+        self.assertTrue(dead.try_acquire())
+        dead._heartbeat_stop.set()  # The holder died without releasing
+        self.age_lease(60)
+
+        self.assertTrue(successor.try_acquire())
+        self.assertEqual(json.loads((self.volume / "setup.lease").read_text())["owner"], successor.owner)
+        self.assertEqual(list(self.volume.glob("setup.lease.stale.*")), [])
+
+    def test_lost_takeover_race_restores_fresh_lease(self):
+        """Test that a worker renaming aside a lease another worker just took over puts it back."""
+        first, late = self.make_lease(ttl=10), self.make_lease(ttl=10)
+        self.assertTrue(first.try_acquire())
+        # The stale check passes, but the lease is fresh again by the time it is renamed
+        late._is_stale = lambda: True
+
+        self.assertFalse(late.try_acquire())
+        self.assertEqual(json.loads((self.volume / "setup.lease").read_text())["owner"], first.owner)
+        self.assertEqual(list(self.volume.glob("setup.lease.stale.*")), [])
+
+    def test_progress_round_trip(self):
+        """Test that waiting workers see the holder's progress."""
+        holder, waiter = self.make_lease(), self.make_lease()
+        holder.write_progress("running", "Installing torch")
+        progress = waiter.read_progress()
+        self.assertEqual(progress["status"], "running")
+        self.assertEqual(progress["message"], "Installing torch")
+        self.assertEqual(progress["owner"], holder.owner)
+
+class TestRunExclusiveSetup(unittest.TestCase):
+    """Test one-time environment setup across workers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.flag = Path(self.temp_dir.name) / "setup_complete.flag"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_already_complete(self):
+        """Test that a finished setup is not run again."""
+        self.flag.touch()
+        result = run_exclusive_setup(lambda progress: self.fail("setup ran again"), complete_flag=self.flag)
+        self.assertEqual(result["role"], "none")
+
+if __name__ == '__main__':
+    unittest.main()
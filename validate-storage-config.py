@@ -5,16 +5,25 @@ Network Volume Environment Setup (Layer 2)
 
 This script handles the first-time setup of the network volume environment:
 1. Create virtual environment
-2. Install PyTorch with CUDA support
-3. Install F5-TTS and WhisperX
-4. Setup model directories and caching
+2. Install PyTorch, F5-TTS and WhisperX from a persistent wheelhouse
+3. Setup model directories and caching
 """
 
 import os
+import re
 import sys
+import json
+import base64
+import hashlib
+import tarfile
 import subprocess
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from urllib.request import urlopen
 import shutil
 import time
 
@@ -23,9 +32,17 @@ sys.path.append('/app')
 from setup_network_venv import (  # This is our config.py
     NETWORK_VOLUME_PATH, VENV_PATH, MODELS_PATH, TEMP_PATH, 
     LOGS_PATH, CACHE_PATH, PYTORCH_VERSION, PYTORCH_INDEX_URL,
-    FLASH_ATTN_WHEEL, RUNTIME_REQUIREMENTS
+    FLASH_ATTN_WHEEL, RUNTIME_REQUIREMENTS, VENV_SNAPSHOT_ENABLED,
+    VENV_SNAPSHOT_PATH, VENV_SNAPSHOT_WORKERS, WHEELHOUSE_PATH,
+    WHEEL_DOWNLOAD_WORKERS, VENV_MANIFEST_HASHES
 )
 
+# Per-step completion markers for resumable setup
+SETUP_MARKERS_PATH = NETWORK_VOLUME_PATH / "setup_markers"
+
+# Index for everything not pinned to the PyTorch index
+PYPI_INDEX_URL = "https://pypi.org/simple"
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -83,16 +100,35 @@ def create_directory_structure():
         logger.error(f"Failed to create directory structure: {e}")
         return False
 
+def get_venv_site_packages() -> Optional[Path]:
+    """Get the venv site-packages directory, or None if there is none."""
+    candidates = sorted(VENV_PATH.glob("lib/python3*/site-packages"))
+    return candidates[0] if candidates else None
+
+def venv_is_intact() -> bool:
+    """Cheap structural check that the venv exists and its interpreter resolves."""
+    python_path = get_venv_python()
+    return (
+        (VENV_PATH / "pyvenv.cfg").exists()
+        and python_path.exists()  # Follows the symlink to the base interpreter
+        and get_venv_site_packages() is not None
+    )
+
 def create_virtual_environment():
-    """Create Python virtual environment."""
+    """Create Python virtual environment, reusing an intact existing one."""
     try:
-        logger.info("Creating virtual environment...")
-        
-        # Remove existing venv if it exists but is broken
         if VENV_PATH.exists():
-            logger.warning("Removing existing virtual environment")
+            if venv_is_intact():
+                logger.info(f"Reusing existing virtual environment: {VENV_PATH}")
+                return True
+            
+            # Only a broken venv is ever wiped
+            logger.warning("Removing broken virtual environment")
             shutil.rmtree(VENV_PATH)
         
+        logger.info("Creating virtual environment...")
+        clear_step_markers("runtime_requirements", "verify")
+        
         # Create new virtual environment
         cmd = f"python3 -m venv {VENV_PATH}"
         if not run_command(cmd):
@@ -113,65 +149,342 @@ def get_venv_pip():
     """Get path to virtual environment pip executable."""
     return VENV_PATH / "bin" / "pip"
 
-def install_pytorch():
-    """Install PyTorch with CUDA support."""
+def _index_pins() -> Dict[str, str]:
+    """
+    Get packages that must come from a dedicated index (PyTorch CUDA builds).
+    
+    Returns:
+        Mapping of lower-case package name to index URL
+    """
+    pins = {}
+    for requirement in RUNTIME_REQUIREMENTS:
+        tokens = requirement.split()
+        if "--index-url" not in tokens[:-1]:
+            continue
+        index_url = tokens[tokens.index("--index-url") + 1]
+        for token in tokens:
+            if "==" in token:
+                pins[token.split("==")[0].lower()] = index_url
+    return pins
+
+def build_requirements_file(path: Path) -> Path:
+    """
+    Write RUNTIME_REQUIREMENTS as a single requirements file.
+    
+    The PyTorch index stays the primary ``--index-url`` with PyPI as an
+    extra index, and its pins get the index's local version (e.g.
+    ``torch==2.6.0+cu126``) so pip cannot pick the PyPI build of torch.
+    """
+    index_lines = []
+    lines = []
+    for requirement in RUNTIME_REQUIREMENTS:
+        tokens = requirement.split()
+        index_url = None
+        specs = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in ("--index-url", "--extra-index-url") and i + 1 < len(tokens):
+                index_url = tokens[i + 1]
+                index_lines.append(f"{tokens[i]} {index_url}")
+                i += 2
+                continue
+            specs.append(tokens[i])
+            i += 1
+        
+        local_version = index_url.rstrip("/").rsplit("/", 1)[-1] if index_url else ""
+        if re.fullmatch(r"cu\d+|cpu|rocm[\d.]+", local_version):
+            specs = [f"{spec}+{local_version}" if "==" in spec and "+" not in spec else spec for spec in specs]
+        lines.extend(specs)
+    
+    if any(line.startswith("--index-url") for line in index_lines):
+        index_lines.append(f"--extra-index-url {PYPI_INDEX_URL}")
+    
+    path.write_text("\n".join(dict.fromkeys(index_lines + lines)) + "\n")
+    return path
+
+def get_lock_path() -> Path:
+    """Get the wheelhouse lock file for the current environment hash."""
+    return WHEELHOUSE_PATH / f"lock-{compute_environment_hash()[:16]}.json"
+
+def resolve_requirements() -> List[Dict[str, Any]]:
+    """
+    Resolve the full dependency graph once.
+    
+    Uses a cached lock when one exists for the current environment hash,
+    otherwise runs a single ``pip install --dry-run --report`` against an
+    empty target.
+    
+    Returns:
+        Resolved packages with name, version, url, sha256 and vcs details
+    """
     try:
-        logger.info("Installing PyTorch with CUDA support...")
+        lock_path = get_lock_path()
+        if lock_path.exists():
+            packages = json.loads(lock_path.read_text())["packages"]
+            logger.info(f"Using cached dependency lock: {lock_path} ({len(packages)} packages)")
+            return packages
         
-        pip_cmd = str(get_venv_pip())
-        pytorch_cmd = f"{pip_cmd} install {PYTORCH_VERSION} --index-url {PYTORCH_INDEX_URL}"
+        logger.info("Resolving dependencies...")
+        WHEELHOUSE_PATH.mkdir(parents=True, exist_ok=True)
         
-        if not run_command(pytorch_cmd, timeout=1800):  # 30 minute timeout
-            return False
+        python_cmd = str(get_venv_python())
+        # --report needs pip >= 22.2
+        if not run_command(f"{python_cmd} -m pip install --upgrade 'pip>=23.1'", timeout=600):
+            raise RuntimeError("Failed to upgrade pip")
+        
+        requirements_path = build_requirements_file(WHEELHOUSE_PATH / f"requirements.{os.getpid()}.txt")
+        report_path = WHEELHOUSE_PATH / f"report.{os.getpid()}.json"
+        resolve_cmd = (
+            f"{python_cmd} -m pip install --dry-run --ignore-installed --quiet "
+            f"--report {report_path} -r {requirements_path}"
+        )
+        if not run_command(resolve_cmd, timeout=1800):
+            raise RuntimeError("Dependency resolution failed")
+        
+        report = json.loads(report_path.read_text())
+        pins = _index_pins()
+        packages = []
+        for item in report["install"]:
+            download_info = item["download_info"]
+            archive_hashes = download_info.get("archive_info", {}).get("hashes", {})
+            packages.append({
+                "name": item["metadata"]["name"],
+                "version": item["metadata"]["version"],
+                "url": download_info["url"],
+                "sha256": archive_hashes.get("sha256"),
+                "vcs": download_info.get("vcs_info", {}).get("vcs"),
+                "vcs_commit": download_info.get("vcs_info", {}).get("commit_id")
+            })
             
-        logger.info("PyTorch installed successfully")
-        return True
+            # The lock pins wheels by URL - never record a PyPI torch build
+            # (compared by domain; the PyTorch index serves files from mirrors)
+            index_url = pins.get(packages[-1]["name"].lower())
+            index_domain = urlparse(index_url).netloc.split(".")[-2:] if index_url else None
+            if index_domain and urlparse(download_info["url"]).netloc.split(".")[-2:] != index_domain:
+                raise RuntimeError(f"{packages[-1]['name']} resolved outside {index_url}: {download_info['url']}")
+        
+        # Atomic write - concurrent workers may resolve at the same time
+        tmp_path = lock_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"environment_hash": compute_environment_hash(), "packages": packages}, indent=2))
+        os.replace(tmp_path, lock_path)
+        requirements_path.unlink(missing_ok=True)
+        report_path.unlink(missing_ok=True)
+        
+        logger.info(f"Resolved {len(packages)} packages")
+        return packages
         
     except Exception as e:
-        logger.error(f"Failed to install PyTorch: {e}")
-        return False
+        logger.error(f"Failed to resolve requirements: {e}")
+        raise
+
+def _wheel_filename(url: str) -> str:
+    """Get the distribution filename from a download URL."""
+    return unquote(urlparse(url).path.rsplit("/", 1)[-1])
+
+def _sha256_file(path: Path) -> str:
+    """Get the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def install_flash_attention():
-    """Install Flash Attention wheel."""
+def _fetch_wheel(package: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Put one package's wheel into the wheelhouse.
+    
+    Wheels are downloaded directly; sdists and VCS requirements are built
+    with ``pip wheel --no-deps``. Already present files are reused.
+    
+    Returns:
+        Package name, wheel filename, bytes, seconds and whether it was cached
+    """
+    start_time = time.time()
+    name = package["name"]
+    
+    if package.get("wheel") and (WHEELHOUSE_PATH / package["wheel"]).exists():
+        wheel_path = WHEELHOUSE_PATH / package["wheel"]
+        return {"name": name, "wheel": wheel_path.name, "bytes": wheel_path.stat().st_size, "seconds": 0.0, "cached": True}
+    
+    url = package["url"]
+    filename = _wheel_filename(url)
+    if filename.endswith(".whl") and not package.get("vcs_commit"):
+        wheel_path = WHEELHOUSE_PATH / filename
+        if not wheel_path.exists():
+            tmp_path = wheel_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.part")
+            with urlopen(url, timeout=60) as response, open(tmp_path, "wb") as f:
+                shutil.copyfileobj(response, f, length=1024 * 1024)
+            if package.get("sha256") and _sha256_file(tmp_path) != package["sha256"]:
+                tmp_path.unlink(missing_ok=True)
+                raise RuntimeError(f"Checksum mismatch for {filename}")
+            os.replace(tmp_path, wheel_path)
+    else:
+        # Build a wheel once so later installs stay offline
+        build_dir = WHEELHOUSE_PATH / f".build-{name}-{os.getpid()}"
+        shutil.rmtree(build_dir, ignore_errors=True)
+        if package.get("vcs_commit"):
+            source = f"{name} @ {package['vcs']}+{url}@{package['vcs_commit']}"
+        else:
+            source = f"{name} @ {url}"
+        build_cmd = f"{get_venv_python()} -m pip wheel --no-deps --quiet -w {build_dir} \"{source}\""
+        if not run_command(build_cmd, timeout=1200):
+            raise RuntimeError(f"Failed to build wheel for {name}")
+        built = next(build_dir.glob("*.whl"))
+        wheel_path = WHEELHOUSE_PATH / built.name
+        os.replace(built, wheel_path)
+        shutil.rmtree(build_dir, ignore_errors=True)
+    
+    package["wheel"] = wheel_path.name
+    return {
+        "name": name,
+        "wheel": wheel_path.name,
+        "bytes": wheel_path.stat().st_size,
+        "seconds": round(time.time() - start_time, 3),
+        "cached": False
+    }
+
+def download_wheels(packages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fetch all resolved packages into the wheelhouse concurrently.
+    
+    Records each wheel filename in the lock so the next rebuild installs
+    without touching the network.
+    
+    Returns:
+        Per-package download timings
+    """
     try:
-        logger.info("Installing Flash Attention...")
+        logger.info(f"Downloading {len(packages)} packages into {WHEELHOUSE_PATH}...")
+        start_time = time.time()
         
-        pip_cmd = str(get_venv_pip())
-        flash_cmd = f"{pip_cmd} install {FLASH_ATTN_WHEEL}"
+        with ThreadPoolExecutor(max_workers=WHEEL_DOWNLOAD_WORKERS, thread_name_prefix="wheel-fetch") as executor:
+            timings = list(executor.map(_fetch_wheel, packages))
         
-        if not run_command(flash_cmd, timeout=600):  # 10 minute timeout
-            return False
-            
-        logger.info("Flash Attention installed successfully")
-        return True
+        lock_path = get_lock_path()
+        tmp_path = lock_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"environment_hash": compute_environment_hash(), "packages": packages}, indent=2))
+        os.replace(tmp_path, lock_path)
+        
+        downloaded = [t for t in timings if not t["cached"]]
+        total_bytes = sum(t["bytes"] for t in downloaded)
+        logger.info(
+            f"Wheelhouse ready in {time.time() - start_time:.1f}s: "
+            f"{len(downloaded)} fetched ({total_bytes / 1e6:.1f} MB), {len(timings) - len(downloaded)} cached"
+        )
+        return timings
         
     except Exception as e:
-        logger.error(f"Failed to install Flash Attention: {e}")
-        return False
+        logger.error(f"Failed to download wheels: {e}")
+        raise
+
+def normalize_distribution_name(name: str) -> str:
+    """Normalize a distribution name (PEP 503)."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def get_installed_distributions() -> Dict[str, str]:
+    """
+    Get distributions installed in the venv from their dist-info directories.
+    
+    Returns:
+        Mapping of normalized distribution name to version
+    """
+    site_packages = get_venv_site_packages()
+    if site_packages is None:
+        return {}
+    
+    installed = {}
+    for dist_info in site_packages.glob("*.dist-info"):
+        if not (dist_info / "RECORD").exists():
+            continue  # Interrupted install
+        name, _, version = dist_info.name[:-len(".dist-info")].partition("-")
+        installed[normalize_distribution_name(name)] = version
+    return installed
 
-def install_runtime_requirements():
-    """Install all runtime requirements."""
+def install_from_wheelhouse(packages: List[Dict[str, Any]], force_reinstall: Optional[List[str]] = None) -> float:
+    """
+    Install locked wheels offline in a single pip transaction.
+    
+    Packages already installed at the locked version are skipped, so a
+    failed install resumes where it stopped.
+    
+    Args:
+        packages: Locked packages with wheel filenames
+        force_reinstall: Normalized names to reinstall even at the locked
+            version (files corrupted inside a version-matching install)
+    
+    Returns:
+        Install time in seconds
+    """
     try:
-        logger.info("Installing runtime requirements...")
+        installed = get_installed_distributions()
+        forced = set(force_reinstall or ())
+        pending = [
+            package for package in packages
+            if normalize_distribution_name(package["name"]) in forced
+            or installed.get(normalize_distribution_name(package["name"])) != package["version"]
+        ]
+        if not pending:
+            logger.info("All locked wheels already installed")
+            return 0.0
+        if len(pending) < len(packages):
+            logger.info(f"Resuming install: {len(packages) - len(pending)} of {len(packages)} wheels already installed")
+        packages = pending
+        
+        logger.info(f"Installing {len(packages)} wheels offline...")
+        start_time = time.time()
         
-        pip_cmd = str(get_venv_pip())
+        wheel_paths = " ".join(f'"{WHEELHOUSE_PATH / package["wheel"]}"' for package in packages)
+        reinstall_flag = " --force-reinstall" if forced else ""
+        install_cmd = f"{get_venv_python()} -m pip install --no-index --no-deps{reinstall_flag} --quiet {wheel_paths}"
+        if not run_command(install_cmd, timeout=1800):
+            raise RuntimeError("Offline install from wheelhouse failed")
         
-        for requirement in RUNTIME_REQUIREMENTS:
-            if requirement.startswith(PYTORCH_VERSION):
-                # Skip PyTorch - already installed
-                continue
-            if requirement == FLASH_ATTN_WHEEL:
-                # Skip flash attention - already installed
-                continue
-                
-            cmd = f"{pip_cmd} install {requirement}"
-            if not run_command(cmd, timeout=1200):  # 20 minute timeout per package
-                logger.error(f"Failed to install: {requirement}")
-                return False
-            
-            # Small delay between installations
-            time.sleep(2)
+        install_time = time.time() - start_time
+        logger.info(f"Installed {len(packages)} wheels in {install_time:.1f}s")
+        return install_time
         
+    except Exception as e:
+        logger.error(f"Failed to install from wheelhouse: {e}")
+        raise
+
+def report_progress(progress_callback: Optional[Callable[[str], None]], message: str):
+    """Log a setup step and forward it to the progress callback, if any."""
+    logger.info(message)
+    if progress_callback is not None:
+        progress_callback(message)
+
+def install_runtime_requirements(progress_callback: Optional[Callable[[str], None]] = None):
+    """Resolve, download and install all runtime requirements (steps 3-5)."""
+    try:
+        if is_step_complete("runtime_requirements"):
+            report_progress(progress_callback, "Steps 3-5: Runtime requirements already installed, skipping")
+            return True
+        
+        # Step 3: Resolve the whole dependency graph once
+        report_progress(progress_callback, "Step 3: Resolving dependencies...")
+        packages = resolve_requirements()
+        
+        # Step 4: Populate the wheelhouse in parallel
+        report_progress(progress_callback, "Step 4: Downloading wheels...")
+        download_timings = download_wheels(packages)
+        
+        # Step 5: Install offline (corrupted distributions are reinstalled in place)
+        report_progress(progress_callback, "Step 5: Installing runtime requirements from wheelhouse...")
+        install_time = install_from_wheelhouse(packages, get_requested_reinstalls())
+        
+        for timing in sorted(download_timings, key=lambda t: t["seconds"], reverse=True):
+            status = "cached" if timing["cached"] else f"{timing['seconds']:.1f}s"
+            logger.info(f"  {timing['name']}: {timing['bytes'] / 1e6:.1f} MB ({status})")
+        
+        report = {
+            "environment_hash": compute_environment_hash(),
+            "download": download_timings,
+            "install_time": round(install_time, 3)
+        }
+        LOGS_PATH.mkdir(parents=True, exist_ok=True)
+        (LOGS_PATH / "install-timings.json").write_text(json.dumps(report, indent=2))
+        
+        mark_step_complete("runtime_requirements")
         logger.info("Runtime requirements installed successfully")
         return True
         
@@ -179,28 +492,47 @@ def install_runtime_requirements():
         logger.error(f"Failed to install runtime requirements: {e}")
         return False
 
+VERIFY_SCRIPT = """
+import torch
+print(f'PyTorch: {torch.__version__}')
+print(f'CUDA available: {torch.cuda.is_available()}')
+for module in ('whisperx', 'ass'):
+    try:
+        __import__(module)
+        print(f'{module} imported successfully')
+    except Exception as e:
+        print(f'WARNING: {module} import failed: {e}')
+"""
+
 def verify_installation():
-    """Verify that key packages are installed correctly."""
+    """
+    Verify that key packages import, then record the integrity manifest.
+    
+    Runs once after install in a single interpreter; later boots check the
+    manifest instead (see verify_venv_manifest). Distributions that were
+    reinstalled after a failed integrity check must also match their RECORD
+    hashes before the manifest is rewritten.
+    """
     try:
         logger.info("Verifying installation...")
         
         python_cmd = str(get_venv_python())
         
-        # Test PyTorch with CUDA
-        pytorch_test = f"{python_cmd} -c \"import torch; print(f'PyTorch: {{torch.__version__}}'); print(f'CUDA available: {{torch.cuda.is_available()}}')\""
-        if not run_command(pytorch_test):
+        # PyTorch is required; WhisperX and ASS only warn
+        if not run_command(f"{python_cmd} -c \"{VERIFY_SCRIPT}\""):
             return False
         
-        # Test WhisperX
-        whisperx_test = f"{python_cmd} -c \"import whisperx; print('WhisperX imported successfully')\""
-        if not run_command(whisperx_test):
-            logger.warning("WhisperX import failed - may need additional setup")
-            
-        # Test ASS library
-        ass_test = f"{python_cmd} -c \"import ass; print('ASS library imported successfully')\""
-        if not run_command(ass_test):
-            logger.warning("ASS library import failed")
+        reinstalled = get_requested_reinstalls()
+        if reinstalled:
+            still_broken = verify_distribution_records(reinstalled)
+            if still_broken:
+                logger.error(f"Reinstalled distributions still fail RECORD checks: {', '.join(still_broken)}")
+                return False
+        
+        if not write_venv_manifest():
+            logger.warning("Venv integrity manifest not written - boot checks will be skipped")
         
+        clear_requested_reinstalls()
         logger.info("Installation verification completed")
         return True
         
@@ -208,303 +540,463 @@ def verify_installation():
         logger.error(f"Failed to verify installation: {e}")
         return False
 
-def setup_model_cache():
-    """Setup model cache directories with proper permissions."""
+def get_manifest_path() -> Path:
+    """Get the venv integrity manifest path (inside the venv, so snapshots carry it)."""
+    return VENV_PATH / ".integrity-manifest.json"
+
+def _is_key_file(relative_path: str) -> bool:
+    """Pick the files whose size/mtime stand in for a distribution's integrity."""
+    if relative_path.startswith(".."):
+        return False  # Scripts outside site-packages
+    if relative_path.endswith((".so", ".pyd")) or ".so." in relative_path:
+        return True
+    parts = relative_path.split("/")
+    if parts[0].endswith(".dist-info"):
+        return parts[-1] in ("METADATA", "RECORD")
+    return parts[-1] == "__init__.py" and len(parts) <= 3
+
+def _read_record(dist_info: Path) -> List[Tuple[str, Optional[str]]]:
+    """Get (relative path, RECORD hash) pairs for a distribution."""
+    entries = []
+    for line in (dist_info / "RECORD").read_text().splitlines():
+        fields = line.rsplit(",", 2)
+        if len(fields) == 3 and fields[0]:
+            entries.append((fields[0], fields[1] or None))
+    return entries
+
+def _record_hash(path: Path) -> str:
+    """Hash a file the way RECORD does (urlsafe base64 SHA-256, unpadded)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return "sha256=" + base64.urlsafe_b64encode(digest.digest()).rstrip(b"=").decode("ascii")
+
+def _manifest_entry(dist_info: Path, site_packages: Path) -> Dict[str, Any]:
+    """Build the manifest entry for one installed distribution."""
+    name, _, version = dist_info.name[:-len(".dist-info")].partition("-")
+    files = {}
+    for relative_path, record_hash in _read_record(dist_info):
+        if not _is_key_file(relative_path):
+            continue
+        stat = (site_packages / relative_path).stat()
+        files[relative_path] = [stat.st_size, int(stat.st_mtime), record_hash]
+    return {
+        "name": normalize_distribution_name(name),
+        "version": version,
+        "dist_info": dist_info.name,
+        "files": files
+    }
+
+def write_venv_manifest(distributions: Optional[List[str]] = None) -> bool:
+    """
+    Record installed distributions and their key files' size and mtime.
+    
+    Args:
+        distributions: Normalized names to refresh in an existing manifest
+            (all distributions when None)
+    """
     try:
-        logger.info("Setting up model cache...")
+        site_packages = get_venv_site_packages()
+        if site_packages is None:
+            raise RuntimeError(f"No site-packages in {VENV_PATH}")
         
-        # Create model subdirectories
-        model_dirs = [
-            MODELS_PATH / "f5-tts" / "checkpoints",
-            MODELS_PATH / "whisperx" / "models",
-            MODELS_PATH / "whisperx" / "align_models"
-        ]
+        manifest_path = get_manifest_path()
+        if distributions is not None and manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text())
+        else:
+            manifest = {"distributions": {}}
+            distributions = None
         
-        for model_dir in model_dirs:
-            model_dir.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created model cache: {model_dir}")
+        for dist_info in site_packages.glob("*.dist-info"):
+            if not (dist_info / "RECORD").exists():
+                continue
+            name = normalize_distribution_name(dist_info.name.partition("-")[0])
+            if distributions is None or name in distributions:
+                manifest["distributions"][name] = _manifest_entry(dist_info, site_packages)
         
-        logger.info("Model cache setup completed")
+        manifest["environment_hash"] = compute_environment_hash()
+        manifest["site_packages"] = str(site_packages.relative_to(VENV_PATH))
+        manifest["created_at"] = time.time()
+        
+        tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, manifest_path)
+        
+        logger.info(f"Wrote venv integrity manifest: {len(manifest['distributions'])} distributions")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to setup model cache: {e}")
+        logger.error(f"Failed to write venv manifest: {e}")
         return False
 
-def setup_network_volume_environment():
+def verify_venv_manifest(check_hashes: bool = VENV_MANIFEST_HASHES) -> Dict[str, Any]:
     """
-    Main function to setup complete network volume environment.
-    This is called during cold start (first request).
+    Check the venv against its integrity manifest without importing anything.
+    
+    Args:
+        check_hashes: Also compare key file content with RECORD hashes (slow)
+        
+    Returns:
+        Result with ok flag, missing and changed distribution names,
+        number of files checked and elapsed seconds
     """
-    try:
-        logger.info("=== F5-TTS Network Volume Environment Setup ===")
-        start_time = time.time()
-        
-        # Step 1: Create directory structure
-        logger.info("Step 1: Creating directory structure...")
-        if not create_directory_structure():
-            raise RuntimeError("Failed to create directory structure")
-        
-        # Step 2: Create virtual environment
-        logger.info("Step 2: Creating virtual environment...")
-        if not create_virtual_environment():
-            raise RuntimeError("Failed to create virtual environment")
-        
-        # Step 3: Install PyTorch with CUDA
-        logger.info("Step 3: Installing PyTorch with CUDA...")
-        if not install_pytorch():
-            raise RuntimeError("Failed to install PyTorch")
-        
-        # Step 4: Install Flash Attention
-        logger.info("Step 4: Installing Flash Attention...")
-        if not install_flash_attention():
-            raise RuntimeError("Failed to install Flash Attention")
+    start_time = time.time()
+    manifest_path = get_manifest_path()
+    if not manifest_path.exists():
+        return {"ok": False, "manifest": False, "missing": [], "changed": [], "checked_files": 0, "seconds": 0.0}
+    
+    manifest = json.loads(manifest_path.read_text())
+    site_packages = VENV_PATH / manifest["site_packages"]
+    
+    def check_distribution(entry: Dict[str, Any]) -> Tuple[str, Optional[str], int]:
+        if not (site_packages / entry["dist_info"] / "RECORD").exists():
+            return entry["name"], "missing", 0
+        for relative_path, (size, mtime, record_hash) in entry["files"].items():
+            path = site_packages / relative_path
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                return entry["name"], "changed", len(entry["files"])
+            if stat.st_size != size or int(stat.st_mtime) != mtime:
+                return entry["name"], "changed", len(entry["files"])
+            if check_hashes and record_hash and _record_hash(path) != record_hash:
+                return entry["name"], "changed", len(entry["files"])
+        return entry["name"], None, len(entry["files"])
+    
+    # Stats are latency-bound on the network volume, so fan them out
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(check_distribution, manifest["distributions"].values()))
+    
+    missing = sorted(name for name, problem, _ in results if problem == "missing")
+    changed = sorted(name for name, problem, _ in results if problem == "changed")
+    return {
+        "ok": not missing and not changed,
+        "manifest": True,
+        "missing": missing,
+        "changed": changed,
+        "checked_files": sum(count for _, _, count in results),
+        "seconds": round(time.time() - start_time, 3)
+    }
+
+def repair_distributions(names: List[str]) -> bool:
+    """
+    Reinstall only the given distributions from the wheelhouse.
+    
+    Args:
+        names: Normalized distribution names reported by verify_venv_manifest()
         
-        # Step 5: Install runtime requirements
-        logger.info("Step 5: Installing runtime requirements...")
-        if not install_runtime_requirements():
-            raise RuntimeError("Failed to install runtime requirements")
+    Returns:
+        True if every distribution was reinstalled
+    """
+    try:
+        wanted = set(names)
+        packages = [
+            package for package in resolve_requirements()
+            if normalize_distribution_name(package["name"]) in wanted
+        ]
+        unknown = wanted - {normalize_distribution_name(package["name"]) for package in packages}
+        if unknown:
+            raise RuntimeError(f"Not in dependency lock: {', '.join(sorted(unknown))}")
         
-        # Step 6: Setup model cache
-        logger.info("Step 6: Setting up model cache...")
-        if not setup_model_cache():
-            raise RuntimeError("Failed to setup model cache")
+        logger.info(f"Repairing {len(packages)} distributions: {', '.join(sorted(wanted))}")
+        download_wheels(packages)
         
-        # Step 7: Verify installation
-        logger.info("Step 7: Verifying installation...")
-        if not verify_installation():
-            logger.warning("Installation verification had warnings but continuing...")
+        wheel_paths = " ".join(f'"{WHEELHOUSE_PATH / package["wheel"]}"' for package in packages)
+        repair_cmd = f"{get_venv_python()} -m pip install --no-index --no-deps --force-reinstall --quiet {wheel_paths}"
+        if not run_command(repair_cmd, timeout=1800):
+            raise RuntimeError("Reinstall from wheelhouse failed")
         
-        # Calculate setup time
-        setup_time = time.time() - start_time
-        logger.info(f"=== Setup completed successfully in {setup_time:.1f} seconds ===")
+        # Only a verified install may become the new baseline
+        still_broken = verify_distribution_records(sorted(wanted))
+        if still_broken:
+            raise RuntimeError(f"Still corrupted after reinstall: {', '.join(still_broken)}")
         
-        return True
+        return write_venv_manifest(sorted(wanted))
         
     except Exception as e:
-        logger.error(f"Network volume setup failed: {e}")
-        raise
+        logger.error(f"Failed to repair distributions: {e}")
+        return False
 
-if __name__ == "__main__":
-    """Run setup environment directly for testing."""
-    try:
-        success = setup_network_volume_environment()
-        if success:
-            print("Setup completed successfully!")
-            sys.exit(0)
-        else:
-            print("Setup failed!")
-            sys.exit(1)
-    except Exception as e:
-        print(f"Setup error: {e}")
-        sys.exit(1)#!/usr/bin/env python3
-"""
-Setup Environment for F5-TTS RunPod Serverless
-Network Volume Environment Setup (Layer 2)
+def verify_distribution_records(names: List[str]) -> List[str]:
+    """
+    Check installed distributions' key files against their RECORD hashes.
+    
+    Args:
+        names: Normalized distribution names
+        
+    Returns:
+        Names that are not installed or whose key files don't match
+    """
+    site_packages = get_venv_site_packages()
+    if site_packages is None:
+        return sorted(names)
+    
+    unverified = set(names)
+    broken = []
+    for dist_info in site_packages.glob("*.dist-info"):
+        name = normalize_distribution_name(dist_info.name.partition("-")[0])
+        if name not in unverified or not (dist_info / "RECORD").exists():
+            continue
+        unverified.discard(name)
+        for relative_path, record_hash in _read_record(dist_info):
+            if not record_hash or not _is_key_file(relative_path):
+                continue
+            try:
+                matches = _record_hash(site_packages / relative_path) == record_hash
+            except FileNotFoundError:
+                matches = False
+            if not matches:
+                broken.append(name)
+                break
+    return sorted(broken + list(unverified))
 
-This script handles the first-time setup of the network volume environment:
-1. Create virtual environment
-2. Install PyTorch with CUDA support
-3. Install F5-TTS and WhisperX
-4. Setup model directories and caching
-"""
+def _reinstall_request_path() -> Path:
+    """Get the file listing distributions the next install must reinstall."""
+    return SETUP_MARKERS_PATH / "force_reinstall.json"
 
-import os
-import sys
-import subprocess
-import logging
-from pathlib import Path
-import shutil
-import time
+def request_reinstall(names: List[str]):
+    """
+    Make the next setup reinstall ``names`` even if their versions match.
+    
+    Persisted next to the step markers so the request survives a crashed
+    or handed-over setup; cleared once verification succeeds.
+    """
+    names = sorted(set(get_requested_reinstalls()) | set(names))
+    SETUP_MARKERS_PATH.mkdir(parents=True, exist_ok=True)
+    request_path = _reinstall_request_path()
+    tmp_path = request_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"distributions": names, "requested_at": time.time()}))
+    os.replace(tmp_path, request_path)
 
-# Import configuration constants
-sys.path.append('/app')
-from setup_network_venv import (  # This is our config.py
-    NETWORK_VOLUME_PATH, VENV_PATH, MODELS_PATH, TEMP_PATH, 
-    LOGS_PATH, CACHE_PATH, PYTORCH_VERSION, PYTORCH_INDEX_URL,
-    FLASH_ATTN_WHEEL, RUNTIME_REQUIREMENTS
-)
+def get_requested_reinstalls() -> List[str]:
+    """Get distributions waiting for a forced reinstall."""
+    try:
+        return json.loads(_reinstall_request_path().read_text())["distributions"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return []
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+def clear_requested_reinstalls():
+    """Forget reinstall requests after a verified install."""
+    _reinstall_request_path().unlink(missing_ok=True)
 
-def run_command(cmd: str, cwd: Path = None, timeout: int = 3600) -> bool:
-    """Run shell command with proper error handling."""
-    try:
-        logger.info(f"Running: {cmd}")
-        result = subprocess.run(
-            cmd, 
-            shell=True, 
-            check=True, 
-            cwd=cwd,
-            timeout=timeout,
-            capture_output=True,
-            text=True
-        )
-        if result.stdout:
-            logger.info(f"Output: {result.stdout.strip()}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Command failed: {cmd}")
-        logger.error(f"Return code: {e.returncode}")
-        if e.stdout:
-            logger.error(f"Stdout: {e.stdout}")
-        if e.stderr:
-            logger.error(f"Stderr: {e.stderr}")
-        return False
-    except subprocess.TimeoutExpired:
-        logger.error(f"Command timed out after {timeout}s: {cmd}")
-        return False
+def compute_environment_hash() -> str:
+    """
+    Hash everything that determines the contents of the virtual environment.
+    
+    Returns:
+        SHA-256 hex digest of the requirements, PyTorch/Flash Attention pins
+        and the interpreter version
+    """
+    payload = {
+        "runtime_requirements": RUNTIME_REQUIREMENTS,
+        "pytorch_version": PYTORCH_VERSION,
+        "flash_attn_wheel": FLASH_ATTN_WHEEL,
+        "pypi_index_url": PYPI_INDEX_URL,  # Locks resolved with PyPI as the primary index are not reused
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}"
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
 
-def create_directory_structure():
-    """Create network volume directory structure."""
-    try:
-        directories = [
-            NETWORK_VOLUME_PATH,
-            MODELS_PATH,
-            MODELS_PATH / "f5-tts",
-            MODELS_PATH / "whisperx",
-            TEMP_PATH,
-            LOGS_PATH,
-            CACHE_PATH
-        ]
-        
-        for directory in directories:
-            directory.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created directory: {directory}")
-        
-        return True
-    except Exception as e:
-        logger.error(f"Failed to create directory structure: {e}")
-        return False
+def _marker_path(step: str) -> Path:
+    """Get the completion marker file for a setup step."""
+    return SETUP_MARKERS_PATH / f"{step}.json"
 
-def create_virtual_environment():
-    """Create Python virtual environment."""
+def is_step_complete(step: str) -> bool:
+    """Check whether a step completed for the current environment hash."""
     try:
-        logger.info("Creating virtual environment...")
-        
-        # Remove existing venv if it exists but is broken
-        if VENV_PATH.exists():
-            logger.warning("Removing existing virtual environment")
-            shutil.rmtree(VENV_PATH)
-        
-        # Create new virtual environment
-        cmd = f"python3 -m venv {VENV_PATH}"
-        if not run_command(cmd):
-            return False
-            
-        logger.info("Virtual environment created successfully")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to create virtual environment: {e}")
+        marker = json.loads(_marker_path(step).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
         return False
+    return marker.get("environment_hash") == compute_environment_hash()
 
-def get_venv_python():
-    """Get path to virtual environment Python executable."""
-    return VENV_PATH / "bin" / "python"
+def mark_step_complete(step: str):
+    """Record that a step completed for the current environment hash."""
+    SETUP_MARKERS_PATH.mkdir(parents=True, exist_ok=True)
+    marker_path = _marker_path(step)
+    tmp_path = marker_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({"environment_hash": compute_environment_hash(), "completed_at": time.time()}))
+    os.replace(tmp_path, marker_path)
 
-def get_venv_pip():
-    """Get path to virtual environment pip executable."""
-    return VENV_PATH / "bin" / "pip"
+def clear_step_markers(*steps: str):
+    """Invalidate completion markers, e.g. after the venv is recreated."""
+    for step in steps:
+        _marker_path(step).unlink(missing_ok=True)
 
-def install_pytorch():
-    """Install PyTorch with CUDA support."""
-    try:
-        logger.info("Installing PyTorch with CUDA support...")
-        
-        pip_cmd = str(get_venv_pip())
-        pytorch_cmd = f"{pip_cmd} install {PYTORCH_VERSION} --index-url {PYTORCH_INDEX_URL}"
-        
-        if not run_command(pytorch_cmd, timeout=1800):  # 30 minute timeout
-            return False
-            
-        logger.info("PyTorch installed successfully")
+def run_step(
+    step: str,
+    message: str,
+    step_fn: Callable[[], bool],
+    progress_callback: Optional[Callable[[str], None]] = None
+) -> bool:
+    """
+    Run a setup step unless its marker matches the current environment hash.
+    
+    Returns:
+        True if the step is complete (now or previously)
+    """
+    if is_step_complete(step):
+        report_progress(progress_callback, f"{message} already complete, skipping")
         return True
-        
-    except Exception as e:
-        logger.error(f"Failed to install PyTorch: {e}")
+    
+    report_progress(progress_callback, message)
+    if not step_fn():
         return False
+    
+    mark_step_complete(step)
+    return True
+
+def get_snapshot_dir(environment_hash: str) -> Path:
+    """Get the directory holding the venv snapshot for an environment hash."""
+    return VENV_SNAPSHOT_PATH / environment_hash[:16]
+
+def _shard_venv_files(num_shards: int) -> Tuple[List[str], List[List[str]]]:
+    """
+    Split the venv into shards of roughly equal size.
+    
+    Returns:
+        Relative directory paths and per-shard relative file paths
+    """
+    directories = []
+    files = []
+    for root, dirnames, filenames in os.walk(VENV_PATH):
+        root_path = Path(root)
+        for dirname in dirnames:
+            dir_path = root_path / dirname
+            if dir_path.is_symlink():
+                files.append((0, str(dir_path.relative_to(VENV_PATH))))
+            else:
+                directories.append(str(dir_path.relative_to(VENV_PATH)))
+        for filename in filenames:
+            file_path = root_path / filename
+            if filename.endswith(".pyc"):
+                continue  # Regenerated on first import
+            size = file_path.lstat().st_size
+            files.append((size, str(file_path.relative_to(VENV_PATH))))
+    
+    # Greedy largest-first assignment keeps shard sizes balanced
+    shards = [[] for _ in range(num_shards)]
+    shard_sizes = [0] * num_shards
+    for size, relative_path in sorted(files, reverse=True):
+        smallest = shard_sizes.index(min(shard_sizes))
+        shards[smallest].append(relative_path)
+        shard_sizes[smallest] += size
+    
+    return sorted(directories), [shard for shard in shards if shard]
 
-def install_flash_attention():
-    """Install Flash Attention wheel."""
+def create_venv_snapshot() -> bool:
+    """
+    Pack the current venv into compressed shards keyed by the environment hash.
+    
+    Shards are written in parallel to a staging directory and published with
+    a single rename, so a half-written snapshot is never restored.
+    """
     try:
-        logger.info("Installing Flash Attention...")
+        environment_hash = compute_environment_hash()
+        snapshot_dir = get_snapshot_dir(environment_hash)
+        if (snapshot_dir / "manifest.json").exists():
+            logger.info(f"Venv snapshot already exists: {snapshot_dir}")
+            return True
         
-        pip_cmd = str(get_venv_pip())
-        flash_cmd = f"{pip_cmd} install {FLASH_ATTN_WHEEL}"
+        logger.info("Creating venv snapshot...")
+        start_time = time.time()
         
-        if not run_command(flash_cmd, timeout=600):  # 10 minute timeout
-            return False
-            
-        logger.info("Flash Attention installed successfully")
+        staging_dir = snapshot_dir.with_name(f"{snapshot_dir.name}.{os.getpid()}.tmp")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        staging_dir.mkdir(parents=True)
+        
+        directories, shards = _shard_venv_files(VENV_SNAPSHOT_WORKERS)
+        
+        def write_shard(index: int, shard: List[str]) -> str:
+            shard_name = f"shard-{index:02d}.tar.gz"
+            with tarfile.open(staging_dir / shard_name, "w:gz", compresslevel=3) as tar:
+                for relative_path in shard:
+                    tar.add(VENV_PATH / relative_path, arcname=relative_path, recursive=False)
+            return shard_name
+        
+        with ThreadPoolExecutor(max_workers=VENV_SNAPSHOT_WORKERS) as executor:
+            shard_names = list(executor.map(write_shard, range(len(shards)), shards))
+        
+        manifest = {
+            "environment_hash": environment_hash,
+            "created_at": time.time(),
+            "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+            "directories": directories,
+            "shards": shard_names,
+            "files": sum(len(shard) for shard in shards)
+        }
+        (staging_dir / "manifest.json").write_text(json.dumps(manifest))
+        
+        try:
+            os.rename(staging_dir, snapshot_dir)
+        except OSError:
+            # Another worker published the same snapshot first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        
+        logger.info(f"Venv snapshot created in {time.time() - start_time:.1f}s: {snapshot_dir}")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to install Flash Attention: {e}")
+        logger.error(f"Failed to create venv snapshot: {e}")
         return False
 
-def install_runtime_requirements():
-    """Install all runtime requirements."""
+def restore_venv_snapshot() -> bool:
+    """
+    Restore the venv from a snapshot matching the current environment hash.
+    
+    Shards are extracted in parallel into a staging directory that replaces
+    VENV_PATH once complete.
+    
+    Returns:
+        True if a snapshot was restored, False if none matched or restore failed
+    """
+    staging_dir = None
     try:
-        logger.info("Installing runtime requirements...")
+        environment_hash = compute_environment_hash()
+        snapshot_dir = get_snapshot_dir(environment_hash)
+        manifest_path = snapshot_dir / "manifest.json"
+        if not manifest_path.exists():
+            logger.info(f"No venv snapshot for environment {environment_hash[:16]}")
+            return False
         
-        pip_cmd = str(get_venv_pip())
+        manifest = json.loads(manifest_path.read_text())
+        if manifest.get("environment_hash") != environment_hash:
+            logger.warning(f"Venv snapshot manifest mismatch: {manifest_path}")
+            return False
         
-        for requirement in RUNTIME_REQUIREMENTS:
-            if requirement.startswith(PYTORCH_VERSION):
-                # Skip PyTorch - already installed
-                continue
-            if requirement == FLASH_ATTN_WHEEL:
-                # Skip flash attention - already installed
-                continue
-                
-            cmd = f"{pip_cmd} install {requirement}"
-            if not run_command(cmd, timeout=1200):  # 20 minute timeout per package
-                logger.error(f"Failed to install: {requirement}")
-                return False
-            
-            # Small delay between installations
-            time.sleep(2)
+        logger.info(f"Restoring venv snapshot from {snapshot_dir}...")
+        start_time = time.time()
         
-        logger.info("Runtime requirements installed successfully")
-        return True
+        staging_dir = VENV_PATH.with_name(f"{VENV_PATH.name}.restore.{os.getpid()}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
         
-    except Exception as e:
-        logger.error(f"Failed to install runtime requirements: {e}")
-        return False
-
-def verify_installation():
-    """Verify that key packages are installed correctly."""
-    try:
-        logger.info("Verifying installation...")
+        # Create the tree up front so shards never race on parent directories
+        staging_dir.mkdir(parents=True)
+        for relative_dir in manifest["directories"]:
+            (staging_dir / relative_dir).mkdir(parents=True, exist_ok=True)
         
-        python_cmd = str(get_venv_python())
+        def extract_shard(shard_name: str):
+            with tarfile.open(snapshot_dir / shard_name, "r:gz") as tar:
+                if hasattr(tarfile, "tar_filter"):
+                    tar.extractall(staging_dir, filter="tar")
+                else:
+                    tar.extractall(staging_dir)
         
-        # Test PyTorch with CUDA
-        pytorch_test = f"{python_cmd} -c \"import torch; print(f'PyTorch: {{torch.__version__}}'); print(f'CUDA available: {{torch.cuda.is_available()}}')\""
-        if not run_command(pytorch_test):
-            return False
+        with ThreadPoolExecutor(max_workers=VENV_SNAPSHOT_WORKERS) as executor:
+            list(executor.map(extract_shard, manifest["shards"]))
         
-        # Test WhisperX
-        whisperx_test = f"{python_cmd} -c \"import whisperx; print('WhisperX imported successfully')\""
-        if not run_command(whisperx_test):
-            logger.warning("WhisperX import failed - may need additional setup")
-            
-        # Test ASS library
-        ass_test = f"{python_cmd} -c \"import ass; print('ASS library imported successfully')\""
-        if not run_command(ass_test):
-            logger.warning("ASS library import failed")
+        if VENV_PATH.exists():
+            logger.warning("Replacing existing virtual environment with snapshot")
+            shutil.rmtree(VENV_PATH)
+        os.rename(staging_dir, VENV_PATH)
         
-        logger.info("Installation verification completed")
+        logger.info(f"Venv snapshot restored in {time.time() - start_time:.1f}s ({manifest['files']} files)")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to verify installation: {e}")
+        logger.error(f"Failed to restore venv snapshot: {e}")
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
         return False
 
 def setup_model_cache():
@@ -530,50 +1022,67 @@ def setup_model_cache():
         logger.error(f"Failed to setup model cache: {e}")
         return False
 
-def setup_network_volume_environment():
+def install_virtual_environment(progress_callback: Optional[Callable[[str], None]] = None):
+    """Build the virtual environment with a live pip install (steps 2-5)."""
+    # Step 2: Create virtual environment
+    report_progress(progress_callback, "Step 2: Creating virtual environment...")
+    if not create_virtual_environment():
+        raise RuntimeError("Failed to create virtual environment")
+    
+    # Steps 3-5: Resolve, download and install runtime requirements
+    if not install_runtime_requirements(progress_callback):
+        raise RuntimeError("Failed to install runtime requirements")
+
+def setup_network_volume_environment(progress_callback: Optional[Callable[[str], None]] = None):
     """
     Main function to setup complete network volume environment.
     This is called during cold start (first request).
+    
+    Args:
+        progress_callback: Optional callable receiving each step message,
+            used to publish progress to workers waiting on the setup lease
     """
     try:
         logger.info("=== F5-TTS Network Volume Environment Setup ===")
         start_time = time.time()
         
         # Step 1: Create directory structure
-        logger.info("Step 1: Creating directory structure...")
-        if not create_directory_structure():
+        if not run_step("directories", "Step 1: Creating directory structure...", create_directory_structure, progress_callback):
             raise RuntimeError("Failed to create directory structure")
         
-        # Step 2: Create virtual environment
-        logger.info("Step 2: Creating virtual environment...")
-        if not create_virtual_environment():
-            raise RuntimeError("Failed to create virtual environment")
-        
-        # Step 3: Install PyTorch with CUDA
-        logger.info("Step 3: Installing PyTorch with CUDA...")
-        if not install_pytorch():
-            raise RuntimeError("Failed to install PyTorch")
+        # Prefer a prebuilt snapshot over a live install, but never replace
+        # an intact venv - an interrupted install resumes instead
+        restored = False
+        if VENV_SNAPSHOT_ENABLED and not venv_is_intact():
+            report_progress(progress_callback, "Checking for prebuilt venv snapshot...")
+            restored = restore_venv_snapshot()
+            if restored:
+                mark_step_complete("runtime_requirements")
         
-        # Step 4: Install Flash Attention
-        logger.info("Step 4: Installing Flash Attention...")
-        if not install_flash_attention():
-            raise RuntimeError("Failed to install Flash Attention")
-        
-        # Step 5: Install runtime requirements
-        logger.info("Step 5: Installing runtime requirements...")
-        if not install_runtime_requirements():
-            raise RuntimeError("Failed to install runtime requirements")
+        if not restored:
+            install_virtual_environment(progress_callback)
         
         # Step 6: Setup model cache
-        logger.info("Step 6: Setting up model cache...")
-        if not setup_model_cache():
+        if not run_step("model_cache", "Step 6: Setting up model cache...", setup_model_cache, progress_callback):
             raise RuntimeError("Failed to setup model cache")
         
         # Step 7: Verify installation
-        logger.info("Step 7: Verifying installation...")
-        if not verify_installation():
+        verified = run_step("verify", "Step 7: Verifying installation...", verify_installation, progress_callback)
+        if not verified and restored:
+            # A snapshot that doesn't import is worse than no snapshot
+            logger.warning("Restored venv failed verification - falling back to live install")
+            restored = False
+            shutil.rmtree(VENV_PATH, ignore_errors=True)
+            install_virtual_environment(progress_callback)
+            verified = run_step("verify", "Step 7: Verifying installation...", verify_installation, progress_callback)
+        if not verified:
             logger.warning("Installation verification had warnings but continuing...")
         
+        # Snapshot a freshly installed, verified venv for the next cold start
+        if VENV_SNAPSHOT_ENABLED and verified and not restored:
+            if not create_venv_snapshot():
+                logger.warning("Venv snapshot creation failed - next cold start will reinstall")
+        
         # Calculate setup time
         setup_time = time.time() - start_time
         logger.info(f"=== Setup completed successfully in {setup_time:.1f} seconds ===")
@@ -596,4 +1105,4 @@ if __name__ == "__main__":
             sys.exit(1)
     except Exception as e:
         print(f"Setup error: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)